@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de almacenamiento de resultados de barridos en disco.
+
+Un almacén es un directorio con:
+
+- ``datos.npy``: array (escenario, tiempo, compartimento) que se abre como
+  ``numpy.memmap``, de modo que leer un escenario o un compartimento no carga
+  el fichero completo en memoria.
+- ``tiempos.npy``: vector de tiempos.
+- ``escenarios.npz``: tabla pequeña con los parámetros de cada escenario
+  (temperatura, humedad, a, m...).
+- ``completos.npy``: qué escenarios ya se han escrito (permite retomar un
+  barrido interrumpido).
+- ``esquema.json``: modelo, compartimentos, forma y tipo de los datos y, para
+  los barridos, los días, los ajustes del integrador y una huella de la tabla
+  de escenarios con la que se comprueba que un barrido retomado es el mismo.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from barrido import ejecutar_barrido, num_muestras
+from models import MODELOS, _nombre_modelo
+from solucionadores import AJUSTES_POR_DEFECTO, malla_tiempos
+
+
+class AlmacenResultados:
+    """
+    Almacén de resultados en disco con acceso por escenario y por compartimento.
+
+    Se crea con ``AlmacenResultados.crear`` y se abre con ``AlmacenResultados.abrir``.
+
+    Attributes:
+        ruta (str): Directorio del almacén.
+        modelo (str): Nombre del modelo.
+        compartimentos (tuple): Nombres de los compartimentos.
+        t (numpy.ndarray): Vector de tiempos.
+        datos (numpy.memmap): Array (escenario, tiempo, compartimento) en disco.
+        esquema (dict): Contenido de ``esquema.json``.
+    """
+
+    def __init__(self, ruta, modo="r"):
+        self.ruta = ruta
+        with open(os.path.join(ruta, "esquema.json"), encoding="utf-8") as fichero:
+            esquema = json.load(fichero)
+        self.esquema = esquema
+        self.modelo = esquema["modelo"]
+        self.compartimentos = tuple(esquema["compartimentos"])
+        self.t = np.load(os.path.join(ruta, "tiempos.npy"))
+        self.datos = np.load(os.path.join(ruta, "datos.npy"), mmap_mode=modo)
+        self._completos = np.load(os.path.join(ruta, "completos.npy"), mmap_mode=modo)
+        with np.load(os.path.join(ruta, "escenarios.npz")) as tabla:
+            self.escenarios = {nombre: tabla[nombre] for nombre in tabla.files}
+
+    @classmethod
+    def crear(cls, ruta, modelo, t, escenarios, dtype="float64", metadatos=None):
+        """
+        Crea un almacén vacío para todos los escenarios de un barrido.
+
+        Args:
+            ruta (str): Directorio a crear (puede existir si está vacío).
+            modelo (str | callable): Modelo simulado.
+            t (array): Vector de tiempos de los resultados.
+            escenarios (dict): Nombre -> escalar o array con los parámetros de cada escenario.
+            dtype (str): Tipo de los datos ("float64" o "float32" para ocupar la mitad).
+            metadatos (dict, optional): Datos adicionales que se guardan en
+                ``esquema.json`` (serializables como JSON).
+
+        Returns:
+            AlmacenResultados: El almacén abierto para escritura.
+        """
+        nombre = _nombre_modelo(modelo)
+        compartimentos = MODELOS[nombre].compartimentos
+        n = num_muestras(escenarios)
+        t = np.asarray(t, dtype=float)
+        os.makedirs(ruta, exist_ok=True)
+
+        np.lib.format.open_memmap(os.path.join(ruta, "datos.npy"), mode="w+", dtype=dtype,
+                                  shape=(n, len(t), len(compartimentos))).flush()
+        np.save(os.path.join(ruta, "completos.npy"), np.zeros(n, dtype=bool))
+        np.save(os.path.join(ruta, "tiempos.npy"), t)
+        np.savez(os.path.join(ruta, "escenarios.npz"), **_tabla(escenarios, n))
+        with open(os.path.join(ruta, "esquema.json"), "w", encoding="utf-8") as fichero:
+            json.dump({"modelo": nombre, "compartimentos": list(compartimentos),
+                       "forma": [n, len(t), len(compartimentos)], "dtype": str(np.dtype(dtype)),
+                       **(metadatos or {})},
+                      fichero, ensure_ascii=False, indent=2)
+        return cls(ruta, modo="r+")
+
+    @classmethod
+    def abrir(cls, ruta, escritura=False):
+        """
+        Abre un almacén existente (solo lectura salvo que ``escritura`` sea True).
+        """
+        return cls(ruta, modo="r+" if escritura else "r")
+
+    def __len__(self):
+        return self.datos.shape[0]
+
+    def __repr__(self):
+        return (f"AlmacenResultados({self.ruta!r}, modelo={self.modelo!r}, "
+                f"escenarios={len(self)}, tiempos={len(self.t)})")
+
+    def escribir(self, indices, datos):
+        """
+        Escribe un bloque de escenarios y los marca como completos.
+
+        Args:
+            indices (int | array): Índice del primer escenario de un bloque
+                consecutivo o array con el índice de cada escenario.
+            datos (array): Array (escenario, tiempo, compartimento) del bloque.
+        """
+        if np.ndim(indices) == 0:
+            indices = slice(indices, indices + len(datos))
+        self.datos[indices] = datos
+        self._completos[indices] = True
+
+    def flush(self):
+        """
+        Vuelca a disco los cambios pendientes.
+        """
+        self.datos.flush()
+        self._completos.flush()
+
+    @property
+    def completos(self):
+        """
+        Máscara booleana de los escenarios ya escritos.
+        """
+        return np.asarray(self._completos)
+
+    def escenario(self, indice):
+        """
+        Devuelve un escenario como array (tiempo, compartimento) leído de disco.
+        """
+        return self.datos[indice]
+
+    def compartimento(self, nombre, escenarios=slice(None)):
+        """
+        Devuelve un compartimento como array (escenario, tiempo) sin cargar el resto.
+
+        Args:
+            nombre (str): Nombre del compartimento.
+            escenarios (slice | array): Escenarios a leer (por defecto, todos).
+        """
+        return self.datos[escenarios, :, self.compartimentos.index(nombre)]
+
+    def parametros(self, indice):
+        """
+        Devuelve los parámetros de un escenario como diccionario.
+        """
+        return {nombre: float(valores[indice]) for nombre, valores in self.escenarios.items()}
+
+    def bandas(self, compartimento, cuantiles=(0.05, 0.5, 0.95), tam_bloque=4096):
+        """
+        Calcula cuantiles por tiempo de un compartimento a través de todos los escenarios.
+
+        Los escenarios se recorren por bloques y de cada bloque solo se guarda un
+        histograma por tiempo, así que la memoria no depende del número de
+        escenarios. La resolución de los cuantiles es 1/1024 del rango del
+        compartimento en cada tiempo.
+
+        Returns:
+            numpy.ndarray: Array de forma (tiempo, cuantil).
+        """
+        indice = self.compartimentos.index(compartimento)
+        n, dias, _ = self.datos.shape
+        minimo = np.full(dias, np.inf)
+        maximo = np.full(dias, -np.inf)
+        for inicio in range(0, n, tam_bloque):
+            bloque = self.datos[inicio:inicio + tam_bloque, :, indice]
+            minimo = np.minimum(minimo, bloque.min(axis=0))
+            maximo = np.maximum(maximo, bloque.max(axis=0))
+
+        intervalos = 1024
+        ancho = np.where(maximo > minimo, (maximo - minimo) / intervalos, 1.0)
+        conteos = np.zeros(dias * (intervalos + 1), dtype=np.int64)
+        desplazamiento = np.arange(dias) * (intervalos + 1)
+        for inicio in range(0, n, tam_bloque):
+            bloque = np.asarray(self.datos[inicio:inicio + tam_bloque, :, indice], dtype=float)
+            posiciones = np.clip(((bloque - minimo) / ancho).astype(np.int64), 0, intervalos)
+            conteos += np.bincount((posiciones + desplazamiento).ravel(), minlength=len(conteos))
+
+        acumulados = np.cumsum(conteos.reshape(dias, intervalos + 1), axis=1)
+        resultado = np.empty((dias, len(cuantiles)))
+        for j, q in enumerate(cuantiles):
+            objetivo = q * (n - 1) + 1
+            posicion = np.argmax(acumulados >= objetivo, axis=1)
+            resultado[:, j] = minimo + posicion * ancho
+        return resultado
+
+
+def _tabla(escenarios, n):
+    """
+    Tabla de escenarios: cada columna como array float de longitud ``n``.
+    """
+    return {nombre: np.broadcast_to(np.asarray(valor, dtype=float), (n,)) for nombre, valor in escenarios.items()}
+
+
+def _huella(tabla):
+    """
+    Hash SHA-256 de una tabla de escenarios (nombres y valores de las columnas).
+    """
+    resumen = hashlib.sha256()
+    for nombre in sorted(tabla):
+        resumen.update(nombre.encode("utf-8"))
+        resumen.update(np.ascontiguousarray(tabla[nombre], dtype=float).tobytes())
+    return resumen.hexdigest()
+
+
+def guardar_barrido(ruta, modelo, muestras, dias, ajustes=AJUSTES_POR_DEFECTO, dtype="float64", **opciones):
+    """
+    Ejecuta un barrido escribiendo cada bloque en un almacén a medida que termina.
+
+    Si el almacén ya existe, solo se simulan los escenarios que faltan, de modo
+    que un barrido interrumpido se puede retomar. La tabla de escenarios guarda
+    las muestras y, si se indica ``preparar``, los parámetros derivados (por
+    ejemplo, ``a`` y ``m`` a partir de la temperatura y la humedad).
+
+    Args:
+        ruta (str): Directorio del almacén.
+        modelo (str | callable): Modelo a simular.
+        muestras (dict): Parámetros de cada escenario (como en ``ejecutar_barrido``).
+        dias (int): Número de días para simular.
+        ajustes (AjustesSolver, optional): Integrador, tolerancias y malla de salida.
+        dtype (str): Tipo de los datos en disco.
+        **opciones: Opciones de ``ejecutar_barrido`` (preparar, tam_bloque, ejecutor...).
+
+    Returns:
+        AlmacenResultados: El almacén con todos los escenarios escritos.
+
+    Raises:
+        ValueError: Si el almacén existente corresponde a otro barrido (otro
+            modelo, días, ajustes, escenarios o tiempos).
+    """
+    n = num_muestras(muestras)
+    escenarios = dict(muestras)
+    preparar = opciones.get("preparar")
+    if preparar is not None:
+        escenarios.update(preparar(dict(muestras)))
+    t = malla_tiempos(ajustes, dias)
+    metadatos = {
+        "barrido": {
+            "modelo": _nombre_modelo(modelo),
+            "dias": dias,
+            "ajustes": ajustes.como_dict(),
+            "escenarios": n,
+            "huella": _huella(_tabla(escenarios, n)),
+        },
+    }
+
+    if os.path.exists(os.path.join(ruta, "esquema.json")):
+        almacen = AlmacenResultados.abrir(ruta, escritura=True)
+        if (almacen.esquema.get("barrido") != metadatos["barrido"] or len(almacen.t) != len(t)
+                or not np.array_equal(almacen.t, t)):
+            raise ValueError(f"El almacén '{ruta}' corresponde a otro barrido")
+    else:
+        almacen = AlmacenResultados.crear(ruta, modelo, t, escenarios, dtype, metadatos)
+
+    pendientes = np.flatnonzero(~almacen.completos)
+    if len(pendientes):
+        subconjunto = {nombre: (np.asarray(valor)[pendientes] if np.ndim(valor) > 0 else valor)
+                       for nombre, valor in muestras.items()}
+        for inicio, datos in ejecutar_barrido(modelo, subconjunto, dias, ajustes, **opciones):
+            almacen.escribir(pendientes[inicio:inicio + len(datos)], datos)
+        almacen.flush()
+    return almacen
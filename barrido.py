@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo para ejecutar barridos de parámetros en paralelo.
+
+Las muestras se dividen en bloques; cada bloque se simula con una sola llamada
+a ``simular_lote`` en un proceso (o hilo) del ejecutor y los resultados se
+devuelven a medida que terminan.
+
+Ejemplo (rejilla de temperatura x humedad del modelo Ross-Macdonald)::
+
+    from barrido import barrido_completo, rejilla
+    from clima import preparar_ross_macdonald
+
+    muestras = rejilla(temp=np.linspace(15, 35, 200), humedad=np.linspace(20, 90, 200))
+    muestras.update(poblacion_h=1000, infectados_h=10, infectados_v_iniciales=100,
+                    b=0.5, c=0.5, gamma=0.14)
+    datos = barrido_completo("ross_macdonald", muestras, 365, preparar=preparar_ross_macdonald)
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+
+from models import _obtener_modelo, simular_lote
+from solucionadores import AJUSTES_POR_DEFECTO, malla_tiempos
+
+
+class BarridoCancelado(RuntimeError):
+    """
+    ``barrido_completo`` se ha cancelado antes de terminar.
+
+    Attributes:
+        resultado (numpy.ndarray): Lo calculado hasta la cancelación, con NaN
+            en las muestras que faltan.
+        completadas (int): Número de muestras calculadas.
+    """
+
+    def __init__(self, resultado, completadas):
+        super().__init__(f"Barrido cancelado tras {completadas} de {len(resultado)} muestras")
+        self.resultado = resultado
+        self.completadas = completadas
+
+
+def rejilla(**ejes):
+    """
+    Construye el producto cartesiano de varios ejes de parámetros.
+
+    Args:
+        **ejes: Nombre del parámetro -> valores del eje.
+
+    Returns:
+        dict: Nombre -> array aplanado con una entrada por punto de la rejilla
+        (el último eje varía más rápido).
+    """
+    nombres = list(ejes)
+    mallas = np.meshgrid(*[np.asarray(ejes[nombre], dtype=float) for nombre in nombres], indexing="ij")
+    return {nombre: malla.ravel() for nombre, malla in zip(nombres, mallas)}
+
+
+def num_muestras(muestras):
+    """
+    Devuelve el número de muestras: la longitud común de los parámetros que son arrays.
+    """
+    longitudes = {np.size(valor) for valor in muestras.values() if np.ndim(valor) > 0}
+    if len(longitudes) > 1:
+        raise ValueError(f"Los parámetros tienen longitudes distintas: {sorted(longitudes)}")
+    return longitudes.pop() if longitudes else 1
+
+
+def _bloque(muestras, inicio, fin):
+    return {nombre: (valor[inicio:fin] if np.ndim(valor) > 0 else valor) for nombre, valor in muestras.items()}
+
+
+def _simular_bloque(modelo, muestras, dias, ajustes, preparar):
+    # Función de nivel de módulo para que el ejecutor de procesos pueda serializarla
+    if preparar is not None:
+        muestras = preparar(muestras)
+    return simular_lote(modelo, muestras, dias, ajustes)
+
+
+def ejecutar_barrido(modelo, muestras, dias, ajustes=AJUSTES_POR_DEFECTO, preparar=None,
+                     tam_bloque=256, ejecutor="procesos", max_trabajadores=None,
+                     progreso=None, cancelar=None):
+    """
+    Simula todas las muestras en bloques repartidos entre procesos o hilos.
+
+    Es un generador: devuelve cada bloque en cuanto termina, sin esperar al
+    resto. Solo se mantienen en vuelo unos pocos bloques por trabajador, así
+    que la memoria no crece con el tamaño del barrido. Si se cierra el
+    generador o se activa ``cancelar``, los bloques pendientes se cancelan.
+
+    Args:
+        modelo (str | callable): Modelo a simular (como en ``simular_lote``).
+        muestras (dict): Nombre -> escalar o array; todos los arrays con la misma longitud.
+        dias (int): Número de días para simular.
+        ajustes (AjustesSolver, optional): Integrador, tolerancias y malla de salida.
+        preparar (callable, optional): Función de nivel de módulo que convierte
+            un bloque de muestras en parámetros del modelo (por ejemplo,
+            ``clima.preparar_ross_macdonald``).
+        tam_bloque (int): Número de muestras por bloque.
+        ejecutor (str): "procesos" o "hilos".
+        max_trabajadores (int, optional): Número de trabajadores (por defecto, núcleos).
+        progreso (callable, optional): Se llama como ``progreso(completadas, total)``.
+        cancelar (threading.Event, optional): Si se activa, el barrido se detiene.
+
+    Yields:
+        tuple: ``(inicio, datos)``, con el índice de la primera muestra del bloque y
+        el array de forma (muestras del bloque, tiempo, compartimento).
+    """
+    if ejecutor not in ("procesos", "hilos"):
+        raise ValueError(f"Ejecutor desconocido: {ejecutor!r}. Opciones: procesos, hilos")
+    total = num_muestras(muestras)
+    trabajadores = max_trabajadores or os.cpu_count() or 1
+    bloques = iter([(inicio, min(inicio + tam_bloque, total)) for inicio in range(0, total, tam_bloque)])
+    clase = ProcessPoolExecutor if ejecutor == "procesos" else ThreadPoolExecutor
+    pool = clase(max_workers=trabajadores)
+    pendientes = {}
+
+    def lanzar():
+        siguiente = next(bloques, None)
+        if siguiente is not None:
+            inicio, fin = siguiente
+            futuro = pool.submit(_simular_bloque, modelo, _bloque(muestras, inicio, fin), dias, ajustes, preparar)
+            pendientes[futuro] = siguiente
+
+    try:
+        for _ in range(2 * trabajadores):
+            lanzar()
+        completadas = 0
+        while pendientes:
+            terminados, _ = wait(pendientes, timeout=0.1, return_when=FIRST_COMPLETED)
+            if cancelar is not None and cancelar.is_set():
+                return
+            for futuro in terminados:
+                inicio, fin = pendientes.pop(futuro)
+                datos = futuro.result()
+                completadas += fin - inicio
+                lanzar()
+                if progreso is not None:
+                    progreso(completadas, total)
+                yield inicio, datos
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def barrido_completo(modelo, muestras, dias, **opciones):
+    """
+    Ejecuta un barrido y reúne todos los bloques en un único array.
+
+    Acepta las mismas opciones que ``ejecutar_barrido``.
+
+    Returns:
+        numpy.ndarray: Array de forma (muestra, tiempo, compartimento), en el
+        orden de las muestras.
+
+    Raises:
+        BarridoCancelado: Si ``cancelar`` detiene el barrido antes de terminar
+            (con el resultado parcial).
+    """
+    total = num_muestras(muestras)
+    ajustes = opciones.get("ajustes", AJUSTES_POR_DEFECTO)
+    forma = (len(malla_tiempos(ajustes, dias)), len(_obtener_modelo(modelo).compartimentos))
+    resultado = np.full((total,) + forma, np.nan)
+    completadas = 0
+    for inicio, datos in ejecutar_barrido(modelo, muestras, dias, **opciones):
+        resultado[inicio:inicio + len(datos)] = datos
+        completadas += len(datos)
+    if completadas < total:
+        raise BarridoCancelado(resultado, completadas)
+    return resultado
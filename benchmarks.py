@@ -0,0 +1,627 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks de la capa de modelos.
+
+Uso:
+    python benchmarks.py [--escenarios 2000] [--dias 365] [--parches 100 1000 10000] [--grupos 16 100 300]
+                         [--mortalidades 0.1 1 5] [--trabajadores 1 2 4 8]
+    python benchmarks.py --regresion [--linea-base benchmarks_base.json] [--umbral 0.25] [--guardar]
+                         [--referencias benchmarks_referencias.json] [--guardar-referencias]
+
+Con ``--regresion`` se ejecuta la suite de regresión (funciones ``modelo_*``,
+bucle de comparación, barridos grandes, horizontes largos y poblaciones
+grandes): mide tiempo, evaluaciones de derivadas y memoria, compara las
+trayectorias con las de referencia y termina con código 1 si algún caso es más
+lento o consume más que la línea base por encima del umbral, o si sus
+resultados cambian. Las trayectorias de referencia (``benchmarks_referencias.json``)
+se versionan; la línea base de tiempos es de cada máquina y se escribe con
+``--guardar``. ``--guardar-referencias`` actualiza las referencias cuando un
+cambio de resultados es intencionado.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+
+import nucleos
+from barrido import barrido_completo, num_muestras, rejilla
+from clima import MU_MOSQUITO, calc_params_bio, preparar_ross_macdonald
+from edades import numero_reproductivo_edades, preparar_edades, simular_edades
+from metapoblacion import preparar_metapoblacion, red_aleatoria, simular_metapoblacion
+from models import (CACHE, MODELOS, _integrar, _preparar_lote, modelo_ross_macdonald, modelo_seir, modelo_si,
+                    modelo_sir, modelo_sis, simular, simular_lote)
+from solucionadores import AJUSTES_POR_DEFECTO, TOLERANCIAS_AUTO, AjustesSolver, malla_tiempos
+
+# Parámetros base de cada modelo; el primer parámetro de transmisión se
+# muestrea para obtener escenarios distintos
+PARAMETROS_BASE = {
+    "sir": {"poblacion": 1000, "infectados_iniciales": 10, "recuperados_iniciales": 0,
+            "beta": 0.3, "gamma": 0.1},
+    "seir": {"poblacion": 1000, "infectados_iniciales": 10, "recuperados_iniciales": 0,
+             "expuestos_iniciales": 0, "beta": 0.3, "gamma": 0.1, "sigma": 0.2},
+    "sis": {"poblacion": 1000, "infectados_iniciales": 10, "beta": 0.3, "gamma": 0.1},
+    "si": {"poblacion": 1000, "infectados_iniciales": 10, "beta": 0.3},
+    "ross_macdonald": {"poblacion_h": 1000, "infectados_h": 10, "infectados_v_iniciales": 100,
+                       "m": 2.0, "a": 0.36, "b": 0.5, "c": 0.5, "gamma": 0.14, "mu": 0.1},
+}
+
+PARAMETRO_BARRIDO = {"sir": "beta", "seir": "beta", "sis": "beta", "si": "beta", "ross_macdonald": "a"}
+
+
+def _tiempos(funcion, repeticiones):
+    """
+    Devuelve los tiempos (en segundos) de ``repeticiones`` ejecuciones.
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+
+def _cronometrar(funcion, repeticiones):
+    """
+    Devuelve el mejor tiempo (en segundos) de ``repeticiones`` ejecuciones.
+    """
+    return min(_tiempos(funcion, repeticiones))
+
+
+def parametros_lote(nombre, escenarios, semilla=0):
+    """
+    Construye un lote de ``escenarios`` parámetros variando la transmisión.
+    """
+    rng = np.random.default_rng(semilla)
+    parametros = dict(PARAMETROS_BASE[nombre])
+    base = parametros[PARAMETRO_BARRIDO[nombre]]
+    parametros[PARAMETRO_BARRIDO[nombre]] = base * rng.uniform(0.5, 2.0, escenarios)
+    return parametros
+
+
+def benchmark_nucleos(escenarios=2000, dias=365, repeticiones=3):
+    """
+    Compara, para cada modelo, los núcleos compilados con la versión de NumPy.
+
+    Returns:
+        list: Una fila por modelo y variante con el tiempo por evaluación de las
+        derivadas, del jacobiano y de la integración completa del lote.
+    """
+    filas = []
+    numerica = AjustesSolver(analitica=False)
+    for nombre, definicion in MODELOS.items():
+        parametros = parametros_lote(nombre, escenarios)
+        p = _preparar_lote(definicion, parametros)
+        y0 = np.column_stack(definicion.condiciones_iniciales(p)).astype(float).ravel()
+        args = definicion.argumentos(p)
+        k = len(definicion.compartimentos)
+
+        variantes = [False, True] if nucleos.NUMBA_DISPONIBLE else [False]
+        for usar_numba in variantes:
+            nucleos.USAR_NUMBA = usar_numba
+            func, Dfun, args_odeint = nucleos.preparar(definicion.deriv, definicion.jac, args, escenarios, k)
+            simular_lote(nombre, parametros, 2, numerica)  # calentamiento
+            filas.append({
+                "modelo": nombre,
+                "variante": "numba" if usar_numba else "numpy",
+                "deriv_us": _cronometrar(lambda: func(y0, 0.0, *args_odeint), 50) * 1e6,
+                "jac_us": _cronometrar(lambda: Dfun(y0, 0.0, *args_odeint), 50) * 1e6,
+                "lote_s": _cronometrar(lambda: simular_lote(nombre, parametros, dias, numerica), repeticiones),
+            })
+    nucleos.USAR_NUMBA = nucleos.NUMBA_DISPONIBLE
+    return filas
+
+
+def comprobar_analiticas(escenarios=500, dias=365, semilla=0):
+    """
+    Compara la solución cerrada de SI y SIS con la integración numérica.
+
+    Los parámetros se muestrean incluyendo beta < gamma, beta = gamma y beta = 0
+    (los tres primeros escenarios fijan estas ramas de la solución cerrada).
+    Solo informa: la coincidencia se comprueba en ``tests/test_analiticas.py``.
+
+    Returns:
+        list: Una fila por modelo con los tiempos de ambas vías y la mayor
+        diferencia relativa a la población (en todos los escenarios y en los de
+        las ramas especiales).
+    """
+    rng = np.random.default_rng(semilla)
+    beta = rng.uniform(0.0, 1.0, escenarios)
+    gamma = rng.uniform(0.0, 1.0, escenarios)
+    beta[:3] = (0.0, 0.2, 0.5)
+    gamma[:3] = (0.1, 0.2, 0.1)
+    lotes = {
+        "si": {"poblacion": 1000, "infectados_iniciales": 10, "beta": beta},
+        "sis": {"poblacion": 1000, "infectados_iniciales": 10, "beta": beta, "gamma": gamma},
+    }
+    filas = []
+    for nombre, parametros in lotes.items():
+        inicio = time.perf_counter()
+        analitica = simular_lote(nombre, parametros, dias, AjustesSolver(malla="diaria"))
+        medio = time.perf_counter()
+        numerica = simular_lote(nombre, parametros, dias,
+                                AjustesSolver(malla="diaria", analitica=False, rtol=1e-10, atol=1e-8))
+        fin = time.perf_counter()
+        error = np.abs(analitica - numerica).max(axis=(1, 2)) / 1000
+        filas.append({
+            "modelo": nombre,
+            "analitica_s": medio - inicio,
+            "numerica_s": fin - medio,
+            "error_relativo": float(error.max()),
+            "error_ramas": float(error[:3].max()),
+        })
+    return filas
+
+
+def benchmark_metapoblacion(parches=(100, 1000, 10000), dias=365, vecinos=8, repeticiones=1, max_parches_bdf=1000):
+    """
+    Mide el modelo de metapoblación (SIR y Ross-Macdonald) con redes de movilidad
+    aleatorias de ``vecinos`` enlaces por parche.
+
+    BDF factoriza el jacobiano disperso en cada actualización y el relleno de
+    la factorización crece más deprisa que los enlaces, así que solo se mide
+    hasta ``max_parches_bdf`` parches.
+
+    Returns:
+        list: Una fila por modelo y tamaño con los enlaces de la red, el tiempo
+        por evaluación de derivadas y jacobiano y el de la integración con RK45
+        y BDF (NaN si no se mide).
+    """
+    filas = []
+    for nombre in ("sir", "ross_macdonald"):
+        for n in parches:
+            C = red_aleatoria(n, vecinos=vecinos)
+            parametros = dict(PARAMETROS_BASE[nombre])
+            # Brote en un solo parche que se propaga por la red
+            semilla = "infectados_iniciales" if nombre == "sir" else "infectados_h"
+            parametros[semilla] = np.where(np.arange(n) == 0, parametros[semilla], 0)
+            _, y0, func, Dfun = preparar_metapoblacion(nombre, C, parametros)
+            filas.append({
+                "modelo": nombre,
+                "parches": n,
+                "enlaces": C.nnz,
+                "deriv_us": _cronometrar(lambda: func(y0, 0.0), 20) * 1e6,
+                "jac_us": _cronometrar(lambda: Dfun(y0, 0.0), 5) * 1e6,
+                "rk45_s": _cronometrar(lambda: simular_metapoblacion(nombre, C, parametros, dias), repeticiones),
+                "bdf_s": _cronometrar(lambda: simular_metapoblacion(
+                    nombre, C, parametros, dias, AjustesSolver(metodo="BDF", malla="diaria")), repeticiones)
+                if n <= max_parches_bdf else float("nan"),
+            })
+    return filas
+
+
+def benchmark_edades(grupos=(16, 100, 300), dias=365, repeticiones=1, semilla=0):
+    """
+    Mide el SEIR por edades con matrices de contactos aleatorias densas.
+
+    Returns:
+        list: Una fila por número de grupos con el tiempo por evaluación de
+        derivadas y jacobiano, el de R0 y el de la integración con RK45 y BDF.
+    """
+    rng = np.random.default_rng(semilla)
+    filas = []
+    for n in grupos:
+        contactos = rng.random((n, n)) * 10.0 / n
+        parametros = dict(PARAMETROS_BASE["seir"], poblacion=rng.uniform(1e4, 1e5, n), beta=0.03)
+        # Brote en un solo grupo
+        parametros["infectados_iniciales"] = np.where(np.arange(n) == 0, parametros["infectados_iniciales"], 0)
+        _, y0, func, Dfun = preparar_edades("seir", contactos, parametros)
+        filas.append({
+            "grupos": n,
+            "deriv_us": _cronometrar(lambda: func(y0, 0.0), 20) * 1e6,
+            "jac_us": _cronometrar(lambda: Dfun(y0, 0.0), 5) * 1e6,
+            "r0_ms": _cronometrar(lambda: numero_reproductivo_edades("seir", contactos, parametros), 5) * 1e3,
+            "rk45_s": _cronometrar(lambda: simular_edades("seir", contactos, parametros, dias), repeticiones),
+            "bdf_s": _cronometrar(lambda: simular_edades(
+                "seir", contactos, parametros, dias, AjustesSolver(metodo="BDF", malla="diaria")), repeticiones),
+        })
+    return filas
+
+
+def benchmark_rigidez(escenarios=2000, dias=365, mortalidades=(0.1, 1, 5), semilla=0):
+    """
+    Compara RK45, odeint y la selección automática en Ross-Macdonald a lo
+    largo del rango climático (temperatura de 15 a 35 °C y humedad del 20 al
+    90 %) con varias mortalidades de los mosquitos, con las mismas tolerancias.
+
+    Returns:
+        list: Una fila por mortalidad y método con el índice de rigidez, el
+        método usado, las evaluaciones de las derivadas y el tiempo.
+    """
+    rng = np.random.default_rng(semilla)
+    definicion = MODELOS["ross_macdonald"]
+    a, m = calc_params_bio(rng.uniform(15, 35, escenarios), rng.uniform(20, 90, escenarios))
+    filas = []
+    for mu in mortalidades:
+        p = _preparar_lote(definicion, dict(PARAMETROS_BASE["ross_macdonald"], a=a, m=m, mu=mu))
+        for metodo in ("RK45", "odeint", "auto"):
+            ajustes = AjustesSolver(metodo=metodo, malla="diaria", **TOLERANCIAS_AUTO)
+            t = malla_tiempos(ajustes, dias)
+            _integrar(definicion, p, t, ajustes)
+            inicio = time.perf_counter()
+            info = _integrar(definicion, p, t, ajustes)[2]
+            filas.append({"mu": mu, "ajustes": metodo, "rigidez": info.get("rigidez", np.nan),
+                          "metodo": info["metodo"], "nfe": info["nfe"], "segundos": time.perf_counter() - inicio})
+    return filas
+
+
+def benchmark_escalado(escenarios=20000, dias=365, trabajadores=(1, 2, 4, 8), tam_bloque=256):
+    """
+    Mide el rendimiento de ``barrido.ejecutar_barrido`` con distintos números
+    de procesos en una rejilla temperatura x humedad de Ross-Macdonald.
+
+    La eficiencia es la aceleración respecto de un proceso dividida entre el
+    número de procesos (1 = escalado lineal). Solo se miden los números de
+    procesos que no superan los núcleos disponibles.
+
+    Returns:
+        list: Una fila por número de procesos con el tiempo, los escenarios por
+        segundo, la aceleración y la eficiencia.
+    """
+    lado = int(np.ceil(np.sqrt(escenarios)))
+    muestras = {**rejilla(temp=np.linspace(15, 35, lado), humedad=np.linspace(20, 90, lado)),
+                **{nombre: valor for nombre, valor in PARAMETROS_BASE["ross_macdonald"].items()
+                   if nombre not in ("a", "m")}}
+    total = num_muestras(muestras)
+    nucleos_disponibles = os.cpu_count() or 1
+    filas = []
+    for n in sorted({1, *trabajadores}):
+        if n > nucleos_disponibles:
+            continue
+        inicio = time.perf_counter()
+        barrido_completo("ross_macdonald", muestras, dias, preparar=preparar_ross_macdonald,
+                         tam_bloque=tam_bloque, max_trabajadores=n)
+        segundos = time.perf_counter() - inicio
+        base = filas[0]["segundos"] if filas else segundos
+        filas.append({"trabajadores": n, "escenarios": total, "segundos": segundos,
+                      "escenarios_s": total / segundos, "aceleracion": base / segundos,
+                      "eficiencia": base / segundos / n})
+    return filas
+
+
+# ---------------------------------------------------------------------------
+# Suite de regresión
+# ---------------------------------------------------------------------------
+
+# Línea base de tiempos, memoria y evaluaciones: depende de la máquina y no se versiona
+LINEA_BASE = "benchmarks_base.json"
+
+# Trayectorias de referencia: no dependen de la máquina y se versionan junto al código
+REFERENCIAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks_referencias.json")
+
+# Tolerancia de las trayectorias respecto de la referencia (relativa al máximo
+# de cada caso)
+TOLERANCIA_REFERENCIA = 1e-6
+
+# Repeticiones mínimas de cada caso en la suite: con una sola medida el ruido
+# de la máquina basta para superar el umbral
+REPETICIONES_MINIMAS = 3
+
+# Puntos de tiempo y escenarios que se guardan de cada trayectoria de referencia
+PUNTOS_REFERENCIA = 100
+ESCENARIOS_REFERENCIA = 5
+
+CasoRegresion = namedtuple("CasoRegresion", ["nombre", "ejecutar", "evaluaciones"])
+CasoRegresion.__doc__ = """
+Caso de la suite de regresión.
+
+Attributes:
+    nombre (str): Identificador del caso en la línea base.
+    ejecutar (callable): Ejecuta el caso y devuelve un array (escenario, tiempo, compartimento).
+    evaluaciones (callable): Devuelve el número de evaluaciones de las derivadas.
+"""
+
+
+def _evaluaciones(nombre, parametros, dias, ajustes=AJUSTES_POR_DEFECTO):
+    definicion = MODELOS[nombre]
+    return _integrar(definicion, _preparar_lote(definicion, parametros), malla_tiempos(ajustes, dias), ajustes)[2]["nfe"]
+
+
+def _caso_modelo(funcion, nombre, dias=365):
+    """
+    Una llamada a una función ``modelo_*`` con la caché vacía (incluye el DataFrame).
+    """
+    parametros = PARAMETROS_BASE[nombre]
+
+    def ejecutar():
+        CACHE.limpiar()
+        return funcion(**parametros, dias=dias).to_numpy()[np.newaxis, :, 1:]
+
+    return CasoRegresion(funcion.__name__, ejecutar, lambda: _evaluaciones(nombre, parametros, dias))
+
+
+def _caso_comparacion(escenarios=10, dias=365):
+    """
+    El bucle de la comparativa por temperatura de la aplicación: un ``simular``
+    por escenario, con la caché vacía.
+    """
+    temperaturas = 20.0 + np.arange(escenarios)
+    a, m = calc_params_bio(temperaturas, np.full(escenarios, 70.0))
+    parametros = [{**PARAMETROS_BASE["ross_macdonald"], "a": float(a[i]), "m": float(m[i]), "mu": MU_MOSQUITO}
+                  for i in range(escenarios)]
+
+    def ejecutar():
+        CACHE.limpiar()
+        return np.stack([simular("ross_macdonald", p, dias).datos for p in parametros])
+
+    return CasoRegresion("comparacion_ross_macdonald", ejecutar,
+                         lambda: sum(_evaluaciones("ross_macdonald", p, dias) for p in parametros))
+
+
+def _caso_lote(nombre_caso, nombre, parametros, dias, ajustes=AJUSTES_POR_DEFECTO):
+    return CasoRegresion(nombre_caso, lambda: simular_lote(nombre, parametros, dias, ajustes),
+                         lambda: _evaluaciones(nombre, parametros, dias, ajustes))
+
+
+def casos_regresion():
+    """
+    Devuelve los casos de la suite de regresión.
+    """
+    poblacion_grande = {**PARAMETROS_BASE["seir"], "poblacion": 1e9, "infectados_iniciales": 1}
+    return [
+        _caso_modelo(modelo_sir, "sir"),
+        _caso_modelo(modelo_seir, "seir"),
+        _caso_modelo(modelo_sis, "sis"),
+        _caso_modelo(modelo_si, "si"),
+        _caso_modelo(modelo_ross_macdonald, "ross_macdonald"),
+        _caso_comparacion(),
+        _caso_lote("barrido_sir", "sir", parametros_lote("sir", 10000), 365),
+        _caso_lote("barrido_ross_macdonald", "ross_macdonald", parametros_lote("ross_macdonald", 10000), 365),
+        _caso_lote("horizonte_largo_ross_macdonald", "ross_macdonald", PARAMETROS_BASE["ross_macdonald"], 3650,
+                   AjustesSolver(malla="diaria")),
+        _caso_lote("poblacion_grande_seir", "seir", poblacion_grande, 730, AjustesSolver(malla="diaria")),
+    ]
+
+
+def _referencia(datos):
+    """
+    Submuestra una trayectoria para guardarla como referencia.
+    """
+    tiempos = np.unique(np.linspace(0, datos.shape[1] - 1, PUNTOS_REFERENCIA).astype(int))
+    escenarios = np.unique(np.linspace(0, len(datos) - 1, ESCENARIOS_REFERENCIA).astype(int))
+    return {"tiempos": tiempos.tolist(), "escenarios": escenarios.tolist(),
+            "datos": datos[np.ix_(escenarios, tiempos)].tolist()}
+
+
+def _error_referencia(datos, referencia):
+    """
+    Diferencia máxima con la referencia, relativa al máximo de la referencia.
+    """
+    esperado = np.asarray(referencia["datos"])
+    if (len(datos) <= max(referencia["escenarios"]) or datos.shape[1] <= max(referencia["tiempos"])
+            or datos.shape[2] != esperado.shape[2]):
+        return float("inf")
+    obtenido = datos[np.ix_(referencia["escenarios"], referencia["tiempos"])]
+    return float(np.abs(obtenido - esperado).max() / max(np.abs(esperado).max(), 1e-300))
+
+
+def _medir_tiempo(caso, repeticiones):
+    """
+    Tiempos de un caso tras un calentamiento (compilación de núcleos,
+    importaciones); los casos rápidos se repiten dentro de cada medida para que
+    duren al menos 0.1 s.
+
+    Returns:
+        tuple: ``(mejor, ruido)`` en segundos por ejecución.
+    """
+    inicio = time.perf_counter()
+    caso.ejecutar()
+    veces = max(1, int(0.1 / max(time.perf_counter() - inicio, 1e-6)))
+    tiempos = np.array(_tiempos(lambda: [caso.ejecutar() for _ in range(veces)], repeticiones)) / veces
+    return float(tiempos.min()), float(np.median(tiempos) - tiempos.min())
+
+
+def medir(caso, repeticiones=3):
+    """
+    Mide un caso: mejor tiempo, evaluaciones de derivadas, memoria y bloques retenidos.
+
+    ``ruido_s`` es la diferencia entre la mediana y el mejor tiempo, una
+    estimación del ruido de la máquina durante la medida.
+
+    La memoria se mide con ``tracemalloc`` en una ejecución aparte (el
+    seguimiento ralentiza el código): pico durante el caso, memoria que sigue
+    asignada al terminar y número de bloques asignados por el caso que siguen
+    vivos (diferencia entre instantáneas, incluido el resultado).
+
+    Returns:
+        tuple: ``(fila, datos)`` con las medidas y el resultado del caso.
+    """
+    tiempo, ruido = _medir_tiempo(caso, repeticiones)
+    tracemalloc.start()
+    antes = tracemalloc.take_snapshot()
+    inicial = tracemalloc.get_traced_memory()[0]
+    datos = caso.ejecutar()
+    actual, pico = tracemalloc.get_traced_memory()
+    despues = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diferencias = despues.compare_to(antes, "lineno")
+    fila = {
+        "tiempo_s": tiempo,
+        "ruido_s": ruido,
+        "evaluaciones": int(caso.evaluaciones()),
+        "memoria_pico_mb": (pico - inicial) / 2**20,
+        "memoria_retenida_mb": (actual - inicial - datos.nbytes) / 2**20,
+        "bloques_retenidos": sum(max(diferencia.count_diff, 0) for diferencia in diferencias),
+    }
+    return fila, datos
+
+
+def _cargar_json(ruta, clave):
+    """
+    Lee la sección ``clave`` de un fichero JSON de la suite (None si no existe).
+    """
+    try:
+        with open(ruta, encoding="utf-8") as fichero:
+            return json.load(fichero)[clave]
+    except FileNotFoundError:
+        return None
+
+
+def suite_regresion(ruta=LINEA_BASE, umbral=0.25, guardar=False, repeticiones=3, salida=print,
+                    referencias=REFERENCIAS, guardar_referencias=False):
+    """
+    Ejecuta la suite de regresión y la compara con la línea base y las referencias.
+
+    Un caso falla si su tiempo, sus evaluaciones de derivadas, su memoria pico
+    o sus bloques retenidos superan los de la línea base en más de ``umbral``
+    (fracción), o si su trayectoria difiere de la de referencia en más de
+    ``TOLERANCIA_REFERENCIA``. Cada caso se repite al menos ``REPETICIONES_MINIMAS`` veces; el tiempo solo
+    cuenta como regresión si el exceso supera también el ruido medido y se
+    confirma al repetir la medida.
+
+    Las trayectorias de referencia se versionan (``REFERENCIAS``): si falta el
+    fichero o un caso, la suite falla salvo con ``guardar_referencias``. La
+    línea base de tiempos es propia de cada máquina: sin ella los tiempos solo
+    se miden.
+
+    Args:
+        ruta (str): Fichero JSON de la línea base.
+        umbral (float): Empeoramiento relativo admitido (0.25 = 25 %).
+        guardar (bool): Escribir la línea base con las medidas actuales en lugar de comparar.
+        repeticiones (int): Repeticiones de cada caso (se toma el mejor tiempo).
+        salida (callable): Función para mostrar cada línea del informe.
+        referencias (str): Fichero JSON de las trayectorias de referencia.
+        guardar_referencias (bool): Escribir las trayectorias actuales como
+            referencia (solo cuando un cambio de resultados es intencionado).
+
+    Returns:
+        list: Descripción de cada regresión encontrada (vacía si no hay ninguna).
+    """
+    base = _cargar_json(ruta, "casos")
+    esperadas = _cargar_json(referencias, "casos")
+    if esperadas is None and not guardar_referencias:
+        return [f"no existe el fichero de referencias '{referencias}'"]
+    if base is None and not guardar:
+        salida(f"No existe la línea base '{ruta}': los tiempos solo se miden (--guardar la crea)")
+    base, esperadas = base or {}, esperadas or {}
+    if repeticiones < REPETICIONES_MINIMAS:
+        salida(f"Se usan {REPETICIONES_MINIMAS} repeticiones por caso (mínimo de la suite)")
+        repeticiones = REPETICIONES_MINIMAS
+
+    # La caché en disco convertiría las repeticiones en aciertos
+    directorio, CACHE.directorio = CACHE.directorio, None
+    nueva, nuevas_referencias, regresiones = {}, {}, []
+    salida(f"{'caso':<34}{'tiempo (s)':>12}{'base':>10}{'evaluaciones':>14}{'pico (MB)':>11}"
+           f"{'retenida (MB)':>15}{'bloques ret.':>14}{'error ref.':>12}")
+    try:
+        for caso in casos_regresion():
+            fila, datos = medir(caso, repeticiones)
+            anterior = base.get(caso.nombre)
+            referencia = esperadas.get(caso.nombre)
+            error = _error_referencia(datos, referencia) if referencia else float("nan")
+            salida(f"{caso.nombre:<34}{fila['tiempo_s']:>12.4f}"
+                   f"{anterior['tiempo_s'] if anterior else float('nan'):>10.4f}{fila['evaluaciones']:>14}"
+                   f"{fila['memoria_pico_mb']:>11.1f}{fila['memoria_retenida_mb']:>15.2f}{fila['bloques_retenidos']:>14}"
+                   f"{error:>12.1e}")
+            nueva[caso.nombre] = fila
+            nuevas_referencias[caso.nombre] = _referencia(datos)
+            if not guardar_referencias:
+                if referencia is None:
+                    regresiones.append(f"{caso.nombre}: no tiene trayectoria de referencia")
+                elif not error <= TOLERANCIA_REFERENCIA:
+                    regresiones.append(f"{caso.nombre}: trayectoria distinta de la referencia (error {error:.2e})")
+            if guardar or anterior is None:
+                continue
+            # Margen absoluto para que el ruido de los casos muy rápidos no cuente; en
+            # el tiempo, al menos el doble del ruido de esta medida y de la base
+            ruido = max(fila["ruido_s"], anterior.get("ruido_s", 0.0))
+            margenes = {"tiempo_s": max(1e-3, 2 * ruido), "evaluaciones": 0, "memoria_pico_mb": 0.5,
+                        "bloques_retenidos": 100}
+            if fila["tiempo_s"] > anterior["tiempo_s"] * (1 + umbral) + margenes["tiempo_s"]:
+                # Un pico de carga de la máquina no debe contar: se confirma con otra medida
+                fila["tiempo_s"] = min(fila["tiempo_s"], _medir_tiempo(caso, 2 * repeticiones)[0])
+            for medida, margen in margenes.items():
+                if medida in anterior and fila[medida] > anterior[medida] * (1 + umbral) + margen:
+                    regresiones.append(f"{caso.nombre}: {medida} {fila[medida]:.4g} > {anterior[medida]:.4g}")
+    finally:
+        CACHE.directorio = directorio
+
+    if guardar:
+        with open(ruta, "w", encoding="utf-8") as fichero:
+            json.dump({"version": 1, "numba": nucleos.USAR_NUMBA, "casos": nueva}, fichero, indent=1)
+        salida(f"Línea base guardada en {ruta}")
+    if guardar_referencias:
+        with open(referencias, "w", encoding="utf-8") as fichero:
+            json.dump({"version": 1, "casos": nuevas_referencias}, fichero)
+        salida(f"Referencias guardadas en {referencias}")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de la capa de modelos")
+    parser.add_argument("--escenarios", type=int, default=2000)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--parches", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--grupos", type=int, nargs="+", default=[16, 100, 300])
+    parser.add_argument("--mortalidades", type=float, nargs="+", default=[0.1, 1, 5])
+    parser.add_argument("--trabajadores", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Procesos del barrido para medir el escalado")
+    parser.add_argument("--regresion", action="store_true", help="Ejecutar la suite de regresión")
+    parser.add_argument("--linea-base", default=LINEA_BASE, help="Fichero JSON de la línea base")
+    parser.add_argument("--umbral", type=float, default=0.25, help="Empeoramiento relativo admitido")
+    parser.add_argument("--guardar", action="store_true", help="Guardar la línea base con las medidas actuales")
+    parser.add_argument("--referencias", default=REFERENCIAS, help="Fichero JSON de las trayectorias de referencia")
+    parser.add_argument("--guardar-referencias", action="store_true",
+                        help="Guardar las trayectorias actuales como referencia (cambio de resultados intencionado)")
+    args = parser.parse_args()
+
+    if args.regresion:
+        regresiones = suite_regresion(args.linea_base, args.umbral, args.guardar, args.repeticiones,
+                                      referencias=args.referencias, guardar_referencias=args.guardar_referencias)
+        for regresion in regresiones:
+            print(f"REGRESIÓN {regresion}")
+        sys.exit(1 if regresiones else 0)
+
+    if not nucleos.NUMBA_DISPONIBLE:
+        print("Numba no está instalado: solo se mide la versión de NumPy.")
+
+    filas = benchmark_nucleos(args.escenarios, args.dias, args.repeticiones)
+    print(f"{'modelo':<16}{'variante':<10}{'deriv (us)':>12}{'jac (us)':>12}{'lote (s)':>12}{'aceleración':>14}")
+    referencia = {}
+    for fila in filas:
+        if fila["variante"] == "numpy":
+            referencia[fila["modelo"]] = fila["deriv_us"]
+        aceleracion = referencia[fila["modelo"]] / fila["deriv_us"]
+        print(f"{fila['modelo']:<16}{fila['variante']:<10}{fila['deriv_us']:>12.1f}"
+              f"{fila['jac_us']:>12.1f}{fila['lote_s']:>12.3f}{aceleracion:>13.1f}x")
+
+    print()
+    print(f"{'modelo':<16}{'analítica (s)':>14}{'numérica (s)':>14}{'error rel.':>12}{'ramas':>12}")
+    for fila in comprobar_analiticas(args.escenarios, args.dias):
+        print(f"{fila['modelo']:<16}{fila['analitica_s']:>14.4f}{fila['numerica_s']:>14.4f}"
+              f"{fila['error_relativo']:>12.2e}{fila['error_ramas']:>12.2e}")
+
+    print()
+    print(f"{'modelo':<16}{'parches':>9}{'enlaces':>10}{'deriv (us)':>12}{'jac (us)':>12}"
+          f"{'RK45 (s)':>10}{'BDF (s)':>10}")
+    for fila in benchmark_metapoblacion(args.parches, args.dias):
+        print(f"{fila['modelo']:<16}{fila['parches']:>9}{fila['enlaces']:>10}{fila['deriv_us']:>12.1f}"
+              f"{fila['jac_us']:>12.1f}{fila['rk45_s']:>10.3f}{fila['bdf_s']:>10.3f}")
+
+    print()
+    print(f"{'grupos':>8}{'deriv (us)':>12}{'jac (us)':>12}{'R0 (ms)':>10}{'RK45 (s)':>10}{'BDF (s)':>10}")
+    for fila in benchmark_edades(args.grupos, args.dias):
+        print(f"{fila['grupos']:>8}{fila['deriv_us']:>12.1f}{fila['jac_us']:>12.1f}{fila['r0_ms']:>10.2f}"
+              f"{fila['rk45_s']:>10.3f}{fila['bdf_s']:>10.3f}")
+
+    print()
+    print(f"{'mu':>6}{'ajustes':>9}{'rigidez':>10}{'método':>9}{'nfe':>8}{'tiempo (s)':>12}")
+    for fila in benchmark_rigidez(args.escenarios, args.dias, args.mortalidades):
+        print(f"{fila['mu']:>6g}{fila['ajustes']:>9}{fila['rigidez']:>10.0f}{fila['metodo']:>9}"
+              f"{fila['nfe']:>8}{fila['segundos']:>12.3f}")
+
+    print()
+    print(f"{'procesos':>9}{'escenarios':>12}{'tiempo (s)':>12}{'escen./s':>10}{'aceleración':>13}{'eficiencia':>12}")
+    for fila in benchmark_escalado(10 * args.escenarios, args.dias, args.trabajadores):
+        print(f"{fila['trabajadores']:>9}{fila['escenarios']:>12}{fila['segundos']:>12.2f}{fila['escenarios_s']:>10.0f}"
+              f"{fila['aceleracion']:>12.2f}x{fila['eficiencia']:>12.0%}")
+
+
+if __name__ == "__main__":
+    main()
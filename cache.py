@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de caché para los resultados de las simulaciones.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _canonizar(valor):
+    """
+    Convierte un valor en una estructura JSON estable.
+
+    Los números se normalizan a ``float`` (así ``10`` y ``10.0`` dan la misma
+    clave), los arrays a listas y los diccionarios se ordenan al serializar.
+    """
+    if isinstance(valor, dict):
+        return {str(k): _canonizar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_canonizar(v) for v in valor]
+    if isinstance(valor, np.ndarray):
+        return _canonizar(valor.tolist())
+    if isinstance(valor, (bool, np.bool_)) or valor is None or isinstance(valor, str):
+        return valor
+    if isinstance(valor, (int, float, np.integer, np.floating)):
+        return repr(float(valor))
+    return repr(valor)
+
+
+def clave_canonica(modelo, parametros, dias, ajustes=None):
+    """
+    Calcula la clave de caché de una simulación.
+
+    Args:
+        modelo (str): Nombre del modelo.
+        parametros (dict): Parámetros de la simulación.
+        dias (int): Número de días simulados.
+        ajustes (dict, optional): Ajustes del integrador (método, tolerancias...).
+
+    Returns:
+        str: Hash SHA-256 en hexadecimal.
+    """
+    contenido = json.dumps(
+        _canonizar({"modelo": modelo, "parametros": parametros, "dias": dias, "ajustes": ajustes or {}}),
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+class CacheSimulaciones:
+    """
+    Caché LRU en memoria con un nivel opcional en disco.
+
+    Cada entrada es un diccionario nombre -> array. Los arrays se guardan como
+    solo lectura, de modo que un acierto devuelve los mismos objetos sin copiarlos.
+    Si se indica ``directorio``, cada entrada nueva se escribe además como un
+    fichero ``.npz`` y sobrevive a los reinicios de la aplicación.
+
+    Args:
+        capacidad (int): Número máximo de entradas en memoria (0 la desactiva).
+        directorio (str, optional): Directorio para el nivel en disco.
+    """
+
+    def __init__(self, capacidad=256, directorio=None):
+        self.capacidad = capacidad
+        self.directorio = directorio
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.aciertos_disco = 0
+        self.fallos = 0
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.npz")
+
+    def _recordar(self, clave, arrays):
+        # Debe llamarse con el lock adquirido
+        if self.capacidad <= 0:
+            return
+        self._memoria[clave] = arrays
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.capacidad:
+            self._memoria.popitem(last=False)
+
+    def obtener(self, clave):
+        """
+        Busca una entrada en memoria y, si no está, en disco.
+
+        Returns:
+            dict | None: Los arrays guardados o ``None`` si no hay entrada.
+        """
+        with self._lock:
+            arrays = self._memoria.get(clave)
+            if arrays is not None:
+                self._memoria.move_to_end(clave)
+                self.aciertos += 1
+                return arrays
+
+        if self.directorio and os.path.exists(self._ruta(clave)):
+            try:
+                with np.load(self._ruta(clave)) as datos:
+                    arrays = {nombre: datos[nombre] for nombre in datos.files}
+            except (OSError, ValueError):
+                arrays = None
+            if arrays is not None:
+                for array in arrays.values():
+                    array.flags.writeable = False
+                with self._lock:
+                    self.aciertos_disco += 1
+                    self._recordar(clave, arrays)
+                return arrays
+
+        with self._lock:
+            self.fallos += 1
+        return None
+
+    def guardar(self, clave, arrays):
+        """
+        Guarda una entrada en memoria y, si procede, en disco.
+
+        Args:
+            clave (str): Clave obtenida con ``clave_canonica``.
+            arrays (dict): Diccionario nombre -> array.
+
+        Returns:
+            dict: Los arrays guardados (de solo lectura).
+        """
+        arrays = {nombre: np.asarray(array) for nombre, array in arrays.items()}
+        for array in arrays.values():
+            array.flags.writeable = False
+        with self._lock:
+            self._recordar(clave, arrays)
+
+        if self.directorio:
+            # Escritura atómica: otro proceso nunca ve un fichero a medias
+            descriptor, temporal = tempfile.mkstemp(suffix=".npz", dir=self.directorio)
+            try:
+                with os.fdopen(descriptor, "wb") as fichero:
+                    np.savez(fichero, **arrays)
+                os.replace(temporal, self._ruta(clave))
+            except OSError:
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+        return arrays
+
+    def obtener_o_calcular(self, clave, calcular):
+        """
+        Devuelve la entrada de ``clave`` o la calcula con ``calcular()`` y la guarda.
+        """
+        arrays = self.obtener(clave)
+        if arrays is None:
+            arrays = self.guardar(clave, calcular())
+        return arrays
+
+    def limpiar(self, disco=False):
+        """
+        Vacía la memoria (y el directorio si ``disco`` es True) y reinicia los contadores.
+        """
+        with self._lock:
+            self._memoria.clear()
+            self.aciertos = self.aciertos_disco = self.fallos = 0
+        if disco and self.directorio:
+            for nombre in os.listdir(self.directorio):
+                if nombre.endswith(".npz"):
+                    os.remove(os.path.join(self.directorio, nombre))
+
+    def estadisticas(self):
+        """
+        Devuelve los contadores de la caché.
+
+        Returns:
+            dict: Aciertos en memoria y disco, fallos, entradas y tasa de aciertos.
+        """
+        with self._lock:
+            consultas = self.aciertos + self.aciertos_disco + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "aciertos_disco": self.aciertos_disco,
+                "fallos": self.fallos,
+                "entradas": len(self._memoria),
+                "capacidad": self.capacidad,
+                "tasa_aciertos": (self.aciertos + self.aciertos_disco) / consultas if consultas else 0.0,
+            }
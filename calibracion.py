@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de calibración de los modelos con datos observados.
+
+Ajusta algunos parámetros de un modelo (por ejemplo beta y gamma del SIR o b,
+c y gamma de Ross-Macdonald) a series de casos de muchas regiones a la vez:
+
+- Las derivadas de la predicción respecto de los parámetros se obtienen
+  integrando las ecuaciones de sensibilidad junto con el modelo
+  (dS/dt = J·S + df/dθ), con el jacobiano y las derivadas simbólicas que
+  genera ``especificacion``. Una sola integración da la predicción y el
+  gradiente exacto, sin diferencias finitas.
+- Todas las regiones se apilan en un solo estado, como en ``simular_lote``, y
+  cada iteración de Levenberg-Marquardt (Gauss-Newton amortiguado, o
+  puntuación de Fisher con verosimilitudes) resuelve un único sistema para
+  todas las regiones que aún no han convergido.
+- Los parámetros se ajustan en escala logarítmica, de modo que siempre son
+  positivos.
+
+Pérdidas disponibles: "cuadratica" (mínimos cuadrados), "poisson" y
+"binomial_negativa" (log-verosimilitud negativa con dispersión fija).
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.special import gammaln
+
+from metricas import _grupo_contagio
+from models import _nombre_modelo, _obtener_modelo, _preparar_lote
+from solucionadores import AjustesSolver, integrar
+
+PERDIDAS = ("cuadratica", "poisson", "binomial_negativa")
+
+AJUSTES_CALIBRACION = AjustesSolver(metodo="odeint", rtol=1e-6, atol=1e-6, malla="diaria")
+
+# Valor mínimo de la predicción en las verosimilitudes (evita log(0))
+_MINIMO = 1e-9
+
+ResultadoCalibracion = namedtuple(
+    "ResultadoCalibracion",
+    ["parametros", "error_estandar", "perdida", "iteraciones", "convergido", "prediccion"],
+)
+ResultadoCalibracion.__doc__ = """
+Resultado de una calibración por regiones.
+
+Attributes:
+    parametros (dict): Nombre -> array (región,) con todos los parámetros del
+        modelo (los ajustados y los fijos).
+    error_estandar (dict): Nombre -> array (región,) con el error estándar de
+        cada parámetro ajustado (inversa de la información de Fisher y método delta).
+    perdida (numpy.ndarray): Pérdida final de cada región.
+    iteraciones (numpy.ndarray): Iteraciones de cada región.
+    convergido (numpy.ndarray): Si cada región ha alcanzado la tolerancia.
+    prediccion (numpy.ndarray): Serie ajustada, de forma (región, día).
+"""
+
+
+def _matriz(entradas, n, filas, columnas):
+    """
+    Convierte las tuplas anidadas de los jacobianos compilados en un array (n, filas, columnas).
+    """
+    M = np.empty((n, filas, columnas))
+    for i, fila in enumerate(entradas):
+        for j, valor in enumerate(fila):
+            M[:, i, j] = valor
+    return M
+
+
+def _indice_observacion(definicion, observacion):
+    """
+    Devuelve ``(indice, incidencia)``: el compartimento observado y si se observa
+    su prevalencia o los casos nuevos de cada día.
+    """
+    if observacion != "incidencia":
+        if observacion not in definicion.compartimentos:
+            raise ValueError(f"Observación desconocida: {observacion!r}. Opciones: incidencia, "
+                             f"{', '.join(definicion.compartimentos)}")
+        return definicion.compartimentos.index(observacion), False
+    # Los casos nuevos son lo que pierde cada día el origen del contagio (la
+    # primera transición), siempre que no tenga otras entradas ni salidas
+    origen, _ = _grupo_contagio(definicion)
+    if origen is None:
+        raise ValueError("La incidencia solo está disponible si el contagio es la única transición "
+                         "de su compartimento de origen; observe un compartimento")
+    return origen, True
+
+
+def sensibilidades(modelo, parametros, ajustar, dias, ajustes=AJUSTES_CALIBRACION):
+    """
+    Integra un lote de escenarios junto con sus sensibilidades.
+
+    Args:
+        modelo (str | callable): Modelo (como en ``simular_lote``).
+        parametros (dict | array): Parámetros de los escenarios (como en ``simular_lote``).
+        ajustar (tuple): Parámetros respecto de los que se deriva.
+        dias (int): Número de días (la salida es diaria, de 0 a ``dias``).
+        ajustes (AjustesSolver, optional): Integrador y tolerancias.
+
+    Returns:
+        tuple: ``(Y, S)`` con los estados, de forma (escenario, día, compartimento),
+        y sus derivadas respecto de cada parámetro de ``ajustar``, de forma
+        (escenario, día, compartimento, parámetro).
+    """
+    definicion = _obtener_modelo(modelo)
+    desconocidos = [nombre for nombre in ajustar if nombre not in definicion.parametros]
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos: {', '.join(desconocidos)}. "
+                         f"Opciones: {', '.join(definicion.parametros)}")
+    columnas = [definicion.parametros.index(nombre) for nombre in ajustar]
+    p = _preparar_lote(definicion, parametros)
+    n = len(next(iter(p.values())))
+    k, q = len(definicion.compartimentos), len(ajustar)
+    args = tuple(np.broadcast_to(np.asarray(arg, dtype=float), (n,)) for arg in definicion.argumentos(p))
+    n_args = len(args)
+
+    y0 = np.column_stack(definicion.condiciones_iniciales(p)).astype(float)
+    S0 = _matriz(definicion.d_iniciales(p), n, k, len(definicion.parametros))[:, :, columnas]
+    # d(argumento)/d(parámetro) no depende del tiempo
+    D_args = _matriz(definicion.d_argumentos(p), n, n_args, len(definicion.parametros))[:, :, columnas]
+    bloque = k * (1 + q)
+
+    def func(z, t):
+        Z = z.reshape(n, bloque)
+        y = tuple(Z[:, :k].T)
+        S = Z[:, k:].reshape(n, k, q)
+        salida = np.empty((n, bloque))
+        for i, derivada in enumerate(definicion.deriv(y, t, *args)):
+            salida[:, i] = derivada
+        J = _matriz(definicion.jac(y, t, *args), n, k, k)
+        F = _matriz(definicion.jac_argumentos(y, t, *args), n, k, n_args)
+        salida[:, k:] = (J @ S + F @ D_args).reshape(n, k * q)
+        return salida.ravel()
+
+    def Dfun(z, t):
+        # Jacobiano del sistema ampliado en formato banda (como en
+        # ``nucleos``): J en el bloque del estado y en cada columna de S. Se
+        # omiten los términos d(J·S + F·D)/dy, que necesitan segundas
+        # derivadas; el jacobiano solo interviene en las iteraciones de Newton,
+        # así que la aproximación no cambia la precisión de la solución
+        Z = z.reshape(n, bloque)
+        J = _matriz(definicion.jac(tuple(Z[:, :k].T), t, *args), n, k, k)
+        banda = np.zeros((2 * bloque - 1, n * bloque))
+        for f in range(k):
+            for c in range(k):
+                banda[f - c + bloque - 1, c::bloque] = J[:, f, c]
+                for j in range(q):
+                    fila, columna = k + f * q + j, k + c * q + j
+                    banda[fila - columna + bloque - 1, columna::bloque] = J[:, f, c]
+        return banda
+
+    z0 = np.concatenate((y0, S0.reshape(n, k * q)), axis=1).ravel()
+    # Cada escenario solo depende de sí mismo: jacobiano diagonal por bloques
+    _, Z, _ = integrar(func, z0, np.arange(dias + 1, dtype=float), ajustes, Dfun=Dfun,
+                       bandas=(bloque - 1, bloque - 1))
+    Z = Z.reshape(dias + 1, n, bloque).transpose(1, 0, 2)
+    return np.ascontiguousarray(Z[:, :, :k]), Z[:, :, k:].reshape(n, dias + 1, k, q)
+
+
+def _perdida(observados, mu, mascara, perdida, dispersion):
+    """
+    Pérdida de cada región (las observaciones que faltan no cuentan).
+    """
+    if perdida == "cuadratica":
+        terminos = (observados - mu) ** 2
+    else:
+        mu = np.maximum(mu, _MINIMO)
+        if perdida == "poisson":
+            terminos = mu - observados * np.log(mu) + gammaln(observados + 1)
+        else:
+            r = dispersion
+            terminos = -(gammaln(observados + r) - gammaln(r) - gammaln(observados + 1)
+                         + r * np.log(r / (r + mu)) + observados * np.log(mu / (r + mu)))
+    return np.where(mascara, terminos, 0.0).sum(axis=1)
+
+
+def _pesos(mu, mascara, perdida, dispersion):
+    """
+    Pesos de Gauss-Newton / puntuación de Fisher: inversa de la varianza de cada observación.
+    """
+    if perdida == "cuadratica":
+        pesos = np.ones_like(mu)
+    else:
+        mu = np.maximum(mu, _MINIMO)
+        pesos = 1.0 / mu if perdida == "poisson" else 1.0 / (mu + mu ** 2 / dispersion)
+    return np.where(mascara, pesos, 0.0)
+
+
+def _prediccion(modelo, parametros, ajustar, dias, indice, incidencia, ajustes):
+    """
+    Predicción diaria (días 1..dias) y su derivada respecto del logaritmo de
+    cada parámetro ajustado, de formas (región, día) y (región, día, parámetro).
+    """
+    Y, S = sensibilidades(modelo, parametros, ajustar, dias, ajustes)
+    x, dx = Y[:, :, indice], S[:, :, indice, :]
+    if incidencia:
+        mu, dmu = x[:, :-1] - x[:, 1:], dx[:, :-1] - dx[:, 1:]
+    else:
+        mu, dmu = x[:, 1:], dx[:, 1:]
+    theta = np.column_stack([parametros[nombre] for nombre in ajustar])
+    return mu, dmu * theta[:, np.newaxis, :]
+
+
+def _inicio(parametros, ajustar, inicial):
+    """
+    Aplica el arranque en caliente: los valores de ``inicial`` sustituyen a los
+    de ``parametros`` en los parámetros que se ajustan.
+    """
+    if inicial is None:
+        return parametros
+    if isinstance(inicial, ResultadoCalibracion):
+        inicial = inicial.parametros
+    return {**parametros, **{nombre: inicial[nombre] for nombre in ajustar if nombre in inicial}}
+
+
+def calibrar(modelo, observados, parametros, ajustar, observacion="incidencia", perdida="cuadratica",
+             dispersion=10.0, inicial=None, limites=None, max_iter=50, tol=1e-6, ajustes=AJUSTES_CALIBRACION):
+    """
+    Ajusta parámetros de un modelo a las series observadas de una o varias regiones.
+
+    Args:
+        modelo (str | callable): Modelo (como en ``simular_lote``).
+        observados (array): Casos observados de los días 1, 2, ..., D, de forma
+            (D,) para una región o (región, D). NaN marca los días sin dato.
+        parametros (dict): Nombre -> escalar o array (región,) con todos los
+            parámetros del modelo. Los de ``ajustar`` son el punto de partida.
+        ajustar (tuple): Nombres de los parámetros a ajustar (deben ser positivos).
+        observacion (str): "incidencia" (casos nuevos de cada día) o el nombre de
+            un compartimento (prevalencia, por ejemplo "Infectados").
+        perdida (str): "cuadratica", "poisson" o "binomial_negativa".
+        dispersion (float): Parámetro de dispersión r de la binomial negativa
+            (varianza mu + mu²/r).
+        inicial (ResultadoCalibracion | dict, optional): Solución anterior desde la
+            que arrancar (por ejemplo, al añadir los datos de un día nuevo).
+        limites (dict, optional): Nombre -> (mínimo, máximo) de los parámetros
+            ajustados. Evita que un parámetro mal identificado (por ejemplo sigma
+            del SEIR) se vaya a valores que hacen el sistema rígido.
+        max_iter (int): Número máximo de iteraciones.
+        tol (float): Tolerancia en el cambio relativo de la pérdida y en el paso
+            (en escala logarítmica).
+        ajustes (AjustesSolver, optional): Integrador y tolerancias.
+
+    Returns:
+        ResultadoCalibracion: Parámetros, errores estándar, pérdida, iteraciones,
+        convergencia y predicción de cada región.
+    """
+    if perdida not in PERDIDAS:
+        raise ValueError(f"Pérdida desconocida: {perdida!r}. Opciones: {', '.join(PERDIDAS)}")
+    definicion = _obtener_modelo(modelo)
+    ajustar = tuple(ajustar)
+    indice, incidencia = _indice_observacion(definicion, observacion)
+    observados = np.atleast_2d(np.asarray(observados, dtype=float))
+    n, dias = observados.shape
+    mascara = np.isfinite(observados)
+    observados = np.where(mascara, observados, 0.0)
+
+    p = _preparar_lote(definicion, _inicio(parametros, ajustar, inicial))
+    p = {nombre: np.array(np.broadcast_to(valor, (n,)) if len(valor) == 1 else valor, dtype=float)
+         for nombre, valor in p.items()}
+    if any(len(valor) != n for valor in p.values()):
+        raise ValueError(f"Los parámetros por región deben tener longitud {n}")
+    if any(np.any(p[nombre] <= 0) for nombre in ajustar):
+        raise ValueError("Los parámetros ajustados deben partir de valores positivos")
+
+    def evaluar(regiones, log_theta):
+        subconjunto = {nombre: valor[regiones] for nombre, valor in p.items()}
+        subconjunto.update(zip(ajustar, np.exp(log_theta).T))
+        mu, dmu = _prediccion(modelo, subconjunto, ajustar, dias, indice, incidencia, ajustes)
+        return mu, dmu, _perdida(observados[regiones], mu, mascara[regiones], perdida, dispersion)
+
+    todas = np.arange(n)
+    limites = limites or {}
+    with np.errstate(divide="ignore"):
+        minimo = np.log([limites.get(nombre, (0.0, np.inf))[0] for nombre in ajustar])
+        maximo = np.log([limites.get(nombre, (0.0, np.inf))[1] for nombre in ajustar])
+    log_theta = np.clip(np.log(np.column_stack([p[nombre] for nombre in ajustar])), minimo, maximo)
+    mu, dmu, valor = evaluar(todas, log_theta)
+    # Amortiguación inicial moderada: lejos del óptimo los pesos de Poisson y
+    # de la binomial negativa (1/mu) describen mal la pérdida
+    amortiguacion = np.full(n, 1e-1)
+    iteraciones = np.zeros(n, dtype=np.int64)
+    convergido = np.zeros(n, dtype=bool)
+    activas = todas[np.isfinite(valor)]
+
+    for _ in range(max_iter):
+        if not len(activas):
+            break
+        # Paso de Levenberg-Marquardt de cada región activa: (H + λ·diag H) δ = g
+        w = _pesos(mu[activas], mascara[activas], perdida, dispersion)
+        residuo = observados[activas] - mu[activas]
+        G = dmu[activas]
+        H = np.einsum("rdi,rd,rdj->rij", G, w, G)
+        g = np.einsum("rdi,rd,rd->ri", G, w, residuo)
+        diagonal = np.einsum("rii->ri", H)
+        A = H + (amortiguacion[activas, np.newaxis] * np.maximum(diagonal, 1e-12))[:, :, np.newaxis] * np.eye(len(ajustar))
+        paso = np.linalg.solve(A, g[:, :, np.newaxis])[:, :, 0]
+        # Como mucho un factor e^0.5 por iteración en cada parámetro
+        paso *= np.minimum(1.0, 0.5 / np.maximum(np.abs(paso).max(axis=1), 1e-300))[:, np.newaxis]
+        paso = np.clip(log_theta[activas] + paso, minimo, maximo) - log_theta[activas]
+        # Reducción de la pérdida que predice el modelo cuadrático (g es menos
+        # el gradiente; en mínimos cuadrados la pérdida lleva un factor 2)
+        prevista = (np.einsum("ri,ri->r", g, paso)
+                    - 0.5 * np.einsum("ri,rij,rj->r", paso, H, paso)) * (2.0 if perdida == "cuadratica" else 1.0)
+
+        with np.errstate(all="ignore"):
+            mu_nuevo, dmu_nuevo, valor_nuevo = evaluar(activas, log_theta[activas] + paso)
+        iteraciones[activas] += 1
+        # Razón de ganancia: un paso que mejora mucho menos de lo previsto (los
+        # pesos de las verosimilitudes son malos lejos del óptimo) se rechaza y
+        # aumenta la amortiguación
+        reduccion = valor[activas] - valor_nuevo
+        with np.errstate(all="ignore"):
+            ganancia = reduccion / np.maximum(prevista, 1e-300)
+        mejora = np.isfinite(valor_nuevo) & (reduccion >= 0) & ((ganancia > 0.25) | (reduccion == 0))
+        aceptadas = activas[mejora]
+        cambio = reduccion[mejora] / np.maximum(np.abs(valor[aceptadas]), 1e-300)
+        log_theta[aceptadas] += paso[mejora]
+        mu[aceptadas], dmu[aceptadas], valor[aceptadas] = mu_nuevo[mejora], dmu_nuevo[mejora], valor_nuevo[mejora]
+        amortiguacion[aceptadas] = np.maximum(amortiguacion[aceptadas] / 3.0, 1e-9)
+        rechazadas = activas[~mejora]
+        amortiguacion[rechazadas] *= 4.0
+
+        convergido[aceptadas] = (cambio < tol) | (np.abs(paso[mejora]).max(axis=1) < tol)
+        # Si ningún paso mejora ni con mucha amortiguación, se está en un mínimo
+        convergido[rechazadas] = amortiguacion[rechazadas] > 1e8
+        activas = activas[~convergido[activas]]
+
+    # Errores estándar: inversa de la información de Fisher en escala
+    # logarítmica y método delta (en mínimos cuadrados, escalada por la
+    # varianza residual)
+    theta = np.exp(log_theta)
+    w = _pesos(mu, mascara, perdida, dispersion)
+    H = np.einsum("rdi,rd,rdj->rij", dmu, w, dmu)
+    covarianza = np.linalg.pinv(H)
+    if perdida == "cuadratica":
+        libertad = np.maximum(mascara.sum(axis=1) - len(ajustar), 1)
+        covarianza *= (valor / libertad)[:, np.newaxis, np.newaxis]
+    error = theta * np.sqrt(np.maximum(np.einsum("rii->ri", covarianza), 0.0))
+
+    p.update(zip(ajustar, theta.T))
+    return ResultadoCalibracion(
+        parametros=p,
+        error_estandar=dict(zip(ajustar, error.T)),
+        perdida=valor,
+        iteraciones=iteraciones,
+        convergido=convergido,
+        prediccion=mu,
+    )
+
+
+def _calibrar_bloque(nombre, observados, parametros, ajustar, opciones):
+    """
+    Calibra un bloque de regiones (función de nivel de módulo para el ejecutor de procesos).
+    """
+    return calibrar(nombre, observados, parametros, ajustar, **opciones)
+
+
+def calibrar_multiinicio(modelo, observados, parametros, ajustar, limites, inicios=8, semilla=None,
+                         max_trabajadores=1, tam_bloque=512, **opciones):
+    """
+    Calibra desde varios puntos de partida y se queda con el mejor de cada región.
+
+    Los inicios se sortean de forma log-uniforme dentro de ``limites``, que
+    también acotan el ajuste (el primero es el punto de ``parametros``). Todas las combinaciones región ×
+    inicio se apilan en un mismo lote, que se reparte en bloques entre procesos.
+
+    Args:
+        modelo (str | callable): Modelo (como en ``calibrar``).
+        observados (array): Casos observados, de forma (D,) o (región, D).
+        parametros (dict): Parámetros del modelo (como en ``calibrar``).
+        ajustar (tuple): Nombres de los parámetros a ajustar.
+        limites (dict): Nombre -> (mínimo, máximo) de cada parámetro ajustado.
+        inicios (int): Número de puntos de partida por región.
+        semilla (int, optional): Semilla de los inicios.
+        max_trabajadores (int): Procesos para repartir los bloques.
+        tam_bloque (int): Combinaciones región × inicio por bloque.
+        **opciones: Opciones de ``calibrar`` (observacion, perdida, max_iter...).
+
+    Returns:
+        ResultadoCalibracion: El mejor ajuste de cada región.
+    """
+    definicion = _obtener_modelo(modelo)
+    ajustar = tuple(ajustar)
+    observados = np.atleast_2d(np.asarray(observados, dtype=float))
+    n = len(observados)
+    p = _preparar_lote(definicion, _inicio(parametros, ajustar, opciones.pop("inicial", None)))
+    p = {nombre: np.broadcast_to(valor, (n,)) if len(valor) == 1 else valor for nombre, valor in p.items()}
+
+    # Combinación j = inicio · n + región
+    rng = np.random.default_rng(semilla)
+    lote = {nombre: np.tile(valor, inicios) for nombre, valor in p.items()}
+    for nombre in ajustar:
+        minimo, maximo = np.log(limites[nombre])
+        lote[nombre][n:] = np.exp(rng.uniform(minimo, maximo, size=n * (inicios - 1)))
+    observados_lote = np.tile(observados, (inicios, 1))
+
+    tareas = [(_nombre_modelo(modelo), observados_lote[i:i + tam_bloque],
+               {nombre: valor[i:i + tam_bloque] for nombre, valor in lote.items()}, ajustar,
+               {**opciones, "limites": limites})
+              for i in range(0, n * inicios, tam_bloque)]
+    if max_trabajadores > 1 and len(tareas) > 1:
+        with ProcessPoolExecutor(max_workers=max_trabajadores) as pool:
+            resultados = list(pool.map(_calibrar_bloque, *zip(*tareas)))
+    else:
+        resultados = [_calibrar_bloque(*tarea) for tarea in tareas]
+
+    perdida = np.concatenate([r.perdida for r in resultados]).reshape(inicios, n)
+    mejor = np.argmin(np.where(np.isfinite(perdida), perdida, np.inf), axis=0) * n + np.arange(n)
+
+    def unir(campo):
+        return np.concatenate([getattr(r, campo) for r in resultados])[mejor]
+
+    return ResultadoCalibracion(
+        parametros={nombre: np.concatenate([r.parametros[nombre] for r in resultados])[mejor]
+                    for nombre in definicion.parametros},
+        error_estandar={nombre: np.concatenate([r.error_estandar[nombre] for r in resultados])[mejor]
+                        for nombre in ajustar},
+        perdida=unir("perdida"),
+        iteraciones=unir("iteraciones"),
+        convergido=unir("convergido"),
+        prediccion=unir("prediccion"),
+    )
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo para la relación entre el clima y los parámetros biológicos del vector.
+
+La tasa de picaduras (a) depende de la temperatura y la densidad de mosquitos
+por humano (m) de la humedad. Cada relación es una curva de respuesta que se
+elige por nombre (``CURVAS_PICADURAS`` y ``CURVAS_DENSIDAD``) o se pasa como
+función; todas operan sobre arrays de NumPy.
+"""
+
+from functools import lru_cache, partial
+
+import numpy as np
+
+# Mortalidad base de los mosquitos (por día)
+MU_MOSQUITO = 0.1
+
+
+def picaduras_lineal(temp):
+    """
+    Tasa de picaduras lineal en la temperatura, con un mínimo de 0.05 por día.
+    """
+    return np.maximum(0.05, 0.2 + 0.02 * (np.asarray(temp, dtype=float) - 20))
+
+
+def picaduras_briere(temp, c=2.02e-4, t_min=13.35, t_max=40.08):
+    """
+    Curva térmica de Briere: ``c·T·(T - t_min)·sqrt(t_max - T)``, nula fuera de (t_min, t_max).
+
+    Los valores por defecto son los de la tasa de picaduras de *Aedes aegypti*
+    (Mordecai et al., 2017).
+    """
+    temp = np.asarray(temp, dtype=float)
+    dentro = (temp > t_min) & (temp < t_max)
+    valor = c * temp * (temp - t_min) * np.sqrt(np.where(dentro, t_max - temp, 0.0))
+    return np.where(dentro, valor, 0.0)
+
+
+def picaduras_cuadratica(temp, c=2.0e-3, t_min=13.35, t_max=40.08):
+    """
+    Curva térmica cuadrática: ``-c·(T - t_min)·(T - t_max)``, nula fuera de (t_min, t_max).
+    """
+    temp = np.asarray(temp, dtype=float)
+    return np.maximum(0.0, -c * (temp - t_min) * (temp - t_max))
+
+
+def densidad_lineal(hum):
+    """
+    Densidad de mosquitos por humano: ``hum/100`` (mínimo 0.1) por debajo del
+    30 % de humedad y ``1 + 0.05·(hum - 30)`` a partir de ahí.
+    """
+    hum = np.asarray(hum, dtype=float)
+    return np.where(hum < 30, np.maximum(0.1, hum / 100), 1 + 0.05 * (hum - 30))
+
+
+CURVAS_PICADURAS = {
+    "lineal": picaduras_lineal,
+    "briere": picaduras_briere,
+    "cuadratica": picaduras_cuadratica,
+}
+
+CURVAS_DENSIDAD = {
+    "lineal": densidad_lineal,
+}
+
+
+def _curva(curva, curvas):
+    if callable(curva):
+        return curva
+    try:
+        return curvas[curva]
+    except KeyError:
+        raise ValueError(f"Curva desconocida: {curva!r}. Opciones: {', '.join(curvas)}") from None
+
+
+def calc_params_bio(temp, hum, curva_picaduras="lineal", curva_densidad="lineal"):
+    """
+    Calcula la tasa de picaduras y la densidad de mosquitos a partir del clima.
+
+    Args:
+        temp (float | array): Temperatura (°C).
+        hum (float | array): Humedad relativa (%).
+        curva_picaduras (str | callable): Curva de ``CURVAS_PICADURAS`` o función de la temperatura.
+        curva_densidad (str | callable): Curva de ``CURVAS_DENSIDAD`` o función de la humedad.
+
+    Returns:
+        tuple: Tasa de picaduras (a) y densidad de mosquitos por humano (m),
+        con la forma común de ``temp`` y ``hum`` (escalares si ambos lo son).
+    """
+    temp, hum = np.broadcast_arrays(np.asarray(temp, dtype=float), np.asarray(hum, dtype=float))
+    a_val = np.asarray(_curva(curva_picaduras, CURVAS_PICADURAS)(temp), dtype=float)
+    m_val = np.asarray(_curva(curva_densidad, CURVAS_DENSIDAD)(hum), dtype=float)
+    return a_val[()], m_val[()]
+
+
+class TablaClima:
+    """
+    Tabla precalculada de (a, m) con interpolación lineal, para curvas costosas
+    de evaluar (por ejemplo, funciones de usuario) en rejillas finas.
+
+    Como a solo depende de la temperatura y m solo de la humedad, basta con dos
+    vectores. Los nodos están equiespaciados, así que el intervalo de cada
+    punto se obtiene con una división (sin búsqueda) y el coste de la consulta
+    no depende de la curva. Fuera del rango de la tabla se usa el valor del extremo.
+
+    Attributes:
+        temp (numpy.ndarray): Nodos de temperatura.
+        hum (numpy.ndarray): Nodos de humedad.
+        a (numpy.ndarray): Tasa de picaduras en cada nodo de temperatura.
+        m (numpy.ndarray): Densidad de mosquitos en cada nodo de humedad.
+    """
+
+    def __init__(self, curva_picaduras="lineal", curva_densidad="lineal",
+                 rango_temp=(0.0, 50.0), rango_hum=(0.0, 100.0), resolucion=0.01):
+        self.temp = np.arange(rango_temp[0], rango_temp[1] + resolucion / 2, resolucion)
+        self.hum = np.arange(rango_hum[0], rango_hum[1] + resolucion / 2, resolucion)
+        self.a = np.asarray(_curva(curva_picaduras, CURVAS_PICADURAS)(self.temp), dtype=float)
+        self.m = np.asarray(_curva(curva_densidad, CURVAS_DENSIDAD)(self.hum), dtype=float)
+        self.resolucion = resolucion
+
+    def _interpolar(self, x, nodos, valores):
+        posicion = np.clip((x - nodos[0]) / self.resolucion, 0, len(nodos) - 1)
+        indice = np.minimum(posicion.astype(np.intp), len(nodos) - 2)
+        fraccion = posicion - indice
+        return valores[indice] * (1 - fraccion) + valores[indice + 1] * fraccion
+
+    def __call__(self, temp, hum):
+        """
+        Interpola (a, m) en las temperaturas y humedades dadas (como ``calc_params_bio``).
+        """
+        temp, hum = np.broadcast_arrays(np.asarray(temp, dtype=float), np.asarray(hum, dtype=float))
+        return self._interpolar(temp, self.temp, self.a)[()], self._interpolar(hum, self.hum, self.m)[()]
+
+
+@lru_cache(maxsize=16)
+def tabla_clima(curva_picaduras="lineal", curva_densidad="lineal", resolucion=0.01):
+    """
+    Devuelve una ``TablaClima`` compartida para las curvas dadas (se construye una sola vez).
+    """
+    return TablaClima(curva_picaduras, curva_densidad, resolucion=resolucion)
+
+
+def preparar_ross_macdonald(muestras, curva_picaduras="lineal", curva_densidad="lineal", tabla=False):
+    """
+    Convierte muestras climáticas en parámetros del modelo Ross-Macdonald.
+
+    Sustituye las claves "temp" y "humedad" por "a" y "m" y añade la mortalidad
+    base "mu" si no viene dada. Se puede pasar como ``preparar`` a un barrido;
+    para otras curvas, con ``preparador_ross_macdonald``.
+
+    Args:
+        muestras (dict): Parámetros del modelo con "temp" y "humedad" en lugar de
+            "a" y "m" (escalares o arrays de la misma longitud).
+        curva_picaduras (str | callable): Curva de la tasa de picaduras.
+        curva_densidad (str | callable): Curva de la densidad de mosquitos.
+        tabla (bool): Interpolar en una ``TablaClima`` en lugar de evaluar las curvas.
+
+    Returns:
+        dict: Parámetros listos para ``simular_lote("ross_macdonald", ...)``.
+    """
+    parametros = dict(muestras)
+    temp = np.atleast_1d(np.asarray(parametros.pop("temp"), dtype=float))
+    hum = np.atleast_1d(np.asarray(parametros.pop("humedad"), dtype=float))
+    if tabla:
+        parametros["a"], parametros["m"] = tabla_clima(curva_picaduras, curva_densidad)(temp, hum)
+    else:
+        parametros["a"], parametros["m"] = calc_params_bio(temp, hum, curva_picaduras, curva_densidad)
+    parametros.setdefault("mu", MU_MOSQUITO)
+    return parametros
+
+
+def preparador_ross_macdonald(curva_picaduras="lineal", curva_densidad="lineal", tabla=False):
+    """
+    Devuelve un ``preparar`` para barridos con las curvas dadas.
+
+    El resultado se puede serializar para el ejecutor de procesos siempre que
+    las curvas sean nombres o funciones de nivel de módulo.
+    """
+    return partial(preparar_ross_macdonald, curva_picaduras=curva_picaduras,
+                   curva_densidad=curva_densidad, tabla=tabla)
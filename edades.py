@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de modelos SIR y SEIR estructurados por edades.
+
+La población se divide en K grupos de edad, cada uno con su población y sus
+propios parámetros, que se mezclan según una matriz de contactos C de forma
+(grupo, grupo): C[i, j] es el número medio de contactos diarios de una
+persona del grupo i con personas del grupo j (por ejemplo, las matrices de
+POLYMOD o de Prem et al.). La fuerza de infección sobre el grupo i es
+
+    lambda_i = beta_i · sum_j C[i, j] · I_j / N_j
+
+con ``beta`` la probabilidad de contagio por contacto (o la susceptibilidad
+del grupo). Con un único grupo y C = [[1]] se recupera el modelo homogéneo.
+
+El estado es un array contiguo (compartimento, grupo) ([S de todos los
+grupos | E | I | R]), de modo que la fuerza de infección es un único producto
+matriz-vector denso (BLAS) por evaluación. El jacobiano es disperso por
+bloques: diagonal salvo los bloques del contagio, que son densos (K × K). Los
+métodos implícitos (BDF, Radau) lo usan; el método por defecto es RK45, que
+solo evalúa derivadas.
+
+R0 es el radio espectral de la matriz de nueva generación
+``diag(beta · N) · C · diag(1 / (N · gamma))``, que se calcula con ARPACK
+(``scipy.sparse.linalg.eigs``) como operador lineal, sin formarla.
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator, eigs
+
+from models import _obtener_modelo, _preparar_lote, MODELOS
+from solucionadores import AjustesSolver, integrar, malla_tiempos
+
+# Los métodos con jacobiano de banda (odeint, LSODA) no sirven aquí: los
+# contactos entre grupos no tienen estructura de banda
+METODOS_EDADES = ("RK45", "RK23", "DOP853", "BDF", "Radau", "rk4", "euler")
+
+AJUSTES_EDADES = AjustesSolver(metodo="RK45", malla="diaria")
+
+# Por debajo de este número de grupos R0 se calcula con un autovalor denso, que
+# es más rápido (y ARPACK necesita al menos tres)
+MIN_GRUPOS_ARPACK = 16
+
+
+# Los jacobianos se devuelven por bloques (compartimento, compartimento): None
+# si el bloque es nulo, un vector si es diagonal y una matriz (grupo, grupo) si
+# es denso.
+
+def _deriv_sir(y, C, N, beta, gamma):
+    S, I, R = y
+    contagios = beta * S * (C @ (I / N))
+    recuperaciones = gamma * I
+    return -contagios, contagios - recuperaciones, recuperaciones
+
+
+def _contagio(S, I, C, N, beta):
+    # Derivadas de los contagios respecto de S (diagonal) y de I (densa)
+    dS = beta * (C @ (I / N))
+    dI = (beta * S)[:, np.newaxis] * C / N
+    return dS, dI
+
+
+def _jac_sir(y, C, N, beta, gamma):
+    S, I, R = y
+    dS, dI = _contagio(S, I, C, N, beta)
+    dII = dI.copy()
+    dII.flat[::len(S) + 1] -= gamma
+    return ((-dS, -dI, None),
+            (dS, dII, None),
+            (None, gamma, None))
+
+
+def _deriv_seir(y, C, N, beta, gamma, sigma):
+    S, E, I, R = y
+    contagios = beta * S * (C @ (I / N))
+    incubados = sigma * E
+    recuperaciones = gamma * I
+    return -contagios, contagios - incubados, incubados - recuperaciones, recuperaciones
+
+
+def _jac_seir(y, C, N, beta, gamma, sigma):
+    S, E, I, R = y
+    dS, dI = _contagio(S, I, C, N, beta)
+    return ((-dS, None, -dI, None),
+            (dS, -sigma, dI, None),
+            (None, sigma, -gamma, None),
+            (None, None, gamma, None))
+
+
+def _ensamblador(bloques, grupos):
+    """
+    Prepara el montaje del jacobiano por bloques como matriz CSC.
+
+    La estructura no cambia entre evaluaciones, así que los índices CSC y el
+    orden en que hay que colocar los valores de los bloques se calculan una
+    vez; cada evaluación solo reordena los valores.
+    """
+    filas, columnas = [], []
+    for a, fila in enumerate(bloques):
+        for b, bloque in enumerate(fila):
+            if bloque is None:
+                continue
+            if np.ndim(bloque) == 1:
+                r = c = np.arange(grupos)
+            else:
+                r, c = np.divmod(np.arange(grupos * grupos), grupos)
+            filas.append(a * grupos + r)
+            columnas.append(b * grupos + c)
+    filas, columnas = np.concatenate(filas), np.concatenate(columnas)
+    n = len(bloques) * grupos
+    # Los valores de la plantilla son las posiciones (desde 1, para que
+    # ninguno sea un cero) de cada entrada en los bloques concatenados
+    plantilla = sparse.csc_matrix((np.arange(1.0, len(filas) + 1), (filas, columnas)), shape=(n, n))
+    orden = plantilla.data.astype(np.intp) - 1
+    indices, indptr = plantilla.indices, plantilla.indptr
+
+    def ensamblar(bloques):
+        valores = np.concatenate([np.ravel(bloque) for fila in bloques for bloque in fila if bloque is not None])
+        return sparse.csc_matrix((valores[orden], indices, indptr), shape=(n, n))
+
+    return ensamblar
+
+
+_MODELOS_EDADES = {
+    "sir": (_deriv_sir, _jac_sir),
+    "seir": (_deriv_seir, _jac_seir),
+}
+
+
+def _preparar(modelo, contactos, parametros):
+    """
+    Valida la matriz de contactos y difunde los parámetros a un valor por grupo.
+
+    Returns:
+        tuple: ``(nombre, definicion, C, p)`` con C densa y contigua.
+    """
+    definicion = _obtener_modelo(modelo)
+    nombre = next((n for n in _MODELOS_EDADES if MODELOS[n] is definicion), None)
+    if nombre is None:
+        raise ValueError(f"Modelo sin versión por edades: {modelo!r}. Opciones: {', '.join(_MODELOS_EDADES)}")
+    C = contactos.toarray() if sparse.issparse(contactos) else contactos
+    C = np.ascontiguousarray(C, dtype=float)
+    grupos = C.shape[0]
+    if C.shape != (grupos, grupos):
+        raise ValueError(f"La matriz de contactos debe ser cuadrada (forma {C.shape})")
+    if np.any(C < 0):
+        raise ValueError("La matriz de contactos no puede tener valores negativos")
+    p = _preparar_lote(definicion, parametros)
+    p = {nombre_p: np.broadcast_to(valor, (grupos,)) if len(valor) == 1 else valor for nombre_p, valor in p.items()}
+    if any(len(valor) != grupos for valor in p.values()):
+        raise ValueError(f"Los parámetros por grupo deben tener longitud {grupos}")
+    return nombre, definicion, C, p
+
+
+def preparar_edades(modelo, contactos, parametros):
+    """
+    Prepara el estado inicial y las funciones de un modelo por edades.
+
+    Args:
+        modelo (str | callable): "sir" o "seir".
+        contactos (array): Matriz de contactos C de forma (grupo, grupo),
+            densa o de ``scipy.sparse``.
+        parametros (dict): Parámetros del modelo homogéneo, cada uno escalar o
+            array con un valor por grupo.
+
+    Returns:
+        tuple: ``(definicion, y0, func, Dfun)``; ``y0`` tiene forma
+        (compartimento · grupo,) y ``func(y, t)`` / ``Dfun(y, t)`` tienen la
+        firma de ``solucionadores.integrar`` (el jacobiano es disperso).
+    """
+    nombre, definicion, C, p = _preparar(modelo, contactos, parametros)
+    deriv, jac = _MODELOS_EDADES[nombre]
+    grupos = C.shape[0]
+    y0 = np.concatenate(definicion.condiciones_iniciales(p)).astype(float)
+    args = tuple(np.ascontiguousarray(arg, dtype=float) for arg in definicion.argumentos(p))
+    k = len(definicion.compartimentos)
+
+    def func(y, t):
+        return np.concatenate(deriv(y.reshape(k, grupos), C, *args))
+
+    ensamblar = _ensamblador(jac(y0.reshape(k, grupos), C, *args), grupos)
+
+    def Dfun(y, t):
+        return ensamblar(jac(y.reshape(k, grupos), C, *args))
+
+    return definicion, y0, func, Dfun
+
+
+def simular_edades(modelo, contactos, parametros, dias, ajustes=AJUSTES_EDADES):
+    """
+    Simula un modelo SIR o SEIR estructurado por edades.
+
+    Args:
+        modelo (str | callable): "sir" o "seir".
+        contactos (array): Matriz de contactos C de forma (grupo, grupo).
+        parametros (dict): Parámetros del modelo homogéneo, cada uno escalar o
+            array con un valor por grupo (``beta`` es la probabilidad de
+            contagio por contacto).
+        dias (int): Número de días para simular.
+        ajustes (AjustesSolver, optional): Método (uno de ``METODOS_EDADES``),
+            tolerancias y malla (por defecto RK45 con un punto por día).
+
+    Returns:
+        tuple: ``(t, datos)`` con los tiempos y un array de forma
+        (grupo, tiempo, compartimento).
+    """
+    if ajustes.metodo not in METODOS_EDADES:
+        raise ValueError(f"Método no disponible en el modelo por edades: {ajustes.metodo!r}. "
+                         f"Opciones: {', '.join(METODOS_EDADES)}")
+    if ajustes.malla == "eventos":
+        raise ValueError("La malla 'eventos' no está disponible en el modelo por edades")
+    definicion, y0, func, Dfun = preparar_edades(modelo, contactos, parametros)
+    k = len(definicion.compartimentos)
+    t, Y, _ = integrar(func, y0, malla_tiempos(ajustes, dias), ajustes, Dfun=Dfun)
+    return t, np.ascontiguousarray(Y.reshape(len(t), k, -1).transpose(2, 0, 1))
+
+
+def numero_reproductivo_edades(modelo, contactos, parametros):
+    """
+    Calcula R0 de un modelo por edades como radio espectral de la matriz de
+    nueva generación ``diag(beta · N) · C · diag(1 / (N · gamma))``.
+
+    Args:
+        modelo (str | callable): "sir" o "seir" (la incubación no cambia R0).
+        contactos (array): Matriz de contactos C de forma (grupo, grupo).
+        parametros (dict): Parámetros por grupo (como en ``simular_edades``).
+
+    Returns:
+        float: R0.
+    """
+    _, definicion, C, p = _preparar(modelo, contactos, parametros)
+    N, beta, gamma = (np.asarray(arg, dtype=float) for arg in definicion.argumentos(p)[:3])
+    entrada = beta * N
+    salida = 1.0 / (N * gamma)
+    grupos = C.shape[0]
+    if grupos < MIN_GRUPOS_ARPACK:
+        return float(np.max(np.abs(np.linalg.eigvals(entrada[:, np.newaxis] * C * salida))))
+    operador = LinearOperator((grupos, grupos), matvec=lambda x: entrada * (C @ (salida * np.ravel(x))),
+                              dtype=float)
+    # La matriz es no negativa: su radio espectral es el autovalor de mayor módulo
+    return float(np.abs(eigs(operador, k=1, which="LM", return_eigenvectors=False)[0]))
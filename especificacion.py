@@ -0,0 +1,412 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo para definir modelos compartimentales de forma declarativa.
+
+Un modelo se describe una sola vez con sus compartimentos, sus parámetros y
+sus transiciones (origen, destino y tasa como expresión de Python). A partir
+de esa descripción ``ModeloCompartimental.compilar`` genera:
+
+- las derivadas, válidas para escalares y para arrays de forma (n,);
+- el jacobiano analítico (derivando las tasas simbólicamente) y su estructura
+  de ceros;
+- la tabla de transiciones de la simulación estocástica;
+- el número reproductivo básico R0 por la matriz de nueva generación, si se
+  indican los compartimentos infectados y el equilibrio libre de enfermedad.
+- las derivadas respecto de los argumentos y de los parámetros de entrada que
+  usan las ecuaciones de sensibilidad de la calibración.
+
+Ejemplo (SEIRS)::
+
+    SEIRS = ModeloCompartimental(
+        estados=("S", "E", "I", "R"),
+        compartimentos=("Susceptibles", "Expuestos", "Infectados", "Recuperados"),
+        parametros=("poblacion", "infectados_iniciales", "beta", "sigma", "gamma", "omega"),
+        argumentos={"N": "poblacion", "beta": "beta", "sigma": "sigma", "gamma": "gamma", "omega": "omega"},
+        iniciales=("poblacion - infectados_iniciales", "0", "infectados_iniciales", "0"),
+        transiciones=(
+            Transicion("S", "E", "beta * S * I / N", infeccion=True),
+            Transicion("E", "I", "sigma * E"),
+            Transicion("I", "R", "gamma * I"),
+            Transicion("R", "S", "omega * R"),
+        ),
+        infectados=("E", "I"),
+        libre_de_enfermedad={"S": "N"},
+    )
+    definicion = SEIRS.compilar()
+"""
+
+import ast
+from collections import namedtuple
+from dataclasses import dataclass, field
+
+import numpy as np
+
+Transicion = namedtuple("Transicion", ["origen", "destino", "tasa", "infeccion"], defaults=(False,))
+Transicion.__doc__ = """
+Transición entre compartimentos.
+
+Attributes:
+    origen (str | None): Estado que pierde un individuo (None para nacimientos o entradas).
+    destino (str | None): Estado que gana un individuo (None para muertes o salidas).
+    tasa (str): Expresión de la tasa en función de los estados y los argumentos.
+    infeccion (bool): Si es un contagio (cuenta para R0 y para el tamaño del brote).
+"""
+
+DefinicionModelo = namedtuple(
+    "DefinicionModelo",
+    ["compartimentos", "parametros", "condiciones_iniciales", "argumentos", "deriv", "jac", "analitica",
+     "tasas", "cambios", "estructura", "r0", "jac_argumentos", "d_iniciales", "d_argumentos", "brote"],
+    defaults=(None,) * 9,
+)
+DefinicionModelo.__doc__ = """
+Modelo compilado, con las funciones que usan los integradores.
+
+``deriv``, ``jac`` y ``tasas`` tienen la firma ``f(y, t, *argumentos)``; ``jac``
+devuelve tuplas anidadas J[i][j] = d(dy_i/dt)/dy_j. ``estructura`` es la
+máscara booleana de entradas no nulas del jacobiano y ``r0(*argumentos)``
+devuelve R0 por escenario (``r0(*argumentos, y=estado)``, el número
+reproductivo efectivo en ese estado).
+
+Para las sensibilidades: ``jac_argumentos(y, t, *argumentos)`` devuelve
+d(dy_i/dt)/d(argumento_j), y ``d_iniciales(p)`` y ``d_argumentos(p)`` las
+derivadas de las condiciones iniciales y de los argumentos respecto de cada
+parámetro de entrada (tuplas anidadas de escalares o arrays).
+
+``brote`` es la tupla de índices de las transiciones que cuentan para el
+tamaño del brote de la simulación estocástica.
+"""
+
+# Funciones que se pueden usar en las tasas
+_FUNCIONES = {"exp": np.exp, "log": np.log, "sqrt": np.sqrt}
+
+_RESERVADOS = {"y", "t", "p", "np"} | set(_FUNCIONES)
+
+
+# ---------------------------------------------------------------------------
+# Derivación simbólica sobre el árbol sintáctico de las expresiones
+# ---------------------------------------------------------------------------
+
+def _constante(valor):
+    return ast.Constant(value=valor)
+
+
+def _es(nodo, valor):
+    return isinstance(nodo, ast.Constant) and nodo.value == valor
+
+
+def _negar(a):
+    if _es(a, 0):
+        return a
+    if isinstance(a, ast.UnaryOp) and isinstance(a.op, ast.USub):
+        return a.operand
+    return ast.UnaryOp(op=ast.USub(), operand=a)
+
+
+def _sumar(a, b):
+    if _es(a, 0):
+        return b
+    if _es(b, 0):
+        return a
+    return ast.BinOp(left=a, op=ast.Add(), right=b)
+
+
+def _restar(a, b):
+    if _es(b, 0):
+        return a
+    if _es(a, 0):
+        return _negar(b)
+    return ast.BinOp(left=a, op=ast.Sub(), right=b)
+
+
+def _multiplicar(a, b):
+    if _es(a, 0) or _es(b, 0):
+        return _constante(0)
+    if _es(a, 1):
+        return b
+    if _es(b, 1):
+        return a
+    return ast.BinOp(left=a, op=ast.Mult(), right=b)
+
+
+def _dividir(a, b):
+    if _es(a, 0):
+        return a
+    if _es(b, 1):
+        return a
+    return ast.BinOp(left=a, op=ast.Div(), right=b)
+
+
+def _derivar(nodo, x):
+    """
+    Deriva la expresión ``nodo`` respecto del nombre ``x`` y simplifica los
+    ceros y unos que aparecen al aplicar las reglas.
+    """
+    if isinstance(nodo, ast.Constant):
+        return _constante(0)
+    if isinstance(nodo, ast.Name):
+        return _constante(1 if nodo.id == x else 0)
+    if isinstance(nodo, ast.UnaryOp) and isinstance(nodo.op, (ast.USub, ast.UAdd)):
+        d = _derivar(nodo.operand, x)
+        return _negar(d) if isinstance(nodo.op, ast.USub) else d
+    if isinstance(nodo, ast.BinOp):
+        a, b = nodo.left, nodo.right
+        da, db = _derivar(a, x), _derivar(b, x)
+        if isinstance(nodo.op, ast.Add):
+            return _sumar(da, db)
+        if isinstance(nodo.op, ast.Sub):
+            return _restar(da, db)
+        if isinstance(nodo.op, ast.Mult):
+            return _sumar(_multiplicar(da, b), _multiplicar(a, db))
+        if isinstance(nodo.op, ast.Div):
+            return _restar(_dividir(da, b), _dividir(_multiplicar(a, db), _multiplicar(b, b)))
+        if isinstance(nodo.op, ast.Pow) and isinstance(b, ast.Constant):
+            if _es(da, 0):
+                return _constante(0)
+            potencia = ast.BinOp(left=a, op=ast.Pow(), right=_constante(b.value - 1))
+            return _multiplicar(_multiplicar(_constante(b.value), potencia), da)
+    if isinstance(nodo, ast.Call) and isinstance(nodo.func, ast.Name) and len(nodo.args) == 1:
+        u = nodo.args[0]
+        du = _derivar(u, x)
+        if _es(du, 0):
+            return du
+        if nodo.func.id == "exp":
+            return _multiplicar(nodo, du)
+        if nodo.func.id == "log":
+            return _dividir(du, u)
+        if nodo.func.id == "sqrt":
+            return _dividir(du, _multiplicar(_constante(2), nodo))
+    raise ValueError(f"No se puede derivar la expresión {ast.unparse(nodo)!r}")
+
+
+def _nombres(nodo):
+    return {n.id for n in ast.walk(nodo) if isinstance(n, ast.Name)}
+
+
+def _funcion(codigo, nombre):
+    espacio = {"np": np, **_FUNCIONES}
+    exec(codigo, espacio)
+    return espacio[nombre]
+
+
+# ---------------------------------------------------------------------------
+# Especificación de modelos
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class ModeloCompartimental:
+    """
+    Especificación declarativa de un modelo compartimental.
+
+    Attributes:
+        estados (tuple): Símbolos de los estados en las expresiones ("S", "I"...).
+        compartimentos (tuple): Nombres de los compartimentos en los resultados.
+        parametros (tuple): Parámetros de entrada del modelo (incluidas las
+            condiciones iniciales), en el orden de la función ``modelo_*``.
+        argumentos (dict): Nombre -> expresión sobre ``parametros`` de cada
+            argumento de las derivadas, en orden.
+        iniciales (tuple): Expresión sobre ``parametros`` del valor inicial de cada estado.
+        transiciones (tuple): ``Transicion`` del modelo. Las derivadas suman las
+            tasas en este orden.
+        infectados (tuple): Estados infectados (para R0).
+        libre_de_enfermedad (dict): Estado -> expresión sobre ``argumentos`` en el
+            equilibrio libre de enfermedad (el resto de estados vale 0).
+        analitica (callable, optional): Solución cerrada, si existe.
+        brote (tuple): Estados cuyos contagios forman el tamaño del brote (por
+            ejemplo, solo los humanos en un modelo con vectores). Vacío: todas
+            las transiciones de contagio.
+    """
+
+    estados: tuple
+    compartimentos: tuple
+    parametros: tuple
+    argumentos: dict
+    iniciales: tuple
+    transiciones: tuple
+    infectados: tuple = ()
+    libre_de_enfermedad: dict = field(default_factory=dict)
+    analitica: object = None
+    brote: tuple = ()
+
+    def __post_init__(self):
+        simbolos = set(self.estados) | set(self.argumentos)
+        if len(self.compartimentos) != len(self.estados) or len(self.iniciales) != len(self.estados):
+            raise ValueError("'estados', 'compartimentos' e 'iniciales' deben tener la misma longitud")
+        if simbolos & _RESERVADOS:
+            raise ValueError(f"Nombres reservados: {', '.join(sorted(simbolos & _RESERVADOS))}")
+        for transicion in self.transiciones:
+            for estado in (transicion.origen, transicion.destino):
+                if estado is not None and estado not in self.estados:
+                    raise ValueError(f"Estado desconocido en una transición: {estado!r}")
+            desconocidos = _nombres(ast.parse(transicion.tasa, mode="eval")) - simbolos - set(_FUNCIONES)
+            if desconocidos:
+                raise ValueError(f"Símbolos desconocidos en la tasa {transicion.tasa!r}: {', '.join(sorted(desconocidos))}")
+        destinos = {transicion.destino for transicion in self.transiciones if transicion.infeccion}
+        if set(self.brote) - destinos:
+            raise ValueError(f"'brote' solo admite destinos de contagios: {', '.join(sorted(map(str, destinos)))}")
+
+    def cambios(self):
+        """
+        Devuelve la variación de cada estado con cada transición (una fila por transición).
+        """
+        cambios = np.zeros((len(self.transiciones), len(self.estados)), dtype=np.int64)
+        for i, transicion in enumerate(self.transiciones):
+            if transicion.origen is not None:
+                cambios[i, self.estados.index(transicion.origen)] -= 1
+            if transicion.destino is not None:
+                cambios[i, self.estados.index(transicion.destino)] += 1
+        return cambios
+
+    def indices_brote(self):
+        """
+        Devuelve los índices de las transiciones de contagio que cuentan para
+        el tamaño del brote (las que llegan a un estado de ``brote``, o todas).
+        """
+        return tuple(i for i, transicion in enumerate(self.transiciones)
+                     if transicion.infeccion and (not self.brote or transicion.destino in self.brote))
+
+    def jacobiano_simbolico(self, solo_infecciones=False, respecto=None):
+        """
+        Devuelve el jacobiano como lista de listas de nodos de ``ast``.
+
+        Args:
+            solo_infecciones (bool): Considerar solo las transiciones de contagio
+                (la matriz F de la matriz de nueva generación).
+            respecto (tuple, optional): Símbolos de las columnas (por defecto, los
+                estados; con los argumentos se obtiene la derivada respecto de ellos).
+        """
+        k = len(self.estados)
+        respecto = self.estados if respecto is None else tuple(respecto)
+        J = [[_constante(0) for _ in respecto] for _ in range(k)]
+        for transicion in self.transiciones:
+            if solo_infecciones and not transicion.infeccion:
+                continue
+            tasa = ast.parse(transicion.tasa, mode="eval").body
+            for c, estado in enumerate(respecto):
+                d = _derivar(tasa, estado)
+                if _es(d, 0):
+                    continue
+                if transicion.destino is not None:
+                    f = self.estados.index(transicion.destino)
+                    J[f][c] = _sumar(J[f][c], d)
+                if transicion.origen is not None:
+                    f = self.estados.index(transicion.origen)
+                    J[f][c] = _restar(J[f][c], d)
+        return J
+
+    # -- Generación de código ------------------------------------------------
+
+    def _cabecera(self, nombre):
+        return (f"def {nombre}(y, t, {', '.join(self.argumentos)}):\n"
+                f"    {', '.join(self.estados)}, = y\n")
+
+    def _tasa(self, tasa):
+        # Las tasas que no dependen del estado se difunden a su forma (n,)
+        if _nombres(ast.parse(tasa, mode="eval")) & set(self.estados):
+            return tasa
+        return f"({tasa}) + 0.0 * {self.estados[0]}"
+
+    def _codigo_deriv(self):
+        lineas = [f"    r{i} = {self._tasa(tr.tasa)}" for i, tr in enumerate(self.transiciones)]
+        derivadas = []
+        for estado in self.estados:
+            termino = ""
+            for i, tr in enumerate(self.transiciones):
+                if tr.destino == estado and tr.origen != estado:
+                    termino += f" + r{i}" if termino else f"r{i}"
+                elif tr.origen == estado and tr.destino != estado:
+                    termino += f" - r{i}" if termino else f"-r{i}"
+            derivadas.append(termino or f"0.0 * {self.estados[0]}")
+        return self._cabecera("deriv") + "\n".join(lineas) + f"\n    return ({', '.join(derivadas)},)\n"
+
+    def _codigo_jac(self, nombre, J):
+        filas = ",\n            ".join(
+            "(" + ", ".join("0.0" if _es(e, 0) else ast.unparse(e) for e in fila) + ",)" for fila in J)
+        return self._cabecera(nombre) + f"    return ({filas},)\n"
+
+    def _codigo_tasas(self):
+        tasas = ", ".join(self._tasa(tr.tasa) for tr in self.transiciones)
+        return self._cabecera("tasas") + f"    return ({tasas},)\n"
+
+    def _codigo_parametros(self, nombre, expresiones, difundir):
+        asignaciones = "".join(f"    {p} = p[{p!r}]\n" for p in self.parametros)
+        valores = ", ".join(f"({e})" for e in expresiones)
+        retorno = f"np.broadcast_arrays({valores})" if difundir else f"({valores},)"
+        return f"def {nombre}(p):\n{asignaciones}    return {retorno}\n"
+
+    def _codigo_derivadas_parametros(self, nombre, expresiones):
+        # Una fila por expresión con sus derivadas respecto de cada parámetro
+        filas = []
+        for expresion in expresiones:
+            arbol = ast.parse(expresion, mode="eval").body
+            filas.append(", ".join(ast.unparse(_derivar(arbol, p)) for p in self.parametros) + ",")
+        return self._codigo_parametros(nombre, filas, difundir=False)
+
+    def _r0(self, jac, jac_infeccion):
+        """
+        Construye la función de R0 a partir de los jacobianos compilados.
+        """
+        indices = [self.estados.index(e) for e in self.infectados]
+        libre = [self.libre_de_enfermedad.get(e, "0.0") for e in self.estados]
+        equilibrio = _funcion(
+            f"def equilibrio({', '.join(self.argumentos)}):\n    return ({', '.join(libre)},)\n", "equilibrio")
+
+        def matriz(entradas, n):
+            M = np.empty((n, len(indices), len(indices)))
+            for a, f in enumerate(indices):
+                for b, c in enumerate(indices):
+                    M[:, a, b] = entradas[f][c]
+            return M
+
+        def r0(*argumentos, y=None):
+            """
+            R0 como radio espectral de la matriz de nueva generación F·V⁻¹. Con
+            un estado ``y`` (tupla de compartimentos) se evalúa en ese estado en
+            lugar del equilibrio libre de enfermedad: el número reproductivo efectivo.
+            """
+            if y is None:
+                y = equilibrio(*argumentos)
+            n = np.broadcast(*argumentos, *y).size
+            F = matriz(jac_infeccion(y, 0.0, *argumentos), n)
+            V = F - matriz(jac(y, 0.0, *argumentos), n)
+            singular = np.abs(np.linalg.det(V)) < 1e-300
+            V[singular] = np.eye(len(indices))
+            radio = np.abs(np.linalg.eigvals(np.linalg.solve(V, F))).max(axis=1)
+            return np.where(singular, np.inf, radio)
+
+        return r0
+
+    def compilar(self):
+        """
+        Genera las funciones del modelo.
+
+        Returns:
+            DefinicionModelo: Definición lista para los integradores.
+        """
+        J = self.jacobiano_simbolico()
+        jac = _funcion(self._codigo_jac("jac", J), "jac")
+        r0 = None
+        if self.infectados and self.libre_de_enfermedad:
+            jac_infeccion = _funcion(self._codigo_jac("jac", self.jacobiano_simbolico(solo_infecciones=True)), "jac")
+            r0 = self._r0(jac, jac_infeccion)
+        return DefinicionModelo(
+            compartimentos=tuple(self.compartimentos),
+            parametros=tuple(self.parametros),
+            condiciones_iniciales=_funcion(
+                self._codigo_parametros("iniciales", self.iniciales, difundir=True), "iniciales"),
+            argumentos=_funcion(
+                self._codigo_parametros("argumentos", self.argumentos.values(), difundir=False), "argumentos"),
+            deriv=_funcion(self._codigo_deriv(), "deriv"),
+            jac=jac,
+            analitica=self.analitica,
+            tasas=_funcion(self._codigo_tasas(), "tasas"),
+            cambios=self.cambios(),
+            estructura=np.array([[not _es(e, 0) for e in fila] for fila in J]),
+            r0=r0,
+            jac_argumentos=_funcion(
+                self._codigo_jac("jac_argumentos", self.jacobiano_simbolico(respecto=self.argumentos)),
+                "jac_argumentos"),
+            d_iniciales=_funcion(self._codigo_derivadas_parametros("d_iniciales", self.iniciales), "d_iniciales"),
+            d_argumentos=_funcion(
+                self._codigo_derivadas_parametros("d_argumentos", self.argumentos.values()), "d_argumentos"),
+            brote=self.indices_brote(),
+        )
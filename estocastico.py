@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de simulación estocástica de los modelos compartimentales.
+
+Usa las mismas transiciones que los modelos deterministas (``tasas`` y
+``cambios`` de ``models.MODELOS``) con dos algoritmos:
+
+- Gillespie exacto: un evento cada vez; adecuado para poblaciones pequeñas.
+- Tau-leaping: en cada paso de longitud ``tau`` el número de eventos de cada
+  tipo es de Poisson; adecuado para poblaciones grandes.
+
+En ambos casos las réplicas avanzan a la vez como arrays de NumPy. No se
+devuelven las trayectorias: cada bloque de réplicas se resume en un
+histograma por día y compartimento, así que la memoria no depende del número
+de réplicas. Cada bloque usa su propio flujo aleatorio derivado de la semilla
+(``SeedSequence.spawn``), de modo que el resultado es el mismo con uno o con
+varios procesos.
+"""
+
+import math
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from models import _nombre_modelo, _obtener_modelo, _preparar_lote
+
+METODOS_ESTOCASTICOS = ("auto", "gillespie", "tau")
+
+# Con "auto" se usa Gillespie hasta esta población total (todos los compartimentos)
+UMBRAL_GILLESPIE = 5000
+
+# Número máximo de intervalos del histograma de cada día y compartimento
+INTERVALOS = 1024
+
+ResultadoEstocastico = namedtuple(
+    "ResultadoEstocastico",
+    ["t", "compartimentos", "metodo", "cuantiles", "bandas", "media", "extincion", "tamano_brote"],
+)
+ResultadoEstocastico.__doc__ = """
+Resumen de las réplicas de una simulación estocástica.
+
+Attributes:
+    t (numpy.ndarray): Días de salida (0, 1, ..., dias).
+    compartimentos (tuple): Nombres de los compartimentos.
+    metodo (str): "gillespie" o "tau".
+    cuantiles (tuple): Cuantiles de ``bandas``.
+    bandas (numpy.ndarray): Cuantiles por día y compartimento, de forma (día, compartimento, cuantil).
+    media (numpy.ndarray): Media por día y compartimento, de forma (día, compartimento).
+    extincion (numpy.ndarray): Fracción de réplicas sin infectados en cada día.
+    tamano_brote (numpy.ndarray): Número de contagios de cada réplica en las
+        transiciones de ``brote`` del modelo (en Ross-Macdonald, solo los
+        humanos; en el resto, todos los contagios).
+"""
+
+
+def _infectados(definicion):
+    """
+    Índices de los compartimentos con personas (o vectores) infectadas.
+    """
+    return [i for i, nombre in enumerate(definicion.compartimentos) if "Infectados" in nombre or "Expuestos" in nombre]
+
+
+def _gillespie(tasas, cambios, brote, y0, args, t_salida, rng, replicas):
+    """
+    Algoritmo de Gillespie directo con todas las réplicas a la vez.
+
+    Returns:
+        tuple: Estados de forma (réplica, día, compartimento) y contagios por
+        réplica (eventos de las transiciones de índices ``brote``).
+    """
+    dias = len(t_salida)
+    Y = np.tile(y0, (replicas, 1))
+    t = np.zeros(replicas)
+    siguiente = np.zeros(replicas, dtype=np.intp)
+    salida = np.empty((replicas, dias, len(y0)), dtype=np.int32)
+    contagios = np.zeros(replicas, dtype=np.int64)
+    activas = np.arange(replicas)
+
+    while len(activas):
+        estado = Y[activas]
+        r = np.column_stack(tasas(tuple(estado.T.astype(float)), 0.0, *args))
+        total = r.sum(axis=1)
+        with np.errstate(divide="ignore"):
+            t_nuevo = t[activas] + rng.exponential(size=len(activas)) / total
+        # Hasta el siguiente evento el estado no cambia: se copia en los días
+        # de salida anteriores al salto
+        fin = np.searchsorted(t_salida, t_nuevo, side="left")
+        absorbidas = np.flatnonzero(total == 0)
+        for i in absorbidas:
+            salida[activas[i], siguiente[activas[i]]:] = estado[i]
+        inicio = siguiente[activas]
+        inicio[absorbidas] = fin[absorbidas]
+        pendientes = inicio < fin
+        while pendientes.any():
+            salida[activas[pendientes], inicio[pendientes]] = estado[pendientes]
+            inicio += pendientes
+            pendientes = inicio < fin
+        siguiente[activas] = fin
+
+        saltan = fin < dias
+        acumuladas = np.cumsum(r[saltan], axis=1)
+        u = rng.random(len(acumuladas)) * acumuladas[:, -1]
+        evento = np.minimum((acumuladas < u[:, np.newaxis]).sum(axis=1), len(cambios) - 1)
+        activas = activas[saltan]
+        Y[activas] += cambios[evento]
+        t[activas] = t_nuevo[saltan]
+        contagios[activas] += np.isin(evento, brote)
+    return salida, contagios
+
+
+def _tau_leaping(tasas, cambios, brote, y0, args, t_salida, tau, rng, replicas):
+    """
+    Tau-leaping con un paso que divide exactamente cada día.
+
+    Los eventos de cada tipo se aplican en orden y se limitan a los
+    individuos que quedan en su compartimento de origen, de modo que ningún
+    compartimento se hace negativo.
+
+    Returns:
+        tuple: Estados de forma (réplica, día, compartimento) y contagios por
+        réplica (eventos de las transiciones de índices ``brote``).
+    """
+    # Compartimento que pierde un individuo con cada evento (-1 en entradas)
+    origen = np.where(cambios.min(axis=1) < 0, np.argmin(cambios, axis=1), -1)
+    subpasos = max(1, math.ceil(1.0 / tau - 1e-9))
+    h = 1.0 / subpasos
+    Y = np.tile(y0, (replicas, 1))
+    salida = np.empty((replicas, len(t_salida), len(y0)), dtype=np.int32)
+    salida[:, 0] = Y
+    contagios = np.zeros(replicas, dtype=np.int64)
+
+    for d in range(1, len(t_salida)):
+        for _ in range(round((t_salida[d] - t_salida[d - 1]) * subpasos)):
+            r = np.column_stack(tasas(tuple(Y.T.astype(float)), 0.0, *args))
+            eventos = rng.poisson(r * h)
+            for j, cambio in enumerate(cambios):
+                if origen[j] >= 0:
+                    eventos[:, j] = np.minimum(eventos[:, j], Y[:, origen[j]])
+                Y += eventos[:, j:j + 1] * cambio
+            contagios += eventos[:, brote].sum(axis=1)
+        salida[:, d] = Y
+    return salida, contagios
+
+
+def _bloque_estocastico(nombre, argumentos, y0, dias, replicas, metodo, tau, semilla, ancho):
+    """
+    Simula un bloque de réplicas y lo resume en histogramas (función de nivel
+    de módulo para el ejecutor de procesos).
+    """
+    definicion = _obtener_modelo(nombre)
+    cambios = np.array(definicion.cambios, dtype=np.int64)
+    brote = np.array(definicion.brote, dtype=np.intp)
+    t_salida = np.arange(dias + 1, dtype=float)
+    rng = np.random.default_rng(semilla)
+    if metodo == "gillespie":
+        salida, contagios = _gillespie(definicion.tasas, cambios, brote, y0, argumentos, t_salida, rng, replicas)
+    else:
+        salida, contagios = _tau_leaping(definicion.tasas, cambios, brote, y0, argumentos, t_salida, tau, rng, replicas)
+
+    k = len(y0)
+    intervalos = int(y0.sum()) // ancho + 1
+    celdas = np.arange((dias + 1) * k).reshape(dias + 1, k) * intervalos
+    conteos = np.bincount((salida // ancho + celdas).ravel(), minlength=(dias + 1) * k * intervalos)
+    extintas = (salida[:, :, _infectados(definicion)] == 0).all(axis=2).sum(axis=0)
+    return conteos, salida.sum(axis=0, dtype=np.float64), extintas, contagios
+
+
+def simular_estocastico(modelo, parametros, dias, replicas=1000, metodo="auto", tau=0.1, semilla=None,
+                        cuantiles=(0.05, 0.5, 0.95), tam_bloque=1000, max_trabajadores=1):
+    """
+    Simula réplicas estocásticas de un escenario y resume su distribución.
+
+    Args:
+        modelo (str | callable): Modelo (como en ``simular``).
+        parametros (dict): Parámetros del modelo (un único escenario).
+        dias (int): Número de días para simular.
+        replicas (int): Número de réplicas.
+        metodo (str): "gillespie", "tau" o "auto" (Gillespie hasta
+            ``UMBRAL_GILLESPIE`` individuos, tau-leaping por encima).
+        tau (float): Paso máximo del tau-leaping, en días.
+        semilla (int | numpy.random.SeedSequence, optional): Semilla; con la misma
+            semilla el resultado es reproducible.
+        cuantiles (tuple): Cuantiles de las bandas.
+        tam_bloque (int): Réplicas por bloque (acota la memoria de cada bloque).
+        max_trabajadores (int): Procesos para repartir los bloques.
+
+    Returns:
+        ResultadoEstocastico: Bandas de cuantiles, media, probabilidad de
+        extinción por día y tamaño del brote de cada réplica.
+    """
+    if metodo not in METODOS_ESTOCASTICOS:
+        raise ValueError(f"Método desconocido: {metodo!r}. Opciones: {', '.join(METODOS_ESTOCASTICOS)}")
+    definicion = _obtener_modelo(modelo)
+    p = _preparar_lote(definicion, parametros)
+    if len(next(iter(p.values()))) != 1:
+        raise ValueError("La simulación estocástica admite un único escenario")
+    argumentos = tuple(float(x[0]) for x in definicion.argumentos(p))
+    y0 = np.rint([np.ravel(x)[0] for x in definicion.condiciones_iniciales(p)]).astype(np.int64)
+    poblacion = int(y0.sum())
+    if metodo == "auto":
+        metodo = "gillespie" if poblacion <= UMBRAL_GILLESPIE else "tau"
+
+    # Los valores son enteros entre 0 y la población total; con poblaciones
+    # grandes cada intervalo del histograma agrupa ``ancho`` valores
+    ancho = max(1, -(-(poblacion + 1) // INTERVALOS))
+    bloques = [min(tam_bloque, replicas - inicio) for inicio in range(0, replicas, tam_bloque)]
+    semillas = np.random.SeedSequence(semilla).spawn(len(bloques))
+    tareas = [(_nombre_modelo(modelo), argumentos, y0, dias, n, metodo, tau, s, ancho) for n, s in zip(bloques, semillas)]
+
+    if max_trabajadores > 1 and len(tareas) > 1:
+        with ProcessPoolExecutor(max_workers=max_trabajadores) as pool:
+            resultados = list(pool.map(_bloque_estocastico, *zip(*tareas)))
+    else:
+        resultados = [_bloque_estocastico(*tarea) for tarea in tareas]
+
+    k = len(y0)
+    conteos = sum(r[0] for r in resultados).reshape(dias + 1, k, -1)
+    acumulados = np.cumsum(conteos, axis=2)
+    bandas = np.empty((dias + 1, k, len(cuantiles)))
+    for j, q in enumerate(cuantiles):
+        bandas[:, :, j] = np.argmax(acumulados >= q * (replicas - 1) + 1, axis=2) * ancho
+
+    return ResultadoEstocastico(
+        t=np.arange(dias + 1, dtype=float),
+        compartimentos=definicion.compartimentos,
+        metodo=metodo,
+        cuantiles=tuple(cuantiles),
+        bandas=bandas,
+        media=sum(r[1] for r in resultados) / replicas,
+        extincion=sum(r[2] for r in resultados) / replicas,
+        tamano_brote=np.concatenate([r[3] for r in resultados]),
+    )
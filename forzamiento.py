@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de forzamiento climático variable en el tiempo para Ross-Macdonald.
+
+Una serie diaria de temperatura y humedad (por ejemplo, años de datos de una
+estación) se convierte una sola vez en series diarias de la tasa de picaduras
+a(t) y de la densidad de mosquitos m(t). El integrador solo indexa esas
+series: dentro de cada día los parámetros son constantes y se avanza con RK4
+de paso fijo alineado con los días, de modo que los saltos de un día a otro
+nunca caen dentro de un paso.
+
+Con m variable la población de mosquitos deja de ser constante: los
+nacimientos son ``mu·m(t)·N_h`` y las muertes ``mu·V``. Con m constante y
+``V(0) = m·N_h`` se recupera exactamente ``modelo_ross_macdonald``.
+
+Ejemplo (varias estaciones a la vez)::
+
+    from forzamiento import forzamiento_desde_fichero, simular_forzado
+
+    estaciones, forzamiento = forzamiento_desde_fichero("clima.parquet")
+    datos = simular_forzado(forzamiento, {"poblacion_h": 1000, "infectados_h": 10,
+                                          "infectados_v_iniciales": 100, "b": 0.5,
+                                          "c": 0.5, "gamma": 0.14})
+"""
+
+import os
+import types
+
+import numpy as np
+
+import nucleos
+from clima import MU_MOSQUITO, calc_params_bio, tabla_clima
+
+PARAMETROS_FORZADO = ("poblacion_h", "infectados_h", "infectados_v_iniciales", "b", "c", "gamma", "mu")
+
+
+class Forzamiento:
+    """
+    Series diarias de a(t) y m(t) para un lote de estaciones o realizaciones.
+
+    El valor del día ``d`` se aplica en el intervalo [d, d + 1).
+
+    Attributes:
+        a (numpy.ndarray): Tasa de picaduras, de forma (serie, día).
+        m (numpy.ndarray): Densidad de mosquitos por humano, de forma (serie, día).
+    """
+
+    __slots__ = ("a", "m")
+
+    def __init__(self, a, m):
+        a, m = np.broadcast_arrays(np.atleast_2d(np.asarray(a, dtype=float)),
+                                   np.atleast_2d(np.asarray(m, dtype=float)))
+        self.a = np.ascontiguousarray(a)
+        self.m = np.ascontiguousarray(m)
+
+    @classmethod
+    def desde_clima(cls, temp, hum, curva_picaduras="lineal", curva_densidad="lineal", tabla=False):
+        """
+        Construye el forzamiento a partir de series de temperatura y humedad.
+
+        Args:
+            temp (array): Temperatura diaria (°C), de forma (día,) o (serie, día).
+            hum (array): Humedad relativa diaria (%), con forma compatible.
+            curva_picaduras (str | callable): Curva de la tasa de picaduras.
+            curva_densidad (str | callable): Curva de la densidad de mosquitos.
+            tabla (bool): Interpolar en una ``TablaClima`` en lugar de evaluar las curvas.
+        """
+        if tabla:
+            return cls(*tabla_clima(curva_picaduras, curva_densidad)(temp, hum))
+        return cls(*calc_params_bio(temp, hum, curva_picaduras, curva_densidad))
+
+    def __len__(self):
+        return self.a.shape[0]
+
+    @property
+    def dias(self):
+        """
+        Número de días de las series.
+        """
+        return self.a.shape[1]
+
+    def __repr__(self):
+        return f"Forzamiento(series={len(self)}, dias={self.dias})"
+
+
+def _columnas_fichero(ruta, columnas, tam_bloque):
+    """
+    Lee un CSV o Parquet por bloques y devuelve un diccionario columna -> array por bloque.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == ".parquet":
+        import pyarrow.parquet as pq
+
+        fichero = pq.ParquetFile(ruta)
+        presentes = [c for c in columnas if c in fichero.schema_arrow.names]
+        for lote in fichero.iter_batches(batch_size=tam_bloque, columns=presentes):
+            yield {nombre: lote.column(nombre).to_numpy(zero_copy_only=False) for nombre in presentes}
+    elif extension == ".csv":
+        import pandas as pd
+
+        for bloque in pd.read_csv(ruta, usecols=lambda c: c in columnas, chunksize=tam_bloque):
+            yield {nombre: bloque[nombre].to_numpy() for nombre in bloque.columns}
+    else:
+        raise ValueError(f"Formato de clima no soportado: {extension!r} (use .csv o .parquet)")
+
+
+def forzamiento_desde_fichero(ruta, columna_temp="temp", columna_humedad="humedad", columna_estacion="estacion",
+                              curva_picaduras="lineal", curva_densidad="lineal", tabla=False, tam_bloque=100_000):
+    """
+    Lee series diarias de clima de un CSV o Parquet sin cargar el fichero entero.
+
+    El fichero tiene una fila por estación y día, ordenadas por estación y
+    después por día. Cada bloque se convierte en a y m al leerlo, así que en
+    memoria solo quedan las series de parámetros. Si no existe la columna de
+    estación, todo el fichero es una única serie.
+
+    Returns:
+        tuple: ``(estaciones, forzamiento)`` con los nombres de las estaciones en
+        orden de aparición y un ``Forzamiento`` con una serie por estación.
+    """
+    series = {}
+    for bloque in _columnas_fichero(ruta, (columna_temp, columna_humedad, columna_estacion), tam_bloque):
+        parametros = Forzamiento.desde_clima(bloque[columna_temp], bloque[columna_humedad],
+                                             curva_picaduras, curva_densidad, tabla)
+        estaciones = bloque.get(columna_estacion)
+        if estaciones is None:
+            series.setdefault(None, []).append((parametros.a[0], parametros.m[0]))
+            continue
+        # Tramos consecutivos de una misma estación dentro del bloque
+        cortes = np.flatnonzero(estaciones[1:] != estaciones[:-1]) + 1
+        for inicio, fin in zip(np.r_[0, cortes], np.r_[cortes, len(estaciones)]):
+            series.setdefault(estaciones[inicio], []).append((parametros.a[0, inicio:fin], parametros.m[0, inicio:fin]))
+
+    longitudes = {sum(len(a) for a, _ in trozos) for trozos in series.values()}
+    if len(longitudes) > 1:
+        raise ValueError(f"Las estaciones tienen series de longitudes distintas: {sorted(longitudes)}")
+    a = np.array([np.concatenate([a for a, _ in trozos]) for trozos in series.values()])
+    m = np.array([np.concatenate([m for _, m in trozos]) for trozos in series.values()])
+    return list(series), Forzamiento(a, m)
+
+
+# Derivadas con los parámetros del día; valen igual para escalares (núcleo
+# compilado) que para arrays de forma (n,) (versión de NumPy).
+
+def _derivadas(Sh, Ih, Rh, Sv, Iv, a, nacimientos, N_h, b, c, gamma, mu):
+    infeccion_h = a * b * (Iv / N_h) * Sh
+    infeccion_v = a * c * (Ih / N_h) * Sv
+    return (-infeccion_h,
+            infeccion_h - gamma * Ih,
+            gamma * Ih,
+            nacimientos - infeccion_v - mu * Sv,
+            infeccion_v - mu * Iv)
+
+
+def _paso_rk4(Sh, Ih, Rh, Sv, Iv, h, a, nacimientos, N_h, b, c, gamma, mu):
+    k1 = _derivadas(Sh, Ih, Rh, Sv, Iv, a, nacimientos, N_h, b, c, gamma, mu)
+    k2 = _derivadas(Sh + 0.5 * h * k1[0], Ih + 0.5 * h * k1[1], Rh + 0.5 * h * k1[2], Sv + 0.5 * h * k1[3],
+                    Iv + 0.5 * h * k1[4], a, nacimientos, N_h, b, c, gamma, mu)
+    k3 = _derivadas(Sh + 0.5 * h * k2[0], Ih + 0.5 * h * k2[1], Rh + 0.5 * h * k2[2], Sv + 0.5 * h * k2[3],
+                    Iv + 0.5 * h * k2[4], a, nacimientos, N_h, b, c, gamma, mu)
+    k4 = _derivadas(Sh + h * k3[0], Ih + h * k3[1], Rh + h * k3[2], Sv + h * k3[3], Iv + h * k3[4],
+                    a, nacimientos, N_h, b, c, gamma, mu)
+    return (Sh + h / 6.0 * (k1[0] + 2.0 * k2[0] + 2.0 * k3[0] + k4[0]),
+            Ih + h / 6.0 * (k1[1] + 2.0 * k2[1] + 2.0 * k3[1] + k4[1]),
+            Rh + h / 6.0 * (k1[2] + 2.0 * k2[2] + 2.0 * k3[2] + k4[2]),
+            Sv + h / 6.0 * (k1[3] + 2.0 * k2[3] + 2.0 * k3[3] + k4[3]),
+            Iv + h / 6.0 * (k1[4] + 2.0 * k2[4] + 2.0 * k3[4] + k4[4]))
+
+
+def _bucle_series(y0, a, nacimientos, p, subpasos, Y):
+    # Núcleo compilado: una serie detrás de otra, con el estado en escalares
+    h = 1.0 / subpasos
+    for e in range(y0.shape[0]):
+        N_h, b, c, gamma, mu = p[e, 0], p[e, 1], p[e, 2], p[e, 3], p[e, 4]
+        Sh, Ih, Rh, Sv, Iv = y0[e, 0], y0[e, 1], y0[e, 2], y0[e, 3], y0[e, 4]
+        Y[e, 0, 0], Y[e, 0, 1], Y[e, 0, 2], Y[e, 0, 3], Y[e, 0, 4] = Sh, Ih, Rh, Sv, Iv
+        for d in range(Y.shape[1] - 1):
+            for _ in range(subpasos):
+                Sh, Ih, Rh, Sv, Iv = _paso_rk4(Sh, Ih, Rh, Sv, Iv, h, a[e, d], nacimientos[e, d],
+                                               N_h, b, c, gamma, mu)
+            Y[e, d + 1, 0], Y[e, d + 1, 1], Y[e, d + 1, 2], Y[e, d + 1, 3], Y[e, d + 1, 4] = Sh, Ih, Rh, Sv, Iv
+
+
+def _bucle_numpy(y0, a, nacimientos, p, subpasos, Y):
+    # Versión de NumPy: todas las series a la vez, un paso detrás de otro
+    h = 1.0 / subpasos
+    estado = tuple(y0.T)
+    Y[:, 0] = y0
+    for d in range(Y.shape[1] - 1):
+        for _ in range(subpasos):
+            estado = _paso_rk4(*estado, h, a[:, d], nacimientos[:, d], *p.T)
+        Y[:, d + 1] = np.column_stack(estado)
+
+
+_bucle_compilado = None
+
+
+def _nucleo_series():
+    """
+    Compila ``_bucle_series`` (y las funciones a las que llama) con Numba la primera vez.
+    """
+    global _bucle_compilado
+    if _bucle_compilado is None:
+        njit = nucleos._importar_numba().njit
+        entorno = {}
+        for funcion in (_derivadas, _paso_rk4, _bucle_series):
+            entorno[funcion.__name__] = njit(types.FunctionType(funcion.__code__, entorno, funcion.__name__))
+        _bucle_compilado = entorno["_bucle_series"]
+    return _bucle_compilado
+
+
+def simular_forzado(forzamiento, parametros, dias=None, paso=0.25):
+    """
+    Simula Ross-Macdonald con a(t) y m(t) diarios para todas las series de un forzamiento.
+
+    Args:
+        forzamiento (Forzamiento): Series diarias de a y m (una por estación o realización).
+        parametros (dict): ``PARAMETROS_FORZADO`` como escalares o arrays de forma
+            (serie,); "mu" es opcional (por defecto ``MU_MOSQUITO``).
+        dias (int, optional): Días a simular (por defecto, todos los del forzamiento).
+        paso (float): Paso máximo de RK4 en días; se ajusta para que cada día
+            tenga un número entero de pasos.
+
+    Returns:
+        numpy.ndarray: Array de forma (serie, dias + 1, 5) con el estado al
+        principio de cada día (t = 0, 1, ..., dias).
+    """
+    dias = forzamiento.dias if dias is None else dias
+    if dias > forzamiento.dias:
+        raise ValueError(f"El forzamiento solo cubre {forzamiento.dias} días (se pidieron {dias})")
+    parametros = dict(parametros)
+    parametros.setdefault("mu", MU_MOSQUITO)
+    faltan = [nombre for nombre in PARAMETROS_FORZADO if nombre not in parametros]
+    if faltan:
+        raise ValueError(f"Faltan parámetros: {', '.join(faltan)}")
+    n = len(forzamiento)
+    N_h, I_h0, I_v0, b, c, gamma, mu = (np.broadcast_to(np.asarray(parametros[nombre], dtype=float), (n,))
+                                        for nombre in PARAMETROS_FORZADO)
+
+    a = forzamiento.a[:, :dias]
+    nacimientos = np.ascontiguousarray(mu[:, np.newaxis] * forzamiento.m[:, :dias] * N_h[:, np.newaxis])
+    V0 = forzamiento.m[:, 0] * N_h
+    y0 = np.column_stack((N_h - I_h0, I_h0, np.zeros(n), V0 - I_v0, I_v0))
+    p = np.ascontiguousarray(np.column_stack((N_h, b, c, gamma, mu)))
+    subpasos = max(1, int(np.ceil(1.0 / paso - 1e-9)))
+
+    Y = np.empty((n, dias + 1, 5))
+    if nucleos.USAR_NUMBA:
+        _nucleo_series()(y0, np.ascontiguousarray(a), nacimientos, p, subpasos, Y)
+    else:
+        _bucle_numpy(y0, a, nacimientos, p, subpasos, Y)
+    return Y
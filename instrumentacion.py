@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de instrumentación opcional de las simulaciones y de la aplicación.
+
+Mide el tiempo de cada etapa de una ejecución (recogida de parámetros,
+resolución, construcción de resultados, gráficos, renderizado) y las
+estadísticas de cada integración (evaluaciones de derivadas y de jacobiano,
+pasos), que ``solucionadores.integrar`` comunica a sus observadores.
+
+Está desactivada por defecto y entonces no cuesta nada: ``etapa`` devuelve un
+contexto vacío y el integrador no mide nada. Se activa con la variable de
+entorno ``SIMULACION_INSTRUMENTACION=1`` o llamando a ``activar()``.
+
+Cada ejecución (en la aplicación, cada rerun de Streamlit) se guarda en un
+``Registro``, que se puede exportar como una línea JSON (``Registro.como_json``
+o el logger ``simulacion.instrumentacion``). Además se acumulan totales de
+todas las ejecuciones, que ``prometheus()`` devuelve en el formato de texto de
+Prometheus para los sistemas de monitorización.
+
+Ejemplo::
+
+    import instrumentacion
+
+    instrumentacion.activar()
+    with instrumentacion.ejecucion("sir") as registro:
+        with instrumentacion.etapa("resolucion"):
+            simular_lote("sir", parametros, 365)
+    print(registro.como_json())
+    print(instrumentacion.prometheus())
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+import solucionadores
+
+ETAPAS = ("parametros", "resolucion", "resultados", "graficos", "renderizado")
+
+logger = logging.getLogger("simulacion.instrumentacion")
+
+_registro_actual = contextvars.ContextVar("registro_instrumentacion", default=None)
+
+
+class Registro:
+    """
+    Medidas de una ejecución.
+
+    Attributes:
+        nombre (str): Identificador de la ejecución (por ejemplo, el modelo).
+        etapas (dict): Etapa -> segundos acumulados.
+        integraciones (list): Diccionario ``info`` de cada integración.
+        inicio (float): Instante de inicio (``time.time()``).
+        duracion (float): Duración total en segundos (al cerrar la ejecución).
+    """
+
+    __slots__ = ("nombre", "etapas", "integraciones", "inicio", "duracion")
+
+    def __init__(self, nombre=""):
+        self.nombre = nombre
+        self.etapas = defaultdict(float)
+        self.integraciones = []
+        self.inicio = time.time()
+        self.duracion = None
+
+    def solver(self):
+        """
+        Suma de las estadísticas de todas las integraciones de la ejecución.
+        """
+        total = {"integraciones": len(self.integraciones), "nfe": 0, "nje": 0, "pasos": 0, "segundos": 0.0}
+        for info in self.integraciones:
+            for clave in ("nfe", "nje", "pasos", "segundos"):
+                total[clave] += info.get(clave, 0)
+        return total
+
+    def como_dict(self):
+        """
+        Devuelve el registro como diccionario serializable.
+        """
+        return {
+            "nombre": self.nombre,
+            "inicio": self.inicio,
+            "duracion": self.duracion,
+            "etapas": dict(self.etapas),
+            "solver": self.solver(),
+            "integraciones": [{k: v for k, v in info.items() if k != "eventos"} for info in self.integraciones],
+        }
+
+    def como_json(self):
+        """
+        Devuelve el registro como una línea JSON (log estructurado).
+        """
+        return json.dumps(self.como_dict(), ensure_ascii=False)
+
+
+class _Totales:
+    """
+    Totales acumulados de todas las ejecuciones (para ``prometheus``).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.ejecuciones = 0
+        self.segundos = defaultdict(float)
+        self.llamadas = defaultdict(int)
+        self.solver = defaultdict(lambda: defaultdict(float))
+
+    def sumar_etapa(self, nombre, segundos):
+        with self._lock:
+            self.segundos[nombre] += segundos
+            self.llamadas[nombre] += 1
+
+    def sumar_integracion(self, info):
+        with self._lock:
+            totales = self.solver[info.get("metodo", "desconocido")]
+            totales["integraciones"] += 1
+            for clave in ("nfe", "nje", "pasos", "segundos"):
+                totales[clave] += info.get(clave, 0)
+
+
+TOTALES = _Totales()
+
+_activa = False
+
+
+def _observar_integracion(info):
+    TOTALES.sumar_integracion(info)
+    registro = _registro_actual.get()
+    if registro is not None:
+        registro.integraciones.append(info)
+
+
+def activar():
+    """
+    Activa la instrumentación (las estadísticas del integrador y las etapas).
+    """
+    global _activa
+    _activa = True
+    if _observar_integracion not in solucionadores.OBSERVADORES:
+        solucionadores.OBSERVADORES.append(_observar_integracion)
+
+
+def desactivar():
+    """
+    Desactiva la instrumentación; los totales acumulados se conservan.
+    """
+    global _activa
+    _activa = False
+    if _observar_integracion in solucionadores.OBSERVADORES:
+        solucionadores.OBSERVADORES.remove(_observar_integracion)
+
+
+def activa():
+    """
+    Indica si la instrumentación está activa.
+    """
+    return _activa
+
+
+def registro_actual():
+    """
+    Devuelve el ``Registro`` de la ejecución en curso (None si no hay ninguna).
+    """
+    return _registro_actual.get()
+
+
+@contextlib.contextmanager
+def ejecucion(nombre=""):
+    """
+    Abre un ``Registro`` para una ejecución y lo envía al log al cerrarla.
+
+    Sin instrumentación activa devuelve None y no registra nada.
+    """
+    if not _activa:
+        yield None
+        return
+    registro = Registro(nombre)
+    token = _registro_actual.set(registro)
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro.duracion = time.perf_counter() - inicio
+        _registro_actual.reset(token)
+        with TOTALES._lock:
+            TOTALES.ejecuciones += 1
+        logger.info(registro.como_json())
+
+
+@contextlib.contextmanager
+def _medir_etapa(nombre):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        TOTALES.sumar_etapa(nombre, segundos)
+        registro = _registro_actual.get()
+        if registro is not None:
+            registro.etapas[nombre] += segundos
+
+
+def etapa(nombre):
+    """
+    Contexto que mide el tiempo de una etapa (uno de ``ETAPAS`` u otro nombre).
+
+    Sin instrumentación activa es un contexto vacío.
+    """
+    if not _activa:
+        return contextlib.nullcontext()
+    return _medir_etapa(nombre)
+
+
+def _etiqueta(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus():
+    """
+    Devuelve una instantánea de los totales en el formato de texto de Prometheus.
+    """
+    lineas = [
+        "# HELP simulacion_ejecuciones_total Ejecuciones registradas.",
+        "# TYPE simulacion_ejecuciones_total counter",
+        f"simulacion_ejecuciones_total {TOTALES.ejecuciones}",
+        "# HELP simulacion_etapa_segundos_total Tiempo acumulado por etapa.",
+        "# TYPE simulacion_etapa_segundos_total counter",
+    ]
+    with TOTALES._lock:
+        for nombre, segundos in sorted(TOTALES.segundos.items()):
+            lineas.append(f'simulacion_etapa_segundos_total{{etapa="{_etiqueta(nombre)}"}} {segundos:.6f}')
+        lineas += ["# HELP simulacion_etapa_llamadas_total Veces que se ha medido cada etapa.",
+                   "# TYPE simulacion_etapa_llamadas_total counter"]
+        for nombre, llamadas in sorted(TOTALES.llamadas.items()):
+            lineas.append(f'simulacion_etapa_llamadas_total{{etapa="{_etiqueta(nombre)}"}} {llamadas}')
+        metricas_solver = (
+            ("integraciones", "Integraciones realizadas."),
+            ("nfe", "Evaluaciones de las derivadas."),
+            ("nje", "Evaluaciones del jacobiano."),
+            ("pasos", "Pasos del integrador."),
+            ("segundos", "Tiempo dentro del integrador."),
+        )
+        for clave, ayuda in metricas_solver:
+            metrica = f"simulacion_solver_{clave}_total"
+            lineas += [f"# HELP {metrica} {ayuda}", f"# TYPE {metrica} counter"]
+            for metodo, totales in sorted(TOTALES.solver.items()):
+                valor = totales[clave]
+                valor = f"{valor:.6f}" if clave == "segundos" else f"{int(valor)}"
+                lineas.append(f'{metrica}{{metodo="{_etiqueta(metodo)}"}} {valor}')
+    return "\n".join(lineas) + "\n"
+
+
+if os.environ.get("SIMULACION_INSTRUMENTACION", "").lower() in ("1", "true", "si", "sí"):
+    activar()
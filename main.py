@@ -4,16 +4,230 @@
 Aplicación principal de simulación de modelos epidemiológicos.
 """
 
+import os
+import threading
+import time
+from contextlib import closing
+from concurrent.futures import as_completed
+
 import streamlit as st
 import plotly.express as px
 import pandas as pd
+import numpy as np
 
-from models import modelo_sir, modelo_seir, modelo_sis, modelo_si, modelo_ross_macdonald
+import instrumentacion
+from instrumentacion import etapa
+from barrido import ejecutar_barrido, rejilla
+from models import MODELOS, estadisticas_cache, numero_reproductivo
+from clima import MU_MOSQUITO, calc_params_bio, preparar_ross_macdonald
+from reduccion import reducir_frame
+from servicio import ServicioSaturado, compartido
+from solucionadores import AjustesSolver
 from ui import sidebar
 
-def main():
+# Un punto por día: al subir "Días de Simulación" la malla anterior es un prefijo
+# de la nueva y solo se integran los días añadidos (ver ``models.bifurcar``).
+# El método se elige según la rigidez: con mosquitos de vida corta (mu alta)
+# Ross-Macdonald es rígido y se resuelve con un método implícito
+AJUSTES_APP = AjustesSolver(metodo="auto", malla="diaria")
+# Puntos por serie que se envían al navegador (las series más largas se reducen)
+PUNTOS_GRAFICO = 2000
+# Filas por página en las tablas de datos
+FILAS_PAGINA = 1000
+# Segundos mínimos entre dos actualizaciones del gráfico mientras se calculan escenarios
+INTERVALO_ACTUALIZACION = 0.3
+# Procesos de un barrido en rejilla: acotados para no quitar todos los núcleos
+# a la capa de servicio que atiende al resto de sesiones
+TRABAJADORES_BARRIDO = min(4, os.cpu_count() or 1)
+
+
+def resolver(modelo, parametros, dias):
     """
-    Función principal de la aplicación.
+    Simula un escenario en la capa de servicio compartida por todas las
+    sesiones (ver ``servicio``) y espera el resultado.
+    """
+    return compartido().simular(modelo, parametros, dias, AJUSTES_APP).result()
+
+
+def mostrar_almacen(ruta):
+    """
+    Muestra un barrido guardado con ``almacen.guardar_barrido``.
+
+    Se dibujan bandas de cuantiles calculadas por bloques y un escenario
+    concreto, de modo que la memoria no depende del tamaño del barrido.
+    """
+    from almacen import AlmacenResultados
+
+    try:
+        almacen = AlmacenResultados.abrir(ruta)
+    except FileNotFoundError:
+        st.warning(f"No se encontró un almacén de resultados en '{ruta}'.")
+        return
+
+    st.subheader(f"Barrido Guardado: {len(almacen)} escenarios ({almacen.modelo})")
+    infectados = [i for i, nombre in enumerate(almacen.compartimentos) if "Infectados" in nombre]
+    compartimento = st.selectbox("Compartimento", almacen.compartimentos, index=infectados[0] if infectados else 0)
+    bandas = almacen.bandas(compartimento)
+    df_bandas = pd.DataFrame({"Día": almacen.t, "P5": bandas[:, 0], "Mediana": bandas[:, 1], "P95": bandas[:, 2]})
+    mostrar_series(df_bandas, ["P5", "Mediana", "P95"], f"{compartimento}: cuantiles entre escenarios")
+
+    indice = st.number_input("Escenario", min_value=0, max_value=len(almacen) - 1, value=0)
+    st.write(almacen.parametros(indice))
+    df = pd.DataFrame(almacen.escenario(indice), columns=almacen.compartimentos)
+    df.insert(0, "Día", almacen.t)
+    mostrar_series(df, list(almacen.compartimentos), f"Escenario {indice}")
+
+
+def _cancelar_barrido(evento):
+    """
+    Callback del botón de cancelar: detiene el barrido en curso y lo anota
+    para avisar en la siguiente ejecución de la página.
+    """
+    evento.set()
+    st.session_state["barrido_cancelado"] = True
+
+
+def _mapa_rejilla(valores, temps, hums, titulo, etiqueta, contenedor):
+    """
+    Dibuja un mapa de calor temperatura x humedad (NaN en los escenarios pendientes).
+    """
+    with etapa("graficos"):
+        fig = px.imshow(valores, x=hums, y=temps, origin="lower", aspect="auto", title=titulo,
+                        labels={"x": "Humedad (%)", "y": "Temperatura (°C)", "color": etiqueta})
+    with etapa("renderizado"):
+        contenedor.plotly_chart(fig)
+
+
+def mostrar_rejilla(parametros):
+    """
+    Barrido temperatura x humedad de Ross-Macdonald con ``barrido.ejecutar_barrido``.
+
+    Los bloques de escenarios se resuelven en ``TRABAJADORES_BARRIDO``
+    procesos y los mapas de calor se redibujan a medida que llegan. De cada
+    escenario solo se guardan el pico de humanos infectados y la tasa de
+    ataque, no la trayectoria. El botón de cancelar activa el
+    ``threading.Event`` que vigila el barrido.
+    """
+    temps = np.linspace(parametros["temp_min"], parametros["temp_max"], parametros["temp_pasos"])
+    hums = np.linspace(parametros["hum_min"], parametros["hum_max"], parametros["hum_pasos"])
+    total = len(temps) * len(hums)
+    st.subheader(f"Barrido en Rejilla: {len(temps)} x {len(hums)} = {total} escenarios")
+    if not st.button("Ejecutar Barrido"):
+        if st.session_state.pop("barrido_cancelado", False):
+            st.warning("Barrido cancelado.")
+        return
+
+    muestras = {
+        **rejilla(temp=temps, humedad=hums),
+        "poblacion_h": parametros["poblacion"],
+        "infectados_h": parametros["infectados_iniciales"],
+        "infectados_v_iniciales": parametros["infectados_v_iniciales"],
+        "b": parametros["b"],
+        "c": parametros["c"],
+        "gamma": parametros["gamma"],
+    }
+    compartimentos = MODELOS["ross_macdonald"].compartimentos
+    susceptibles = compartimentos.index("Humanos Susceptibles")
+    infectados = compartimentos.index("Humanos Infectados")
+    # La rejilla varía la humedad más rápido: el índice plano es el de (temp, humedad)
+    pico = np.full((len(temps), len(hums)), np.nan)
+    ataque = np.full((len(temps), len(hums)), np.nan)
+
+    cancelar = threading.Event()
+    st.button("Cancelar Barrido", on_click=_cancelar_barrido, args=(cancelar,))
+    barra = st.progress(0.0, text="Calculando escenarios...")
+    col1, col2 = st.columns(2)
+    grafico_pico, grafico_ataque = col1.empty(), col2.empty()
+
+    def progreso(completadas, total):
+        barra.progress(completadas / total, text=f"{completadas} de {total} escenarios calculados")
+
+    inicio_barrido = time.perf_counter()
+    ultima = 0.0
+    barrido = ejecutar_barrido("ross_macdonald", muestras, parametros["dias"], AJUSTES_APP,
+                               preparar=preparar_ross_macdonald, max_trabajadores=TRABAJADORES_BARRIDO,
+                               progreso=progreso, cancelar=cancelar)
+    # ``closing`` cancela los bloques pendientes si Streamlit interrumpe la página
+    with closing(barrido):
+        completadas = 0
+        for inicio, datos in barrido:
+            bloque = slice(inicio, inicio + len(datos))
+            pico.flat[bloque] = datos[:, :, infectados].max(axis=1)
+            ataque.flat[bloque] = 1.0 - datos[:, -1, susceptibles] / parametros["poblacion"]
+            completadas += len(datos)
+            if completadas < total and time.perf_counter() - ultima < INTERVALO_ACTUALIZACION:
+                continue
+            _mapa_rejilla(pico, temps, hums, "Pico de Humanos Infectados", "Personas", grafico_pico)
+            _mapa_rejilla(ataque, temps, hums, "Tasa de Ataque", "Fracción", grafico_ataque)
+            ultima = time.perf_counter()
+    barra.empty()
+    if cancelar.is_set():
+        st.warning(f"Barrido cancelado tras {completadas} de {total} escenarios.")
+        return
+    duracion = time.perf_counter() - inicio_barrido
+    st.success(f"{total} escenarios en {duracion:.1f} s ({total / duracion:.0f} escenarios/s)")
+    mostrar_tabla(pd.DataFrame({
+        "Temperatura": np.repeat(temps, len(hums)),
+        "Humedad": np.tile(hums, len(temps)),
+        "Pico de Infectados": pico.ravel(),
+        "Tasa de Ataque": ataque.ravel(),
+    }), "Resultados por Escenario")
+
+
+def mostrar_series(df, columnas, titulo, contenedor=None, **opciones):
+    """
+    Dibuja las columnas de ``df`` frente al día, midiendo la construcción del
+    gráfico y su envío al navegador por separado.
+
+    Las series de más de ``PUNTOS_GRAFICO`` puntos se reducen antes con LTTB
+    (ver ``reduccion``), de modo que el tamaño del gráfico no depende del
+    horizonte. Con ``contenedor`` (un ``st.empty()``) el gráfico sustituye al
+    anterior, lo que permite ir actualizándolo.
+    """
+    with etapa("graficos"):
+        df = reducir_frame(df, columnas, PUNTOS_GRAFICO, grupo=opciones.get("color"))
+        fig = px.line(df, x="Día", y=columnas, title=titulo, **opciones)
+    with etapa("renderizado"):
+        (contenedor or st).plotly_chart(fig)
+
+
+def mostrar_tabla(df, titulo):
+    """
+    Muestra ``df`` en un desplegable, por páginas de ``FILAS_PAGINA`` filas
+    para no enviar la tabla completa al navegador.
+    """
+    with st.expander(titulo):
+        paginas = max(1, -(-len(df) // FILAS_PAGINA))
+        pagina = 1
+        if paginas > 1:
+            pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1, key=f"pagina_{titulo}")
+            inicio = (pagina - 1) * FILAS_PAGINA
+            st.caption(f"Filas {inicio + 1}–{min(inicio + FILAS_PAGINA, len(df))} de {len(df)}")
+        with etapa("renderizado"):
+            st.dataframe(df.iloc[(pagina - 1) * FILAS_PAGINA:pagina * FILAS_PAGINA])
+
+
+def _frame_comparativa(t, infectados, etiquetas):
+    """
+    DataFrame largo de la comparativa con los escenarios ya calculados
+    (los pendientes son None en ``infectados``).
+
+    Las etiquetas repetidas (por ejemplo, con incremento 0) se numeran para
+    que cada escenario tenga su propia categoría.
+    """
+    repetidas = {etiqueta for etiqueta in etiquetas if etiquetas.count(etiqueta) > 1}
+    etiquetas = [f"{etiqueta} #{i + 1}" if etiqueta in repetidas else etiqueta for i, etiqueta in enumerate(etiquetas)]
+    calculados = [i for i, serie in enumerate(infectados) if serie is not None]
+    return pd.DataFrame({
+        "Día": np.tile(t, len(calculados)),
+        "Humanos Infectados": np.concatenate([infectados[i] for i in calculados]),
+        "Escenario": pd.Categorical.from_codes(np.repeat(calculados, len(t)), etiquetas),
+    })
+
+
+def pagina():
+    """
+    Construye la página según el modelo y los parámetros de la barra lateral.
     """
     st.title("Simulación de Modelos Epidemiológicos")
     st.markdown("""
@@ -22,17 +236,20 @@ def main():
     Creada como complemento al proyecto de investigación de **------------**.
     """)
 
-    modelo, parametros = sidebar()
+    with etapa("parametros"):
+        modelo, parametros = sidebar()
 
     if modelo == "SIR":
-        df = modelo_sir(
-            poblacion=parametros["poblacion"],
-            infectados_iniciales=parametros["infectados_iniciales"],
-            recuperados_iniciales=parametros["recuperados_iniciales"],
-            beta=parametros["beta"],
-            gamma=parametros["gamma"],
-            dias=parametros["dias"]
-        )
+        with etapa("resolucion"):
+            resultado = resolver("sir", dict(
+                poblacion=parametros["poblacion"],
+                infectados_iniciales=parametros["infectados_iniciales"],
+                recuperados_iniciales=parametros["recuperados_iniciales"],
+                beta=parametros["beta"],
+                gamma=parametros["gamma"]
+            ), parametros["dias"])
+        with etapa("resultados"):
+            df = resultado.to_frame()
         st.header("Modelo SIR")
         st.markdown("""
         El modelo SIR divide la población en tres compartimentos: 
@@ -40,23 +257,22 @@ def main():
         """)
         with st.expander("Parámetros Utilizados"):
             st.write(parametros)
-        fig = px.line(df, x="Día", y=["Susceptibles", "Infectados", "Recuperados"], 
-                      title="Simulación del Modelo SIR")
-        st.plotly_chart(fig)
-        with st.expander("Datos de la Simulación"):
-            st.dataframe(df)
+        mostrar_series(df, ["Susceptibles", "Infectados", "Recuperados"], "Simulación del Modelo SIR")
+        mostrar_tabla(df, "Datos de la Simulación")
 
     elif modelo == "SEIR":
-        df = modelo_seir(
-            poblacion=parametros["poblacion"],
-            infectados_iniciales=parametros["infectados_iniciales"],
-            recuperados_iniciales=parametros["recuperados_iniciales"],
-            expuestos_iniciales=parametros["expuestos_iniciales"],
-            beta=parametros["beta"],
-            gamma=parametros["gamma"],
-            sigma=parametros["sigma"],
-            dias=parametros["dias"]
-        )
+        with etapa("resolucion"):
+            resultado = resolver("seir", dict(
+                poblacion=parametros["poblacion"],
+                infectados_iniciales=parametros["infectados_iniciales"],
+                recuperados_iniciales=parametros["recuperados_iniciales"],
+                expuestos_iniciales=parametros["expuestos_iniciales"],
+                beta=parametros["beta"],
+                gamma=parametros["gamma"],
+                sigma=parametros["sigma"]
+            ), parametros["dias"])
+        with etapa("resultados"):
+            df = resultado.to_frame()
         st.header("Modelo SEIR")
         st.markdown("""
         El modelo SEIR añade un compartimento de Expuestos (E) al modelo SIR. 
@@ -64,20 +280,19 @@ def main():
         """)
         with st.expander("Parámetros Utilizados"):
             st.write(parametros)
-        fig = px.line(df, x="Día", y=["Susceptibles", "Expuestos", "Infectados", "Recuperados"],
-                        title="Simulación del Modelo SEIR")
-        st.plotly_chart(fig)
-        with st.expander("Datos de la Simulación"):
-            st.dataframe(df)
+        mostrar_series(df, ["Susceptibles", "Expuestos", "Infectados", "Recuperados"], "Simulación del Modelo SEIR")
+        mostrar_tabla(df, "Datos de la Simulación")
 
     elif modelo == "SIS":
-        df = modelo_sis(
-            poblacion=parametros["poblacion"],
-            infectados_iniciales=parametros["infectados_iniciales"],
-            beta=parametros["beta"],
-            gamma=parametros["gamma"],
-            dias=parametros["dias"]
-        )
+        with etapa("resolucion"):
+            resultado = resolver("sis", dict(
+                poblacion=parametros["poblacion"],
+                infectados_iniciales=parametros["infectados_iniciales"],
+                beta=parametros["beta"],
+                gamma=parametros["gamma"]
+            ), parametros["dias"])
+        with etapa("resultados"):
+            df = resultado.to_frame()
         st.header("Modelo SIS")
         st.markdown("""
         En el modelo SIS (Susceptible-Infectado-Susceptible), los individuos 
@@ -85,19 +300,18 @@ def main():
         """)
         with st.expander("Parámetros Utilizados"):
             st.write(parametros)
-        fig = px.line(df, x="Día", y=["Susceptibles", "Infectados"],
-                        title="Simulación del Modelo SIS")
-        st.plotly_chart(fig)
-        with st.expander("Datos de la Simulación"):
-            st.dataframe(df)
+        mostrar_series(df, ["Susceptibles", "Infectados"], "Simulación del Modelo SIS")
+        mostrar_tabla(df, "Datos de la Simulación")
 
     elif modelo == "SI":
-        df = modelo_si(
-            poblacion=parametros["poblacion"],
-            infectados_iniciales=parametros["infectados_iniciales"],
-            beta=parametros["beta"],
-            dias=parametros["dias"]
-        )
+        with etapa("resolucion"):
+            resultado = resolver("si", dict(
+                poblacion=parametros["poblacion"],
+                infectados_iniciales=parametros["infectados_iniciales"],
+                beta=parametros["beta"]
+            ), parametros["dias"])
+        with etapa("resultados"):
+            df = resultado.to_frame()
         st.header("Modelo SI")
         st.markdown("""
         El modelo SI (Susceptible-Infectado) es el más simple. 
@@ -105,11 +319,8 @@ def main():
         """)
         with st.expander("Parámetros Utilizados"):
             st.write(parametros)
-        fig = px.line(df, x="Día", y=["Susceptibles", "Infectados"],
-                        title="Simulación del Modelo SI")
-        st.plotly_chart(fig)
-        with st.expander("Datos de la Simulación"):
-            st.dataframe(df)
+        mostrar_series(df, ["Susceptibles", "Infectados"], "Simulación del Modelo SI")
+        mostrar_tabla(df, "Datos de la Simulación")
     elif modelo == "Modelo Ross-Macdonald":
         # Documentación del Modelo
         st.header("Modelo Ross-Macdonald (Enfermedades por Vectores)")
@@ -130,61 +341,56 @@ def main():
 
         modo_sim = parametros.get("modo_sim", "Simulación Simple")
         
-        # Función auxiliar para calcular parámetros dependientes
-        def calc_params_bio(temp, hum):
-            # Tasa de picaduras (a)
-            a_val = max(0.05, 0.2 + 0.02 * (temp - 20))
-            # Densidad (m)
-            if hum < 30:
-                m_val = max(0.1, hum / 100)
-            else:
-                m_val = 1 + 0.05 * (hum - 30)
-            return a_val, m_val
-
-        mu_mosq = 0.1 # Mortalidad base
-
-        if modo_sim == "Simulación Simple":
+        mu_mosq = MU_MOSQUITO # Mortalidad base
+
+        if modo_sim == "Barrido Guardado":
+            mostrar_almacen(parametros["almacen"])
+
+        elif modo_sim == "Barrido en Rejilla":
+            mostrar_rejilla(parametros)
+
+        elif modo_sim == "Simulación Simple":
             temp = parametros["temp"]
             hum = parametros["humedad"]
             a_calc, m_calc = calc_params_bio(temp, hum)
             
+            parametros_rm = {
+                "poblacion_h": parametros["poblacion"],
+                "infectados_h": parametros["infectados_iniciales"],
+                "infectados_v_iniciales": parametros["infectados_v_iniciales"],
+                "m": m_calc,
+                "a": a_calc,
+                "b": parametros["b"],
+                "c": parametros["c"],
+                "gamma": parametros["gamma"],
+                "mu": mu_mosq,
+            }
             # Ejecutar Simulación
-            df = modelo_ross_macdonald(
-                poblacion_h=parametros["poblacion"],
-                infectados_h=parametros["infectados_iniciales"],
-                infectados_v_iniciales=parametros["infectados_v_iniciales"],
-                m=m_calc,
-                a=a_calc,
-                b=parametros["b"],
-                c=parametros["c"],
-                gamma=parametros["gamma"],
-                mu=mu_mosq,
-                dias=parametros["dias"]
-            )
+            with etapa("resolucion"):
+                resultado = resolver("ross_macdonald", parametros_rm, parametros["dias"])
+            with etapa("resultados"):
+                df = resultado.to_frame()
+            # R0 clásico de Macdonald (humano -> humano): el cuadrado del de la
+            # matriz de nueva generación, que cuenta una generación por picadura
+            r0 = float(numero_reproductivo("ross_macdonald", parametros_rm)[0]) ** 2
             
             with st.expander("Parámetros Utilizados", expanded=True):
                 col1, col2, col3 = st.columns(3)
                 col1.metric("Temperatura", f"{temp}°C", f"Picaduras (a): {a_calc:.2f}/día")
                 col2.metric("Humedad", f"{hum}%", f"Densidad (m): {m_calc:.2f}")
-                col3.metric("R0 Estimado", f"{(m_calc * a_calc**2 * parametros['b'] * parametros['c']) / (parametros['gamma'] * mu_mosq):.2f}")
+                col3.metric("R0 Estimado", f"{r0:.2f}")
                 st.write(parametros)
 
             # Gráficos Individuales
             st.subheader("Dinámica de la Infección")
-            fig_h = px.line(df, x="Día", y=["Humanos Susceptibles", "Humanos Infectados", "Humanos Recuperados"],
-                            title="Población Humana", color_discrete_sequence=["blue", "red", "green"])
-            st.plotly_chart(fig_h)
-            
-            fig_v = px.line(df, x="Día", y=["Mosquitos Susceptibles", "Mosquitos Infectados"],
-                            title="Población de Mosquitos (Vectores)", color_discrete_sequence=["orange", "purple"])
-            st.plotly_chart(fig_v)
-            
-            with st.expander("Datos Detallados"):
-                st.dataframe(df)
+            mostrar_series(df, ["Humanos Susceptibles", "Humanos Infectados", "Humanos Recuperados"],
+                           "Población Humana", color_discrete_sequence=["blue", "red", "green"])
+            mostrar_series(df, ["Mosquitos Susceptibles", "Mosquitos Infectados"],
+                           "Población de Mosquitos (Vectores)", color_discrete_sequence=["orange", "purple"])
+            mostrar_tabla(df, "Datos Detallados")
 
         else:
             # Lógica Comparativa (Temp o Humedad)
-            dfs = []
             param_list = []
             
             hum_fija = parametros.get("humedad")
@@ -198,60 +404,126 @@ def main():
             step_val = parametros["temp_step"] if is_temp_mode else parametros["hum_step"]
 
             st.subheader(f"Comparativa: Variando {'Temperatura' if is_temp_mode else 'Humedad'}")
+            infectados = [None] * num_escenarios
             
+            valores = base_val + np.arange(num_escenarios) * step_val
+            temps = valores if is_temp_mode else np.full(num_escenarios, temp_fija)
+            hums = np.full(num_escenarios, hum_fija) if is_temp_mode else valores
+            # Parámetros biológicos de todos los escenarios de una vez
+            a_vals, m_vals = calc_params_bio(temps, hums)
+            # Métricas resumen de todos los escenarios en un solo lote
+            with etapa("resolucion"):
+                resumen = compartido().metricas("ross_macdonald", {
+                "poblacion_h": parametros["poblacion"],
+                "infectados_h": parametros["infectados_iniciales"],
+                "infectados_v_iniciales": parametros["infectados_v_iniciales"],
+                "m": m_vals,
+                "a": a_vals,
+                "b": parametros["b"],
+                "c": parametros["c"],
+                "gamma": parametros["gamma"],
+                "mu": mu_mosq,
+                }, parametros["dias"]).result()
+
             for i in range(num_escenarios):
-                current_val = base_val + (i * step_val)
-                
+                t_iter = float(temps[i])
+                h_iter = float(hums[i])
+                a_iter = float(a_vals[i])
+                m_iter = float(m_vals[i])
                 if is_temp_mode:
-                    t_iter = current_val
-                    h_iter = hum_fija
                     label = f"{t_iter}°C (Hum: {h_iter}%)"
                 else:
-                    t_iter = temp_fija
-                    h_iter = current_val
                     label = f"{h_iter}% Hum (Temp: {t_iter}°C)"
-                
-                a_iter, m_iter = calc_params_bio(t_iter, h_iter)
-                
-                df_iter = modelo_ross_macdonald(
-                    poblacion_h=parametros["poblacion"],
-                    infectados_h=parametros["infectados_iniciales"],
-                    infectados_v_iniciales=parametros["infectados_v_iniciales"],
-                    m=m_iter,
-                    a=a_iter,
-                    b=parametros["b"],
-                    c=parametros["c"],
-                    gamma=parametros["gamma"],
-                    mu=mu_mosq,
-                    dias=parametros["dias"]
-                )
-                
-                df_iter["Escenario"] = label
-                # Guardamos solo lo necesario para comparar humanos infectados
-                df_clean = df_iter[["Día", "Humanos Infectados", "Escenario"]]
-                dfs.append(df_clean)
-                
+
                 param_list.append({
                     "Escenario": label,
                     "Temp": t_iter,
                     "Humedad": h_iter,
                     "Picaduras (a)": round(a_iter, 3),
-                    "Densidad (m)": round(m_iter, 3)
+                    "Densidad (m)": round(m_iter, 3),
+                    "R0": round(float(resumen["r0"][i]) ** 2, 2),
+                    "Pico de Infectados": round(float(resumen["pico"][i])),
+                    "Día del Pico": round(float(resumen["dia_pico"][i]), 1),
+                    "Tasa de Ataque": f"{resumen['ataque'][i]:.1%}",
                 })
 
-            df_final = pd.concat(dfs)
-
+            # Las métricas están listas antes que las trayectorias: se muestran ya
             with st.expander("Parámetros de los Escenarios", expanded=True):
                 st.table(pd.DataFrame(param_list))
 
-            # Gráfico Comparativo
-            fig = px.line(df_final, x="Día", y="Humanos Infectados", color="Escenario",
-                          title=f"Comparativa de Infecciones Humanas - {modo_sim}",
-                          labels={"Humanos Infectados": "Personas Infectadas"})
-            st.plotly_chart(fig)
-            
-            with st.expander("Datos Completos de la Simulación"):
-                st.dataframe(df_final)
+            # Cada escenario se envía a la capa de servicio, que los resuelve en
+            # segundo plano (los que ya ha pedido otra sesión no se repiten)
+            futuros = {}
+            for i in range(num_escenarios):
+                futuro = compartido().simular("ross_macdonald", {
+                    "poblacion_h": parametros["poblacion"],
+                    "infectados_h": parametros["infectados_iniciales"],
+                    "infectados_v_iniciales": parametros["infectados_v_iniciales"],
+                    "m": float(m_vals[i]),
+                    "a": float(a_vals[i]),
+                    "b": parametros["b"],
+                    "c": parametros["c"],
+                    "gamma": parametros["gamma"],
+                    "mu": mu_mosq,
+                }, parametros["dias"], AJUSTES_APP)
+                futuros[futuro] = i
+
+            # Gráfico Comparativo: se redibuja a medida que terminan los escenarios.
+            # Guardamos solo lo necesario para comparar humanos infectados,
+            # sin construir el DataFrame completo de cada escenario
+            etiquetas = [fila["Escenario"] for fila in param_list]
+            titulo = f"Comparativa de Infecciones Humanas - {modo_sim}"
+            grafico = st.empty()
+            progreso = st.progress(0.0, text="Calculando escenarios...")
+            ultima = 0.0
+            for completados, futuro in enumerate(as_completed(futuros), 1):
+                res_iter = futuro.result()
+                infectados[futuros[futuro]] = res_iter["Humanos Infectados"]
+                if completados < num_escenarios and time.perf_counter() - ultima < INTERVALO_ACTUALIZACION:
+                    continue
+                with etapa("resultados"):
+                    df_final = _frame_comparativa(res_iter.t, infectados, etiquetas)
+                mostrar_series(df_final, "Humanos Infectados", titulo, contenedor=grafico,
+                               color="Escenario", labels={"Humanos Infectados": "Personas Infectadas"})
+                progreso.progress(completados / num_escenarios,
+                                  text=f"{completados} de {num_escenarios} escenarios calculados")
+                ultima = time.perf_counter()
+            progreso.empty()
+
+            mostrar_tabla(df_final, "Datos Completos de la Simulación")
+
+def mostrar_depuracion(registro):
+    """
+    Muestra los tiempos por etapa y las estadísticas del integrador de la
+    ejecución, y los totales en formato Prometheus.
+    """
+    with st.expander("Depuración: tiempos y estadísticas"):
+        etapas = pd.DataFrame({"Etapa": list(registro.etapas), "Segundos": list(registro.etapas.values())})
+        st.table(etapas)
+        st.write({"Total (s)": registro.duracion, **registro.solver(), "Caché": estadisticas_cache(),
+                  "Servicio": compartido().estadisticas()})
+        if registro.integraciones:
+            st.dataframe(pd.DataFrame([{k: v for k, v in info.items() if k != "eventos"}
+                                       for info in registro.integraciones]))
+        st.code(instrumentacion.prometheus() + compartido().prometheus(), language="text")
+
+
+def main():
+    """
+    Función principal de la aplicación.
+
+    Con la instrumentación activa (``SIMULACION_INSTRUMENTACION=1``) cada
+    rerun se registra y se muestra al final en un desplegable de depuración.
+    Si la capa de servicio está saturada se pide al usuario que lo reintente.
+    """
+    with instrumentacion.ejecucion("aplicacion") as registro:
+        try:
+            pagina()
+        except ServicioSaturado:
+            st.error("Hay demasiadas simulaciones en curso. Vuelve a intentarlo en unos segundos.")
+    if registro is not None:
+        mostrar_depuracion(registro)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de métricas resumen de los modelos sin guardar las trayectorias.
+
+Para muchos usos basta con unos pocos números por escenario: el pico de
+infectados y su día, la tasa de ataque, el día en que se cruza un umbral y
+R0 / R efectivo. ``metricas`` los calcula para un lote de escenarios
+avanzando el integrador paso a paso (las clases ``OdeSolver`` de SciPy) y
+quedándose solo con acumulados por escenario, así que la memoria es la del
+estado (escenario, compartimento) y no la de (escenario, día, compartimento).
+
+Los instantes del pico y del umbral se detectan como eventos dentro de cada
+paso: con el valor y la derivada del compartimento en los extremos del paso
+se construye el interpolante cúbico de Hermite y se busca por bisección el
+cero de su derivada (pico) o el cruce del umbral, todo vectorizado sobre los
+escenarios.
+
+En SIR y SEIR se añade además el tamaño final de la epidemia (t -> infinito)
+por la relación cerrada ``s_inf = s_0 · exp(-R0 · (1 - s_inf - r_0))``, que se
+resuelve con la función W de Lambert.
+"""
+
+import numpy as np
+import scipy.integrate
+from scipy.special import lambertw
+
+import nucleos
+from models import _nombre_modelo, _preparar_lote, MODELOS
+from solucionadores import METODOS_IVP, AjustesSolver, _jac_ivp, _tolerancias
+
+AJUSTES_METRICAS = AjustesSolver(metodo="LSODA", malla="final")
+
+# Campos de las métricas de cada escenario (NaN si no existen: sin umbral, SIS...):
+# - pico y dia_pico: máximo del compartimento observado y su instante.
+# - ataque: fracción de la población (del grupo del compartimento que se
+#   contagia: humanos en Ross-Macdonald) infectada hasta el último día.
+# - ataque_final: tasa de ataque cuando t -> infinito (solo SIR y SEIR).
+# - dia_umbral: primer instante en que el compartimento observado alcanza el umbral.
+# - r0 y r_efectivo: número reproductivo básico y efectivo en el último día.
+DTYPE_METRICAS = np.dtype([
+    ("pico", "f8"),
+    ("dia_pico", "f8"),
+    ("ataque", "f8"),
+    ("ataque_final", "f8"),
+    ("dia_umbral", "f8"),
+    ("r0", "f8"),
+    ("r_efectivo", "f8"),
+])
+
+
+def _grupo_contagio(definicion):
+    """
+    Devuelve ``(origen, grupo)``: el compartimento que pierde un individuo con el
+    contagio (la primera transición) y los compartimentos conectados con él por
+    transiciones (la población del mismo tipo). ``origen`` es None si ese
+    compartimento tiene otras transiciones y no sirve para contar contagios.
+    """
+    cambios = np.asarray(definicion.cambios) != 0
+    origen = int(np.argmin(definicion.cambios[0]))
+    grupo = {origen}
+    while True:
+        filas = cambios[:, sorted(grupo)].any(axis=1)
+        nuevo = grupo | set(np.flatnonzero(cambios[filas].any(axis=0)))
+        if nuevo == grupo:
+            break
+        grupo = nuevo
+    if cambios[:, origen].sum() != 1:
+        origen = None
+    return origen, sorted(grupo)
+
+
+def _ataque_final_sir(p, poblacion, susceptibles, recuperados):
+    """
+    Tasa de ataque final de SIR y SEIR por la relación del tamaño final.
+    """
+    r0 = p["beta"] / p["gamma"]
+    s0 = susceptibles / poblacion
+    r_ini = recuperados / poblacion
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s_inf = -np.real(lambertw(-r0 * s0 * np.exp(-r0 * (1.0 - r_ini)))) / r0
+    return np.where(r0 > 0, s0 - s_inf, 0.0)
+
+
+# Modelos con tamaño final cerrado: función de los parámetros y del estado inicial
+_ATAQUE_FINAL = {
+    "sir": lambda p, y0: _ataque_final_sir(p, p["poblacion"], y0[0], y0[-1]),
+    "seir": lambda p, y0: _ataque_final_sir(p, p["poblacion"], y0[0], y0[-1]),
+}
+
+
+def _hermite(s, x0, x1, d0, d1, h):
+    """
+    Interpolante cúbico de Hermite en s ∈ [0, 1] y su derivada respecto del tiempo.
+    """
+    c2 = 3.0 * (x1 - x0) - h * (2.0 * d0 + d1)
+    c3 = 2.0 * (x0 - x1) + h * (d0 + d1)
+    valor = x0 + s * (h * d0 + s * (c2 + s * c3))
+    derivada = (h * d0 + s * (2.0 * c2 + 3.0 * s * c3)) / h
+    return valor, derivada
+
+
+def _biseccion(funcion, n, iteraciones=40):
+    """
+    Cero en [0, 1] de una función vectorizada con f(0) < 0 <= f(1).
+    """
+    bajo, alto = np.zeros(n), np.ones(n)
+    for _ in range(iteraciones):
+        medio = 0.5 * (bajo + alto)
+        negativo = funcion(medio) < 0
+        bajo = np.where(negativo, medio, bajo)
+        alto = np.where(negativo, alto, medio)
+    return 0.5 * (bajo + alto)
+
+
+def metricas(modelo, parametros, dias, umbral=None, compartimento=None, ajustes=AJUSTES_METRICAS):
+    """
+    Calcula las métricas resumen de un lote de escenarios sin guardar trayectorias.
+
+    Args:
+        modelo (str | callable): Modelo (como en ``simular_lote``).
+        parametros (dict | array): Parámetros de los escenarios (como en ``simular_lote``).
+        dias (int): Número de días para simular.
+        umbral (float, optional): Valor del compartimento observado cuyo primer cruce
+            se busca (``dia_umbral``).
+        compartimento (str, optional): Compartimento observado (por defecto, el
+            primero con "Infectados" en el nombre; "Humanos Infectados" en Ross-Macdonald).
+        ajustes (AjustesSolver, optional): Método (uno de ``METODOS_IVP``) y tolerancias.
+
+    Returns:
+        numpy.ndarray: Array estructurado de forma (escenario,) con los campos de
+        ``DTYPE_METRICAS``.
+    """
+    if ajustes.metodo not in METODOS_IVP:
+        raise ValueError(f"Las métricas necesitan un método de paso adaptativo: {', '.join(METODOS_IVP)}")
+    nombre = _nombre_modelo(modelo)
+    definicion = MODELOS[nombre]
+    if compartimento is None:
+        compartimento = next(c for c in definicion.compartimentos if "Infectados" in c)
+    indice = definicion.compartimentos.index(compartimento)
+
+    p = _preparar_lote(definicion, parametros)
+    y0 = np.column_stack(definicion.condiciones_iniciales(p)).astype(float)
+    n, k = y0.shape
+    args = tuple(np.broadcast_to(np.asarray(arg, dtype=float), (n,)) for arg in definicion.argumentos(p))
+    func, Dfun, args_func = nucleos.preparar(definicion.deriv, definicion.jac, args, n, k)
+    opciones = {}
+    jac = _jac_ivp(Dfun, args_func, ajustes.metodo, (k - 1, k - 1), n * k)
+    if jac is not None:
+        opciones["jac"] = jac
+        if ajustes.metodo == "LSODA":
+            opciones["lband"] = opciones["uband"] = k - 1
+    solver = getattr(scipy.integrate, ajustes.metodo)(
+        lambda t, y: func(y, t, *args_func), 0.0, y0.ravel(), float(dias), **opciones, **_tolerancias(ajustes))
+
+    resultado = np.full(n, np.nan, dtype=DTYPE_METRICAS)
+    t0, y = 0.0, y0
+    d = func(y0.ravel(), 0.0, *args_func).reshape(n, k)[:, indice]
+    pico, dia_pico = y0[:, indice].copy(), np.zeros(n)
+    dia_umbral = np.where(y0[:, indice] >= umbral, 0.0, np.nan) if umbral is not None else None
+
+    while solver.status == "running":
+        mensaje = solver.step()
+        if solver.status == "failed":
+            raise RuntimeError(f"La integración con {ajustes.metodo} ha fallado: {mensaje}")
+        t1, y1 = solver.t, solver.y.reshape(n, k)
+        d1 = func(solver.y, t1, *args_func).reshape(n, k)[:, indice]
+        h = t1 - t0
+        x0, x1 = y[:, indice], y1[:, indice]
+
+        # Pico: la derivada pasa de positiva a no positiva dentro del paso
+        candidatos = np.flatnonzero((d > 0) & (d1 <= 0))
+        if len(candidatos):
+            c = (x0[candidatos], x1[candidatos], d[candidatos], d1[candidatos], h)
+            s = _biseccion(lambda s: -_hermite(s, *c)[1], len(candidatos))
+            valor = _hermite(s, *c)[0]
+            mejora = valor > pico[candidatos]
+            pico[candidatos[mejora]] = valor[mejora]
+            dia_pico[candidatos[mejora]] = t0 + s[mejora] * h
+        mejora = x1 > pico
+        pico[mejora], dia_pico[mejora] = x1[mejora], t1
+
+        # Primer cruce del umbral
+        if dia_umbral is not None:
+            cruces = np.flatnonzero(np.isnan(dia_umbral) & (x1 >= umbral))
+            if len(cruces):
+                c = (x0[cruces], x1[cruces], d[cruces], d1[cruces], h)
+                s = _biseccion(lambda s: _hermite(s, *c)[0] - umbral, len(cruces))
+                dia_umbral[cruces] = t0 + s * h
+        t0, y, d = t1, y1, d1
+
+    resultado["pico"], resultado["dia_pico"] = pico, dia_pico
+    if dia_umbral is not None:
+        resultado["dia_umbral"] = dia_umbral
+    origen, grupo = _grupo_contagio(definicion)
+    if origen is not None:
+        resultado["ataque"] = (y0[:, origen] - y[:, origen]) / y0[:, grupo].sum(axis=1)
+    if nombre in _ATAQUE_FINAL:
+        resultado["ataque_final"] = _ATAQUE_FINAL[nombre](p, tuple(y0.T))
+    if definicion.r0 is not None:
+        resultado["r0"] = definicion.r0(*args)
+        resultado["r_efectivo"] = definicion.r0(*args, y=tuple(y.T))
+    return resultado
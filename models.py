@@ -4,12 +4,19 @@
 Módulo para implementar los modelos epidemiológicos.
 """
 
+import os
+import threading
+from collections import OrderedDict
+
 import numpy as np
-from scipy.integrate import odeint
-import pandas as pd
+
+import nucleos
+from cache import CacheSimulaciones, clave_canonica
+from especificacion import ModeloCompartimental, Transicion
+from solucionadores import AJUSTES_POR_DEFECTO, indice_rigidez, integrar, malla_tiempos
 
 # Modelo SIR
-def modelo_sir(poblacion, infectados_iniciales, recuperados_iniciales, beta, gamma, dias):
+def modelo_sir(poblacion, infectados_iniciales, recuperados_iniciales, beta, gamma, dias, ajustes=AJUSTES_POR_DEFECTO):
     """
     Simula el modelo SIR.
 
@@ -20,42 +27,21 @@ def modelo_sir(poblacion, infectados_iniciales, recuperados_iniciales, beta, gam
         beta (float): Tasa de transmisión.
         gamma (float): Tasa de recuperación.
         dias (int): Número de días para simular.
+        ajustes (AjustesSolver, optional): Integrador, tolerancias y malla de salida.
 
     Returns:
         pandas.DataFrame: DataFrame con los resultados de la simulación.
     """
-    # Población susceptible inicial
-    susceptibles_iniciales = poblacion - infectados_iniciales - recuperados_iniciales
-    
-    # Vector de condiciones iniciales
-    y0 = susceptibles_iniciales, infectados_iniciales, recuperados_iniciales
-    
-    # Puntos de tiempo
-    t = np.linspace(0, dias, dias)
-
-    # Ecuaciones diferenciales del modelo SIR
-    def deriv(y, t, N, beta, gamma):
-        S, I, R = y
-        dSdt = -beta * S * I / N
-        dIdt = beta * S * I / N - gamma * I
-        dRdt = gamma * I
-        return dSdt, dIdt, dRdt
-
-    # Integrar las ecuaciones SIR a lo largo del tiempo
-    ret = odeint(deriv, y0, t, args=(poblacion, beta, gamma))
-    S, I, R = ret.T
-
-    # Crear DataFrame con los resultados
-    df = pd.DataFrame({
-        'Día': t,
-        'Susceptibles': S,
-        'Infectados': I,
-        'Recuperados': R
-    })
-    return df
+    return simular("sir", {
+        "poblacion": poblacion,
+        "infectados_iniciales": infectados_iniciales,
+        "recuperados_iniciales": recuperados_iniciales,
+        "beta": beta,
+        "gamma": gamma,
+    }, dias, ajustes).to_frame()
 
 # Modelo SEIR
-def modelo_seir(poblacion, infectados_iniciales, recuperados_iniciales, expuestos_iniciales, beta, gamma, sigma, dias):
+def modelo_seir(poblacion, infectados_iniciales, recuperados_iniciales, expuestos_iniciales, beta, gamma, sigma, dias, ajustes=AJUSTES_POR_DEFECTO):
     """
     Simula el modelo SEIR.
 
@@ -68,36 +54,23 @@ def modelo_seir(poblacion, infectados_iniciales, recuperados_iniciales, expuesto
         gamma (float): Tasa de recuperación.
         sigma (float): Tasa de incubación.
         dias (int): Número de días para simular.
+        ajustes (AjustesSolver, optional): Integrador, tolerancias y malla de salida.
 
     Returns:
         pandas.DataFrame: DataFrame con los resultados de la simulación.
     """
-    susceptibles_iniciales = poblacion - infectados_iniciales - recuperados_iniciales - expuestos_iniciales
-    y0 = susceptibles_iniciales, expuestos_iniciales, infectados_iniciales, recuperados_iniciales
-    t = np.linspace(0, dias, dias)
-
-    def deriv(y, t, N, beta, gamma, sigma):
-        S, E, I, R = y
-        dSdt = -beta * S * I / N
-        dEdt = beta * S * I / N - sigma * E
-        dIdt = sigma * E - gamma * I
-        dRdt = gamma * I
-        return dSdt, dEdt, dIdt, dRdt
-
-    ret = odeint(deriv, y0, t, args=(poblacion, beta, gamma, sigma))
-    S, E, I, R = ret.T
-
-    df = pd.DataFrame({
-        'Día': t,
-        'Susceptibles': S,
-        'Expuestos': E,
-        'Infectados': I,
-        'Recuperados': R
-    })
-    return df
+    return simular("seir", {
+        "poblacion": poblacion,
+        "infectados_iniciales": infectados_iniciales,
+        "recuperados_iniciales": recuperados_iniciales,
+        "expuestos_iniciales": expuestos_iniciales,
+        "beta": beta,
+        "gamma": gamma,
+        "sigma": sigma,
+    }, dias, ajustes).to_frame()
 
 # Modelo SIS
-def modelo_sis(poblacion, infectados_iniciales, beta, gamma, dias):
+def modelo_sis(poblacion, infectados_iniciales, beta, gamma, dias, ajustes=AJUSTES_POR_DEFECTO):
     """
     Simula el modelo SIS.
 
@@ -107,32 +80,20 @@ def modelo_sis(poblacion, infectados_iniciales, beta, gamma, dias):
         beta (float): Tasa de transmisión.
         gamma (float): Tasa de recuperación.
         dias (int): Número de días para simular.
+        ajustes (AjustesSolver, optional): Integrador, tolerancias y malla de salida.
 
     Returns:
         pandas.DataFrame: DataFrame con los resultados de la simulación.
     """
-    susceptibles_iniciales = poblacion - infectados_iniciales
-    y0 = susceptibles_iniciales, infectados_iniciales
-    t = np.linspace(0, dias, dias)
-
-    def deriv(y, t, N, beta, gamma):
-        S, I = y
-        dSdt = -beta * S * I / N + gamma * I
-        dIdt = beta * S * I / N - gamma * I
-        return dSdt, dIdt
-
-    ret = odeint(deriv, y0, t, args=(poblacion, beta, gamma))
-    S, I = ret.T
-
-    df = pd.DataFrame({
-        'Día': t,
-        'Susceptibles': S,
-        'Infectados': I
-    })
-    return df
+    return simular("sis", {
+        "poblacion": poblacion,
+        "infectados_iniciales": infectados_iniciales,
+        "beta": beta,
+        "gamma": gamma,
+    }, dias, ajustes).to_frame()
 
 # Modelo SI
-def modelo_si(poblacion, infectados_iniciales, beta, dias):
+def modelo_si(poblacion, infectados_iniciales, beta, dias, ajustes=AJUSTES_POR_DEFECTO):
     """
     Simula el modelo SI.
 
@@ -141,37 +102,19 @@ def modelo_si(poblacion, infectados_iniciales, beta, dias):
         infectados_iniciales (int): Número inicial de infectados.
         beta (float): Tasa de transmisión.
         dias (int): Número de días para simular.
+        ajustes (AjustesSolver, optional): Integrador, tolerancias y malla de salida.
 
     Returns:
         pandas.DataFrame: DataFrame con los resultados de la simulación.
     """
-    susceptibles_iniciales = poblacion - infectados_iniciales
-    y0 = susceptibles_iniciales, infectados_iniciales
-    t = np.linspace(0, dias, dias)
-
-    def deriv(y, t, N, beta):
-        S, I = y
-        dSdt = -beta * S * I / N
-        dIdt = beta * S * I / N
-        return dSdt, dIdt
-
-    ret = odeint(deriv, y0, t, args=(poblacion, beta))
-    S, I = ret.T
-
-    df = pd.DataFrame({
-        'Día': t,
-        'Susceptibles': S,
-        'Infectados': I
-    })
-    df = pd.DataFrame({
-        'Día': t,
-        'Susceptibles': S,
-        'Infectados': I
-    })
-    return df
+    return simular("si", {
+        "poblacion": poblacion,
+        "infectados_iniciales": infectados_iniciales,
+        "beta": beta,
+    }, dias, ajustes).to_frame()
 
 # Modelo Ross-Macdonald (Hospedador-Vector)
-def modelo_ross_macdonald(poblacion_h, infectados_h, infectados_v_iniciales, m, a, b, c, gamma, mu, dias):
+def modelo_ross_macdonald(poblacion_h, infectados_h, infectados_v_iniciales, m, a, b, c, gamma, mu, dias, ajustes=AJUSTES_POR_DEFECTO):
     """
     Simula el modelo Ross-Macdonald (Humanos y Mosquitos).
     
@@ -186,50 +129,587 @@ def modelo_ross_macdonald(poblacion_h, infectados_h, infectados_v_iniciales, m,
         gamma (float): Tasa de recuperación en humanos.
         mu (float): Tasa de mortalidad de mosquitos.
         dias (int): Días de simulación.
+        ajustes (AjustesSolver, optional): Integrador, tolerancias y malla de salida.
+
+    Returns:
+        pandas.DataFrame: DataFrame con los resultados de la simulación.
     """
-    # Humanos
-    Sh = poblacion_h - infectados_h
-    Ih = infectados_h
-    Rh = 0
-    
-    # Mosquitos
-    # Asumimos que la población de mosquitos es constante y proporcional a los humanos: V = m * H
-    # V se divide en Susceptibles (Sv) e Infectados (Iv) (ignoramos expuestos en este modelo simple)
-    Itv = infectados_v_iniciales
-    Stv = (m * poblacion_h) - Itv
-
-    # Estado inicial: [Sh, Ih, Rh, Sv, Iv]
-    y0 = Sh, Ih, Rh, Stv, Itv
-    t = np.linspace(0, dias, dias)
-
-    def deriv(y, t, N_h, m, a, b, c, gamma, mu):
-        Sh, Ih, Rh, Sv, Iv = y
-        
-        # Dinámica Humanos
-        # dSh/dt = -a * b * (Iv/Nh) * Sh
-        dShdt = -a * b * (Iv / N_h) * Sh
-        dIhdt = a * b * (Iv / N_h) * Sh - gamma * Ih
-        dRhdt = gamma * Ih
-        
-        # Dinámica Mosquitos (V = Sv + Iv)
-        # dSv/dt = mu * V - a * c * (Ih/Nh) * Sv - mu * Sv
-        # dIv/dt = a * c * (Ih/Nh) * Sv - mu * Iv
-        # Nota: Asumimos nacimiento = muerte (mu*V) para mantener población constante
-        V = Sv + Iv
-        dSvdt = (mu * V) - a * c * (Ih / N_h) * Sv - mu * Sv
-        dIvdt = a * c * (Ih / N_h) * Sv - mu * Iv
-        
-        return dShdt, dIhdt, dRhdt, dSvdt, dIvdt
-
-    ret = odeint(deriv, y0, t, args=(poblacion_h, m, a, b, c, gamma, mu))
-    Sh, Ih, Rh, Sv, Iv = ret.T
-
-    df = pd.DataFrame({
-        'Día': t,
-        'Humanos Susceptibles': Sh,
-        'Humanos Infectados': Ih,
-        'Humanos Recuperados': Rh,
-        'Mosquitos Susceptibles': Sv,
-        'Mosquitos Infectados': Iv
-    })
-    return df
\ No newline at end of file
+    return simular("ross_macdonald", {
+        "poblacion_h": poblacion_h,
+        "infectados_h": infectados_h,
+        "infectados_v_iniciales": infectados_v_iniciales,
+        "m": m,
+        "a": a,
+        "b": b,
+        "c": c,
+        "gamma": gamma,
+        "mu": mu,
+    }, dias, ajustes).to_frame()
+
+# ---------------------------------------------------------------------------
+# Simulación por lotes
+# ---------------------------------------------------------------------------
+#
+# Cada modelo se declara una sola vez (compartimentos, parámetros y
+# transiciones) y ``especificacion.ModeloCompartimental.compilar`` genera sus
+# derivadas, su jacobiano, la tabla de transiciones estocásticas y R0. Las
+# funciones generadas reciben el estado como una secuencia de compartimentos:
+# para un escenario cada compartimento es un escalar y para un lote de n
+# escenarios es un array de forma (n,). Los parámetros pueden ser escalares o
+# arrays de forma (n,), de modo que una única llamada al integrador resuelve
+# todos los escenarios.
+
+# Soluciones cerradas: para N constante, SI y SIS son ecuaciones logísticas.
+# Con r = beta - gamma, dI/dt = r * I - beta * I^2 / N tiene por solución
+#     I(t) = I0 / (exp(-r t) + (beta * I0 / N) * (1 - exp(-r t)) / r),
+# que para r = 0 se reduce a I0 / (1 + beta * I0 * t / N). El modelo SI es el
+# caso gamma = 0: I(t) = N / (1 + (N / I0 - 1) * exp(-beta t)).
+# Reciben los mismos argumentos que las derivadas más el estado inicial y
+# devuelven los compartimentos en tiempos t (escalares o arrays de forma (n,)).
+
+def _logistica(t, N, I0, beta, gamma):
+    t = np.asarray(t, dtype=float)[np.newaxis, :]
+    N, I0, beta, gamma = (np.asarray(x, dtype=float).reshape(-1, 1) for x in (N, I0, beta, gamma))
+    r = beta - gamma
+    with np.errstate(over="ignore", invalid="ignore"):
+        expm1 = np.expm1(-r * t)
+        # (1 - exp(-r t)) / r, con su límite t cuando r = 0
+        factor = -expm1 / np.where(r == 0, 1.0, r)
+        if np.any(r == 0):
+            factor = np.where(r == 0, t, factor)
+        return I0 / (expm1 + 1.0 + beta * I0 / N * factor)
+
+def _analitica_sis(t, y0, N, beta, gamma):
+    I = _logistica(t, N, y0[1], beta, gamma)
+    return np.asarray(N, dtype=float).reshape(-1, 1) - I, I
+
+def _analitica_si(t, y0, N, beta):
+    I = _logistica(t, N, y0[1], beta, 0.0)
+    return np.asarray(N, dtype=float).reshape(-1, 1) - I, I
+
+# Las transiciones se suman en el orden en que se declaran, que reproduce el de
+# las ecuaciones originales de cada modelo. Los parámetros siguen el mismo
+# orden que los argumentos de cada ``modelo_*`` (sin ``dias``).
+
+ESPECIFICACIONES = {
+    "sir": ModeloCompartimental(
+        estados=("S", "I", "R"),
+        compartimentos=("Susceptibles", "Infectados", "Recuperados"),
+        parametros=("poblacion", "infectados_iniciales", "recuperados_iniciales", "beta", "gamma"),
+        argumentos={"N": "poblacion", "beta": "beta", "gamma": "gamma"},
+        iniciales=("poblacion - infectados_iniciales - recuperados_iniciales",
+                   "infectados_iniciales", "recuperados_iniciales"),
+        transiciones=(
+            Transicion("S", "I", "beta * S * I / N", infeccion=True),
+            Transicion("I", "R", "gamma * I"),
+        ),
+        infectados=("I",),
+        libre_de_enfermedad={"S": "N"},
+    ),
+    "seir": ModeloCompartimental(
+        estados=("S", "E", "I", "R"),
+        compartimentos=("Susceptibles", "Expuestos", "Infectados", "Recuperados"),
+        parametros=("poblacion", "infectados_iniciales", "recuperados_iniciales",
+                    "expuestos_iniciales", "beta", "gamma", "sigma"),
+        argumentos={"N": "poblacion", "beta": "beta", "gamma": "gamma", "sigma": "sigma"},
+        iniciales=("poblacion - infectados_iniciales - recuperados_iniciales - expuestos_iniciales",
+                   "expuestos_iniciales", "infectados_iniciales", "recuperados_iniciales"),
+        transiciones=(
+            Transicion("S", "E", "beta * S * I / N", infeccion=True),
+            Transicion("E", "I", "sigma * E"),
+            Transicion("I", "R", "gamma * I"),
+        ),
+        infectados=("E", "I"),
+        libre_de_enfermedad={"S": "N"},
+    ),
+    "sis": ModeloCompartimental(
+        estados=("S", "I"),
+        compartimentos=("Susceptibles", "Infectados"),
+        parametros=("poblacion", "infectados_iniciales", "beta", "gamma"),
+        argumentos={"N": "poblacion", "beta": "beta", "gamma": "gamma"},
+        iniciales=("poblacion - infectados_iniciales", "infectados_iniciales"),
+        transiciones=(
+            Transicion("S", "I", "beta * S * I / N", infeccion=True),
+            Transicion("I", "S", "gamma * I"),
+        ),
+        infectados=("I",),
+        libre_de_enfermedad={"S": "N"},
+        analitica=_analitica_sis,
+    ),
+    "si": ModeloCompartimental(
+        estados=("S", "I"),
+        compartimentos=("Susceptibles", "Infectados"),
+        parametros=("poblacion", "infectados_iniciales", "beta"),
+        argumentos={"N": "poblacion", "beta": "beta"},
+        iniciales=("poblacion - infectados_iniciales", "infectados_iniciales"),
+        transiciones=(
+            Transicion("S", "I", "beta * S * I / N", infeccion=True),
+        ),
+        infectados=("I",),
+        libre_de_enfermedad={"S": "N"},
+        analitica=_analitica_si,
+    ),
+    "ross_macdonald": ModeloCompartimental(
+        estados=("Sh", "Ih", "Rh", "Sv", "Iv"),
+        compartimentos=("Humanos Susceptibles", "Humanos Infectados", "Humanos Recuperados",
+                        "Mosquitos Susceptibles", "Mosquitos Infectados"),
+        parametros=("poblacion_h", "infectados_h", "infectados_v_iniciales",
+                    "m", "a", "b", "c", "gamma", "mu"),
+        argumentos={"N_h": "poblacion_h", "m": "m", "a": "a", "b": "b", "c": "c", "gamma": "gamma", "mu": "mu"},
+        # Asumimos que la población de mosquitos es constante y proporcional a los
+        # humanos (V = m * H) y se divide en Susceptibles (Sv) e Infectados (Iv)
+        iniciales=("poblacion_h - infectados_h", "infectados_h", "0",
+                   "m * poblacion_h - infectados_v_iniciales", "infectados_v_iniciales"),
+        transiciones=(
+            # dSh/dt = -a * b * (Iv/Nh) * Sh
+            Transicion("Sh", "Ih", "a * b * (Iv / N_h) * Sh", infeccion=True),
+            Transicion("Ih", "Rh", "gamma * Ih"),
+            # dIv/dt = a * c * (Ih/Nh) * Sv - mu * Iv
+            Transicion("Sv", "Iv", "a * c * (Ih / N_h) * Sv", infeccion=True),
+            # Nacimiento = muerte (mu*V) para mantener la población constante: cada
+            # mosquito infectado que muere se sustituye por uno susceptible
+            Transicion("Iv", "Sv", "mu * Iv"),
+        ),
+        infectados=("Ih", "Iv"),
+        libre_de_enfermedad={"Sh": "N_h", "Sv": "m * N_h"},
+        # El tamaño del brote cuenta los contagios humanos, no los de mosquitos
+        brote=("Ih",),
+    ),
+}
+
+MODELOS = {nombre: especificacion.compilar() for nombre, especificacion in ESPECIFICACIONES.items()}
+
+def _nombre_modelo(modelo):
+    """
+    Devuelve la clave de ``MODELOS`` a partir del nombre de un modelo o de su función.
+
+    Acepta tanto ``"sir"`` o ``"Ross-Macdonald"`` como las propias funciones
+    ``modelo_sir`` o ``modelo_ross_macdonald``.
+    """
+    nombre = modelo if isinstance(modelo, str) else getattr(modelo, "__name__", "")
+    nombre = nombre.lower().replace("-", "_").replace(" ", "_")
+    if nombre.startswith("modelo_"):
+        nombre = nombre[len("modelo_"):]
+    if nombre not in MODELOS:
+        raise ValueError(f"Modelo desconocido: {modelo!r}. Opciones: {', '.join(MODELOS)}")
+    return nombre
+
+def _obtener_modelo(modelo):
+    """
+    Devuelve la definición de un modelo a partir de su nombre o de su función.
+    """
+    return MODELOS[_nombre_modelo(modelo)]
+
+def _preparar_lote(definicion, parametros):
+    """
+    Normaliza los parámetros de un lote a un diccionario de arrays de forma (n,).
+
+    ``parametros`` puede ser un array de forma (n, P) con las columnas en el orden
+    de ``definicion.parametros`` o un diccionario nombre -> escalar/array; los
+    escalares se difunden a todos los escenarios.
+    """
+    if isinstance(parametros, dict):
+        faltan = [nombre for nombre in definicion.parametros if nombre not in parametros]
+        if faltan:
+            raise ValueError(f"Faltan parámetros: {', '.join(faltan)}")
+        columnas = [np.asarray(parametros[nombre], dtype=float) for nombre in definicion.parametros]
+    else:
+        matriz = np.atleast_2d(np.asarray(parametros, dtype=float))
+        if matriz.shape[1] != len(definicion.parametros):
+            raise ValueError(
+                f"Se esperaban {len(definicion.parametros)} columnas "
+                f"({', '.join(definicion.parametros)}), se recibieron {matriz.shape[1]}"
+            )
+        columnas = list(matriz.T)
+    columnas = np.broadcast_arrays(*[np.atleast_1d(col) for col in columnas])
+    return dict(zip(definicion.parametros, columnas))
+
+def simular_lote(modelo, parametros, dias, ajustes=AJUSTES_POR_DEFECTO):
+    """
+    Simula N conjuntos de parámetros de un mismo modelo con una sola integración.
+
+    Todos los escenarios se apilan en un estado de forma (N, compartimentos) y las
+    derivadas se evalúan con difusión de NumPy, de modo que el integrador se llama
+    una única vez. Como cada escenario solo depende de sí mismo, el jacobiano es
+    diagonal por bloques y se declara como banda al integrador.
+
+    Args:
+        modelo (str | callable): Nombre del modelo ("sir", "seir", "sis", "si",
+            "ross_macdonald") o la función ``modelo_*`` correspondiente.
+        parametros (dict | array): Diccionario nombre -> escalar o array de forma (N,),
+            o array de forma (N, P) con las columnas en el orden de los argumentos
+            de la función ``modelo_*`` (sin ``dias``).
+        dias (int): Número de días para simular.
+        ajustes (AjustesSolver, optional): Integrador, tolerancias y malla de salida.
+
+    Returns:
+        numpy.ndarray: Array de forma (escenario, tiempo, compartimento). Los tiempos
+        son ``malla_tiempos(ajustes, dias)`` (por defecto, los mismos que la columna
+        'Día' de la función escalar) y los compartimentos siguen el orden de
+        ``MODELOS[nombre].compartimentos``.
+    """
+    if ajustes.malla == "eventos":
+        raise ValueError("La malla 'eventos' solo está disponible para un escenario (simular)")
+    definicion = _obtener_modelo(modelo)
+    t = malla_tiempos(ajustes, dias)
+    return _integrar(definicion, _preparar_lote(definicion, parametros), t, ajustes)[1]
+
+def numero_reproductivo(modelo, parametros):
+    """
+    Calcula el número reproductivo básico R0 de uno o varios escenarios.
+
+    Es el radio espectral de la matriz de nueva generación en el equilibrio
+    libre de enfermedad. En Ross-Macdonald equivale a la raíz cuadrada del R0
+    clásico ``m·a²·b·c / (gamma·mu)``, porque cuenta una generación por
+    transmisión (humano -> mosquito o mosquito -> humano). Sin recuperación
+    (SI) es infinito.
+
+    Args:
+        modelo (str | callable): Modelo (como en ``simular_lote``).
+        parametros (dict | array): Parámetros de los escenarios (como en ``simular_lote``).
+
+    Returns:
+        numpy.ndarray: R0 de cada escenario.
+    """
+    definicion = _obtener_modelo(modelo)
+    return definicion.r0(*definicion.argumentos(_preparar_lote(definicion, parametros)))
+
+def _rigidez(definicion, y0, args, t):
+    """
+    Índice de rigidez de un lote (``solucionadores.indice_rigidez``) con los
+    autovalores del jacobiano analítico de cada escenario en el estado ``y0``.
+    """
+    n, k = y0.shape
+    J = np.empty((n, k, k))
+    for i, fila in enumerate(definicion.jac(tuple(y0.T), t[0], *args)):
+        for j, valor in enumerate(fila):
+            J[:, i, j] = valor
+    return indice_rigidez(J, t[-1] - t[0])
+
+def _integrar(definicion, p, t, ajustes=AJUSTES_POR_DEFECTO, eventos=None, y0=None, paso_inicial=None):
+    """
+    Integra un lote ya preparado con ``_preparar_lote`` en los tiempos ``t``.
+
+    Con ``y0`` (forma (escenario, compartimento)) se parte de ese estado en
+    ``t[0]`` en lugar de las condiciones iniciales, para continuar una
+    simulación; ``paso_inicial`` es el primer paso del integrador. Con el
+    método "auto" la rigidez se estima con el jacobiano analítico del modelo.
+
+    Returns:
+        tuple: Tiempos de salida, array de forma (escenario, tiempo, compartimento)
+        y diccionario con las estadísticas del integrador.
+    """
+    if y0 is None:
+        y0 = np.column_stack(definicion.condiciones_iniciales(p))
+    y0 = np.asarray(y0, dtype=float)
+    n, k = y0.shape
+    args = definicion.argumentos(p)
+
+    if definicion.analitica is not None and ajustes.analitica and not eventos:
+        # Solución cerrada: evaluación vectorizada en t, sin integrador (los
+        # modelos son autónomos, así que basta con medir el tiempo desde t[0])
+        t = np.asarray(t, dtype=float)
+        compartimentos = definicion.analitica(t - t[0], y0.T, *args)
+        return t, np.stack(compartimentos, axis=-1), {"metodo": "analitica", "nfe": 0, "nje": 0}
+
+    rigidez = _rigidez(definicion, y0, args, t) if ajustes.metodo == "auto" else None
+
+    if n == 1:
+        # Un solo escenario: parámetros escalares, sin el coste de apilar arrays
+        # (para una sola llamada la función de Python es más rápida que un núcleo)
+        jac = definicion.jac
+        t, ret, info = integrar(
+            definicion.deriv, y0[0], t, ajustes,
+            Dfun=lambda y, t, *args: np.array(jac(y, t, *args)),
+            args=tuple(float(arg[0]) for arg in args), eventos=eventos, paso_inicial=paso_inicial,
+            rigidez=rigidez,
+        )
+        return t, ret[np.newaxis], info
+
+    # El estado se aplana escenario a escenario, así que el jacobiano es
+    # diagonal por bloques de tamaño k: una banda de anchura k - 1
+    func, Dfun, args_func = nucleos.preparar(definicion.deriv, definicion.jac, args, n, k)
+    t, ret, info = integrar(func, y0.ravel(), t, ajustes, Dfun=Dfun, args=args_func,
+                            bandas=(k - 1, k - 1), eventos=eventos, paso_inicial=paso_inicial, rigidez=rigidez)
+    return t, np.ascontiguousarray(ret.reshape(len(t), n, k).transpose(1, 0, 2)), info
+
+
+# ---------------------------------------------------------------------------
+# Caché de simulaciones individuales
+# ---------------------------------------------------------------------------
+
+# Caché compartida por todas las funciones ``modelo_*``. Si la variable de
+# entorno SIMULACION_CACHE_DIR está definida, los resultados también se guardan
+# en disco y sobreviven a los reinicios de la aplicación.
+CACHE = CacheSimulaciones(
+    capacidad=int(os.environ.get("SIMULACION_CACHE_CAPACIDAD", 256)),
+    directorio=os.environ.get("SIMULACION_CACHE_DIR"),
+)
+
+# Horizontes (días) ya calculados de cada simulación, para continuar o recortar
+# una de ellas en lugar de integrar desde el día 0. Clave: la de la caché sin
+# los días. Es solo un índice: los resultados siguen estando en ``CACHE``.
+_HORIZONTES = OrderedDict()
+_HORIZONTES_MAXIMO = 4096
+_horizontes_lock = threading.Lock()
+
+def _recordar_horizonte(prefijo, dias):
+    with _horizontes_lock:
+        _HORIZONTES.setdefault(prefijo, set()).add(dias)
+        _HORIZONTES.move_to_end(prefijo)
+        while len(_HORIZONTES) > _HORIZONTES_MAXIMO:
+            _HORIZONTES.popitem(last=False)
+
+def _olvidar_horizonte(prefijo, dias):
+    with _horizontes_lock:
+        _HORIZONTES.get(prefijo, set()).discard(dias)
+
+def _horizontes_candidatos(prefijo, dias):
+    """
+    Horizontes ya calculados de la misma simulación, en orden de preferencia:
+    primero el más corto de los que alcanzan ``dias`` (basta con recortarlo) y
+    luego los más largos de los que se quedan cortos (se continúan).
+    """
+    with _horizontes_lock:
+        horizontes = set(_HORIZONTES.get(prefijo, ()))
+    mayores = sorted(h for h in horizontes if h > dias)
+    menores = sorted((h for h in horizontes if h < dias), reverse=True)
+    return mayores[:1] + menores
+
+def _reutilizar(definicion, p, previo, t, ajustes):
+    """
+    Construye el resultado en los tiempos ``t`` a partir de otro horizonte.
+
+    Los tiempos de ``t`` hasta el último de ``previo`` tienen que estar entre
+    los suyos (mallas "diaria", "dispersa" y "final"; no "linspace", cuyos
+    puntos dependen del horizonte). Los posteriores se integran partiendo del
+    estado final de ``previo`` y de su último paso.
+
+    Returns:
+        dict | None: La entrada de caché, o None si las mallas no encajan.
+    """
+    t_previo, estados_previo = previo["t"], previo["estados"]
+    comunes = t[t <= t_previo[-1]]
+    indices = np.minimum(np.searchsorted(t_previo, comunes), len(t_previo) - 1)
+    if not np.array_equal(t_previo[indices], comunes):
+        return None
+    nuevos = t[t > t_previo[-1]]
+    if not len(nuevos):
+        return {"t": comunes, "estados": estados_previo[indices], "paso": np.nan}
+    estados, paso = _tramo(definicion, p, estados_previo[-1], t_previo[-1], nuevos, ajustes, previo.get("paso"))
+    return {"t": t, "estados": np.concatenate((estados_previo[indices], estados)), "paso": paso}
+
+def _tramo(definicion, p, y, t0, tiempos, ajustes, paso=None):
+    """
+    Integra un escenario desde el estado ``y`` en ``t0`` hasta los ``tiempos``
+    (posteriores a ``t0``).
+
+    Returns:
+        tuple: Estados de forma (len(tiempos), compartimentos) y último paso.
+    """
+    paso = float(paso) if paso is not None and np.isfinite(paso) else None
+    _, estados, info = _integrar(definicion, p, np.concatenate(([t0], tiempos)), ajustes,
+                                 y0=np.asarray(y)[np.newaxis], paso_inicial=paso)
+    return estados[0, 1:], info.get("paso_final", np.nan)
+
+def _entrada_continuable(nombre, identidad, p, dias, ajustes, calcular):
+    """
+    Devuelve la entrada de caché de una simulación a ``dias`` días.
+
+    Si no está, la obtiene de otro horizonte de la misma simulación (recortándolo
+    o continuándolo, ver ``_reutilizar``) y solo si no hay ninguno útil la
+    calcula con ``calcular(t)``.
+
+    Args:
+        nombre (str): Modelo.
+        identidad (dict): Lo que identifica la simulación salvo los días (los
+            parámetros, o la descripción de una bifurcación).
+        p (dict): Parámetros preparados con los que continuar la integración.
+        dias (int): Número de días.
+        ajustes (AjustesSolver): Integrador, tolerancias y malla de salida.
+        calcular (callable): ``calcular(t)`` devuelve la entrada completa.
+
+    Returns:
+        dict: Arrays "t", "estados" (tiempo, compartimento) y "paso" (último
+        paso del integrador, NaN si no se conoce).
+    """
+    opciones = ajustes.como_dict()
+    prefijo = clave_canonica(nombre, identidad, None, opciones)
+    definicion = MODELOS[nombre]
+
+    def calcular_entrada():
+        t = malla_tiempos(ajustes, dias)
+        for otro in _horizontes_candidatos(prefijo, dias):
+            previo = CACHE.obtener(clave_canonica(nombre, identidad, otro, opciones))
+            if previo is None:
+                _olvidar_horizonte(prefijo, otro)
+                continue
+            entrada = _reutilizar(definicion, p, previo, t, ajustes)
+            if entrada is not None:
+                return entrada
+        return calcular(t)
+
+    arrays = CACHE.obtener_o_calcular(clave_canonica(nombre, identidad, dias, opciones), calcular_entrada)
+    _recordar_horizonte(prefijo, dias)
+    return arrays
+
+def _resolver_entrada(nombre, parametros, dias, ajustes=AJUSTES_POR_DEFECTO):
+    """
+    Integra un único escenario, pasando antes por la caché.
+
+    Si el mismo escenario ya se ha calculado con otro horizonte y la malla lo
+    permite, solo se integran los días nuevos.
+    """
+    definicion = MODELOS[nombre]
+    p = _preparar_lote(definicion, parametros)
+
+    def calcular(t):
+        t, estados, info = _integrar(definicion, p, t, ajustes)
+        return {"t": t, "estados": estados[0], "paso": info.get("paso_final", np.nan)}
+
+    return _entrada_continuable(nombre, parametros, p, dias, ajustes, calcular)
+
+def _resolver(nombre, parametros, dias, ajustes=AJUSTES_POR_DEFECTO):
+    """
+    Integra un único escenario, pasando antes por la caché.
+
+    Returns:
+        tuple: Tiempos de shape (T,) y estados de shape (T, compartimentos),
+        ambos de solo lectura.
+    """
+    arrays = _resolver_entrada(nombre, parametros, dias, ajustes)
+    return arrays["t"], arrays["estados"]
+
+def estadisticas_cache():
+    """
+    Devuelve los contadores de aciertos y fallos de la caché de simulaciones.
+    """
+    return CACHE.estadisticas()
+
+
+# ---------------------------------------------------------------------------
+# Resultados
+# ---------------------------------------------------------------------------
+
+class Resultado:
+    """
+    Resultado ligero de una simulación, sin pasar por pandas.
+
+    Attributes:
+        t (numpy.ndarray): Vector de tiempos de forma (días,).
+        compartimentos (tuple): Nombres de los compartimentos, en orden.
+        datos (numpy.ndarray): Array contiguo float64 de forma (días, compartimentos).
+    """
+
+    __slots__ = ("t", "compartimentos", "datos")
+
+    def __init__(self, t, compartimentos, datos):
+        self.t = t
+        self.compartimentos = tuple(compartimentos)
+        self.datos = datos
+
+    def __getitem__(self, compartimento):
+        """
+        Devuelve la serie de un compartimento como vista de ``datos`` (sin copia).
+        """
+        try:
+            indice = self.compartimentos.index(compartimento)
+        except ValueError:
+            raise KeyError(compartimento) from None
+        return self.datos[:, indice]
+
+    def __len__(self):
+        return len(self.t)
+
+    def __repr__(self):
+        return f"Resultado(dias={len(self.t)}, compartimentos={self.compartimentos})"
+
+    def to_frame(self):
+        """
+        Construye el DataFrame con la columna 'Día' y una columna por compartimento.
+
+        Returns:
+            pandas.DataFrame: DataFrame con los resultados de la simulación.
+        """
+        # pandas solo se importa aquí, para que la capa de modelos arranque rápido
+        import pandas as pd
+
+        return pd.DataFrame(
+            np.column_stack((self.t, self.datos)),
+            columns=("Día",) + self.compartimentos,
+        )
+
+def simular(modelo, parametros, dias, ajustes=AJUSTES_POR_DEFECTO, eventos=None):
+    """
+    Simula un escenario de cualquier modelo y devuelve un ``Resultado``.
+
+    Es el núcleo de las funciones ``modelo_*``: usa la caché de simulaciones y
+    no construye ningún DataFrame hasta que se llama a ``Resultado.to_frame()``.
+
+    Args:
+        modelo (str | callable): Nombre del modelo o la función ``modelo_*``.
+        parametros (dict): Argumentos de la función ``modelo_*`` (sin ``dias``).
+        dias (int): Número de días para simular.
+        ajustes (AjustesSolver, optional): Integrador, tolerancias y malla de salida.
+        eventos (list, optional): Funciones ``evento(t, y)`` de ``solve_ivp``. Con
+            la malla "eventos" el resultado contiene solo los instantes en que se
+            disparan. Las simulaciones con eventos no pasan por la caché.
+
+    Returns:
+        Resultado: Tiempos, nombres de compartimentos y estados de la simulación.
+    """
+    nombre = _nombre_modelo(modelo)
+    definicion = MODELOS[nombre]
+    if eventos:
+        t, estados, _ = _integrar(definicion, _preparar_lote(definicion, parametros),
+                                  malla_tiempos(ajustes, dias), ajustes, eventos)
+        return Resultado(t, definicion.compartimentos, estados[0])
+    t, estados = _resolver(nombre, parametros, dias, ajustes)
+    return Resultado(t, definicion.compartimentos, estados)
+
+def bifurcar(modelo, parametros, dia, cambios, dias, ajustes=AJUSTES_POR_DEFECTO):
+    """
+    Simula "qué pasaría si" los parámetros cambiaran a partir de un día.
+
+    Hasta ``dia`` la simulación es la de ``parametros`` y desde ese día sigue,
+    desde el mismo estado, con ``parametros`` actualizados con ``cambios``
+    (por ejemplo, otra ``beta`` o, en Ross-Macdonald, la ``a`` y la ``m`` de
+    otro clima). El tramo común sale de la caché, de modo que explorar varias
+    alternativas solo integra los días posteriores a ``dia``; alargar después
+    el horizonte de una alternativa tampoco repite sus días ya calculados.
+
+    Args:
+        modelo (str | callable): Nombre del modelo o la función ``modelo_*``.
+        parametros (dict): Argumentos de la función ``modelo_*`` (sin ``dias``).
+        dia (int): Día desde el que se aplican los cambios (0 < dia < dias).
+        cambios (dict): Parámetros que cambian y sus nuevos valores. Los que
+            solo fijan las condiciones iniciales no tienen efecto.
+        dias (int): Número total de días para simular.
+        ajustes (AjustesSolver, optional): Integrador, tolerancias y malla de
+            salida. Con la malla "linspace" el tramo común conserva la suya.
+
+    Returns:
+        Resultado: Tiempos, nombres de compartimentos y estados de la simulación.
+    """
+    nombre = _nombre_modelo(modelo)
+    definicion = MODELOS[nombre]
+    if ajustes.malla == "eventos":
+        raise ValueError("La malla 'eventos' no admite bifurcaciones")
+    if not 0 < dia < dias:
+        raise ValueError(f"El día de la bifurcación debe estar entre 0 y {dias} (sin incluirlos)")
+    desconocidos = [nombre_parametro for nombre_parametro in cambios if nombre_parametro not in definicion.parametros]
+    if desconocidos:
+        raise ValueError(f"Parámetros desconocidos: {', '.join(desconocidos)}")
+
+    p = _preparar_lote(definicion, {**parametros, **cambios})
+
+    def calcular(t):
+        base = _resolver_entrada(nombre, parametros, dia, ajustes)
+        nuevos = t[t > dia]
+        estados, paso = _tramo(definicion, p, base["estados"][-1], float(dia), nuevos, ajustes, base.get("paso"))
+        return {"t": np.concatenate((base["t"], nuevos)), "estados": np.concatenate((base["estados"], estados)),
+                "paso": paso}
+
+    identidad = {"base": parametros, "dia": dia, "cambios": cambios}
+    arrays = _entrada_continuable(nombre, identidad, p, dias, ajustes, calcular)
+    return Resultado(arrays["t"], definicion.compartimentos, arrays["estados"])
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de núcleos compilados para las derivadas y jacobianos de los modelos.
+
+Las derivadas y jacobianos de cada modelo (generados en especificacion.py) son
+funciones que valen tanto para escalares como para arrays. Si
+Numba está instalado, aquí se compilan a núcleos que recorren el lote de
+escenarios sin crear arrays intermedios; si no, se evalúan con NumPy.
+"""
+
+import importlib.util
+import math
+import os
+
+import numpy as np
+
+# Numba es opcional y tarda en importarse, así que solo se importa la primera
+# vez que hace falta compilar un núcleo
+NUMBA_DISPONIBLE = importlib.util.find_spec("numba") is not None
+
+# Permite desactivar Numba (por ejemplo, para comparar en los benchmarks)
+USAR_NUMBA = NUMBA_DISPONIBLE and not os.environ.get("SIMULACION_SIN_NUMBA")
+
+# Por debajo de este número de escenarios la compilación (del orden de un
+# segundo por modelo y proceso) no compensa y se usa NumPy
+MIN_ESCENARIOS_NUMBA = 64
+
+# El estado aplanado de un lote es [escenario 0 | escenario 1 | ...], cada
+# bloque con k compartimentos. El jacobiano es diagonal por bloques y odeint lo
+# recibe en formato banda: banda[fila - col + k - 1, col] = df_fila / dy_col.
+
+_PLANTILLA_DERIV = """
+def nucleo(y, t, p):
+    dy = np.empty_like(y)
+    for i in range(p.shape[0]):
+        b = i * {k}
+        d = funcion(({estado},), t, {argumentos})
+{asignaciones}
+    return dy
+"""
+
+_PLANTILLA_JAC = """
+def nucleo(y, t, p):
+    banda = np.zeros(({bandas}, y.shape[0]))
+    for i in range(p.shape[0]):
+        b = i * {k}
+        J = funcion(({estado},), t, {argumentos})
+{asignaciones}
+    return banda
+"""
+
+_compilados = {}
+_numba = None
+
+
+def _importar_numba():
+    global _numba
+    if _numba is None:
+        import numba
+        _numba = numba
+    return _numba
+
+
+def _generar(plantilla, funcion, k, nargs, asignaciones, firma):
+    """
+    Genera y compila con Numba el núcleo de ``funcion`` para k compartimentos.
+
+    Numba no admite desempaquetar un número variable de argumentos, así que el
+    bucle se escribe a partir de una plantilla con los índices ya resueltos.
+    """
+    codigo = plantilla.format(
+        k=k,
+        bandas=2 * k - 1,
+        estado=", ".join(f"y[b + {j}]" for j in range(k)),
+        argumentos=", ".join(f"p[i, {j}]" for j in range(nargs)),
+        asignaciones="\n".join(" " * 8 + linea for linea in asignaciones),
+    )
+    numba = _importar_numba()
+    espacio = {"np": np, "funcion": numba.njit(funcion)}
+    exec(codigo, espacio)
+    # Compilación inmediata con la firma que usa odeint, para que no ocurra a
+    # mitad de una integración (el jacobiano solo se pide en la fase rígida)
+    return numba.njit(firma)(espacio["nucleo"])
+
+
+def _compilar(deriv, jac, k, nargs):
+    """
+    Devuelve (y guarda) los núcleos compilados de derivadas y jacobiano.
+    """
+    clave = (deriv, jac)
+    if clave not in _compilados:
+        nucleo_deriv = _generar(
+            _PLANTILLA_DERIV, deriv, k, nargs,
+            [f"dy[b + {j}] = d[{j}]" for j in range(k)],
+            "float64[::1](float64[::1], float64, float64[:, ::1])",
+        )
+        nucleo_jac = _generar(
+            _PLANTILLA_JAC, jac, k, nargs,
+            [f"banda[{f - c + k - 1}, b + {c}] = J[{f}][{c}]" for f in range(k) for c in range(k)],
+            "float64[:, ::1](float64[::1], float64, float64[:, ::1])",
+        )
+        _compilados[clave] = (nucleo_deriv, nucleo_jac)
+    return _compilados[clave]
+
+
+def es_nucleo(funcion):
+    """
+    Indica si ``funcion`` es un núcleo compilado por este módulo.
+    """
+    return any(funcion is nucleo for par in _compilados.values() for nucleo in par)
+
+
+def _paso_fijo(func, y0, t_eval, paso, rk4, p):
+    Y = np.empty((t_eval.shape[0], y0.shape[0]))
+    y = y0.copy()
+    Y[0] = y
+    pasos = 0
+    for i in range(1, t_eval.shape[0]):
+        t = t_eval[i - 1]
+        subpasos = max(1, int(math.ceil((t_eval[i] - t) / paso - 1e-9)))
+        h = (t_eval[i] - t) / subpasos
+        for _ in range(subpasos):
+            k1 = func(y, t, p)
+            if rk4:
+                k2 = func(y + 0.5 * h * k1, t + 0.5 * h, p)
+                k3 = func(y + 0.5 * h * k2, t + 0.5 * h, p)
+                k4 = func(y + h * k3, t + h, p)
+                y = y + h / 6.0 * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+            else:
+                y = y + h * k1
+            t += h
+        pasos += subpasos
+        Y[i] = y
+    return Y, pasos
+
+
+_paso_fijo_compilado = None
+
+
+def integrar_paso_fijo(func, y0, t_eval, paso, rk4, p):
+    """
+    Integra con RK4 (o Euler) un núcleo compilado sin volver a Python en cada paso.
+
+    Returns:
+        tuple: Estados de forma (len(t_eval), len(y0)) y número de pasos.
+    """
+    global _paso_fijo_compilado
+    if _paso_fijo_compilado is None:
+        _paso_fijo_compilado = _importar_numba().njit(_paso_fijo)
+    return _paso_fijo_compilado(func, y0, t_eval, float(paso), bool(rk4), p)
+
+
+def _banda_numpy(bloques, n, k):
+    """
+    Empaqueta en formato banda los bloques k x k (escalares o arrays de forma (n,)).
+    """
+    banda = np.zeros((2 * k - 1, n * k))
+    for f in range(k):
+        for c in range(k):
+            banda[f - c + k - 1, c::k] = bloques[f][c]
+    return banda
+
+
+def preparar(deriv, jac, args, n, k):
+    """
+    Prepara las funciones de derivadas y jacobiano para ``odeint`` sobre un lote.
+
+    Args:
+        deriv (callable): Derivadas del modelo (``DefinicionModelo.deriv``).
+        jac (callable): Jacobiano del modelo (``DefinicionModelo.jac``).
+        args (tuple): Parámetros de ``deriv``, cada uno de forma (n,).
+        n (int): Número de escenarios.
+        k (int): Número de compartimentos.
+
+    Returns:
+        tuple: ``(func, Dfun, args)`` para pasar a ``odeint`` con ``ml = mu = k - 1``.
+    """
+    if USAR_NUMBA and n >= MIN_ESCENARIOS_NUMBA:
+        nucleo_deriv, nucleo_jac = _compilar(deriv, jac, k, len(args))
+        p = np.ascontiguousarray(np.column_stack(args), dtype=float)
+        return nucleo_deriv, nucleo_jac, (p,)
+
+    def func(y, t):
+        return np.column_stack(deriv(y.reshape(n, k).T, t, *args)).ravel()
+
+    def Dfun(y, t):
+        return _banda_numpy(jac(y.reshape(n, k).T, t, *args), n, k)
+
+    return func, Dfun, ()
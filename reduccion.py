@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de reducción de series largas antes de dibujarlas.
+
+Con horizontes de decenas de miles de días, o muchos escenarios, enviar cada
+punto al navegador domina el tiempo de respuesta y no se ve ninguna
+diferencia: la pantalla tiene unos pocos miles de píxeles de ancho. Aquí se
+eligen los puntos que conservan la forma de la curva:
+
+- ``lttb``: *Largest-Triangle-Three-Buckets*. Divide la serie en cubetas y de
+  cada una se queda con el punto que forma el triángulo de mayor área con el
+  punto elegido en la anterior y la media de la siguiente. Conserva picos y
+  cambios de pendiente.
+- ``minmax``: el mínimo y el máximo de cada cubeta. Totalmente vectorizado y
+  sin perder ningún extremo, a cambio de dos puntos por cubeta.
+
+Los índices devueltos siempre incluyen el primer y el último punto.
+"""
+
+import numpy as np
+
+METODOS_REDUCCION = ("lttb", "minmax")
+
+
+def lttb(x, y, puntos):
+    """
+    Índices de los ``puntos`` puntos de (x, y) elegidos por LTTB.
+
+    Args:
+        x (array): Abscisas crecientes, de longitud n.
+        y (array): Ordenadas, de forma (n,) o (n, m) con m series que
+            comparten las abscisas (se reducen a la vez, cada una por su lado).
+        puntos (int): Número de puntos a conservar (al menos 3).
+
+    Returns:
+        numpy.ndarray: Índices crecientes de forma (puntos,) o (puntos, m).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if puntos >= n or puntos < 3:
+        indices = np.arange(n)
+        return indices if y.ndim == 1 else np.repeat(indices[:, None], y.shape[1], axis=1)
+
+    series = y.reshape(n, -1)
+    columnas = np.arange(series.shape[1])
+    # Cubetas para los puntos interiores; la última "siguiente" es el punto final
+    bordes = np.append(np.linspace(1, n - 1, puntos - 1).astype(np.intp), n)
+    indices = np.empty((puntos, series.shape[1]), dtype=np.intp)
+    indices[0], indices[-1] = 0, n - 1
+    elegido = np.zeros(series.shape[1], dtype=np.intp)
+    for i in range(puntos - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        siguiente = slice(bordes[i + 1], bordes[i + 2])
+        xc, yc = x[siguiente].mean(), series[siguiente].mean(axis=0)
+        xa, ya = x[elegido], series[elegido, columnas]
+        xb, yb = x[inicio:fin, None], series[inicio:fin]
+        areas = np.abs((xa - xc) * (yb - ya) - (xa - xb) * (yc - ya))
+        elegido = inicio + areas.argmax(axis=0)
+        indices[i + 1] = elegido
+    return indices if y.ndim > 1 else indices[:, 0]
+
+
+def minmax(y, cubetas):
+    """
+    Índices del mínimo y del máximo de cada una de ``cubetas`` cubetas de ``y``.
+
+    Args:
+        y (array): Ordenadas, de forma (n,) o (n, m) con m series.
+        cubetas (int): Número de cubetas.
+
+    Returns:
+        numpy.ndarray: Índices crecientes de forma (2·cubetas + 2,) o
+        (2·cubetas + 2, m); puede haber repetidos.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if 2 * cubetas + 2 >= n:
+        indices = np.arange(n)
+        return indices if y.ndim == 1 else np.repeat(indices[:, None], y.shape[1], axis=1)
+
+    series = y.reshape(n, -1)
+    tam = -(-n // cubetas)
+    relleno = np.pad(series, ((0, tam * cubetas - n), (0, 0)), mode="edge").reshape(cubetas, tam, -1)
+    desplazamientos = (np.arange(cubetas) * tam)[:, None]
+    extremos = np.full((1, series.shape[1]), n - 1)
+    indices = np.concatenate((
+        np.zeros_like(extremos),
+        desplazamientos + relleno.argmin(axis=1),
+        desplazamientos + relleno.argmax(axis=1),
+        extremos,
+    ))
+    indices = np.sort(np.minimum(indices, n - 1), axis=0)
+    return indices if y.ndim > 1 else indices[:, 0]
+
+
+def reducir(x, y, puntos, metodo="lttb"):
+    """
+    Índices de unos ``puntos`` puntos representativos de cada serie de (x, y).
+    """
+    if metodo == "lttb":
+        return lttb(x, y, puntos)
+    if metodo == "minmax":
+        return minmax(y, max(1, puntos // 2))
+    raise ValueError(f"Método de reducción desconocido: {metodo!r}. Opciones: {', '.join(METODOS_REDUCCION)}")
+
+
+def reducir_frame(df, columnas, puntos=2000, metodo="lttb", eje="Día", grupo=None):
+    """
+    Reduce un DataFrame a unos ``puntos`` puntos por serie para dibujarlo.
+
+    Args:
+        df (pandas.DataFrame): Datos en formato ancho (una columna por serie)
+            o largo (una columna ``grupo`` que separa las series).
+        columnas (str | list): Columnas que se van a dibujar. Se conserva la
+            unión de los puntos elegidos para cada una.
+        puntos (int): Puntos por serie.
+        metodo (str): "lttb" o "minmax".
+        eje (str): Columna de abscisas.
+        grupo (str, optional): Columna que separa las series en formato largo.
+
+    Returns:
+        pandas.DataFrame: Las filas elegidas de ``df``, en el mismo orden.
+    """
+    columnas = [columnas] if isinstance(columnas, str) else list(columnas)
+    if grupo is None:
+        partes = [np.arange(len(df))]
+    else:
+        partes = list(df.groupby(grupo, observed=True, sort=False).indices.values())
+    if all(len(filas) <= puntos for filas in partes):
+        return df
+
+    x_total = df[eje].to_numpy()
+    valores = df[columnas].to_numpy(dtype=float)
+    seleccion = []
+    # Las series con las mismas abscisas (los escenarios de una comparativa)
+    # se reducen juntas: un solo recorrido de las cubetas para todas
+    x = x_total[partes[0]]
+    if all(len(filas) == len(x) and np.array_equal(x_total[filas], x) for filas in partes):
+        bloque = np.concatenate([valores[filas] for filas in partes], axis=1)
+        elegidos = reducir(x, bloque, puntos, metodo).reshape(-1, len(partes), len(columnas))
+        for j, filas in enumerate(partes):
+            seleccion.append(filas[np.unique(elegidos[:, j])])
+    else:
+        for filas in partes:
+            elegidos = reducir(x_total[filas], valores[filas], puntos, metodo)
+            seleccion.append(filas[np.unique(elegidos)])
+    return df.iloc[np.sort(np.concatenate(seleccion))]
@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de análisis de sensibilidad global (Sobol y Morris).
+
+Responde a preguntas como "¿qué parámetros (b, c, gamma, temperatura,
+humedad...) determinan el pico de Humanos Infectados?" sobre rangos
+declarados de cada parámetro:
+
+- ``analisis_sobol``: índices de Sobol de primer orden y totales con el
+  esquema de Saltelli (matrices A, B y A con la columna i de B) y los
+  estimadores de Saltelli (2010) y Jansen, con intervalos de confianza por
+  bootstrap. Las matrices A y B salen de una secuencia de Sobol aleatorizada
+  o de un hipercubo latino (``scipy.stats.qmc``). Cuesta N · (d + 2)
+  evaluaciones.
+- ``analisis_morris``: efectos elementales de Morris (mu, mu* y sigma) con
+  r trayectorias, para cribar muchos parámetros con r · (d + 1) evaluaciones.
+
+Cada evaluación es una llamada por lotes a ``metricas.metricas``, que solo
+devuelve escalares por escenario (pico, día del pico, tasa de ataque...), sin
+trayectorias. El diseño se procesa por bloques de ``tam_bloque`` filas, que
+se generan al vuelo, así que la memoria es la de las salidas escalares. Los
+bloques se reparten entre procesos si ``max_trabajadores`` > 1 y, con
+``punto_control``, los resultados se guardan periódicamente en disco: si el
+análisis se interrumpe, al repetir la llamada solo se evalúan los bloques que
+faltan.
+
+Ejemplo (Ross-Macdonald con el clima)::
+
+    from clima import preparar_ross_macdonald
+    from sensibilidad import analisis_sobol
+
+    resultado = analisis_sobol(
+        "ross_macdonald",
+        rangos={"b": (0.3, 0.7), "c": (0.3, 0.7), "gamma": (0.07, 0.2), "temp": (15, 35), "humedad": (20, 90)},
+        fijos={"poblacion_h": 1000, "infectados_h": 10, "infectados_v_iniciales": 100},
+        dias=365, salidas=("pico", "ataque"), muestras=4096, preparar=preparar_ross_macdonald,
+        max_trabajadores=4, punto_control="sobol_rm.npz",
+    )
+"""
+
+import json
+import math
+import os
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from scipy.stats import qmc
+
+from metricas import AJUSTES_METRICAS, DTYPE_METRICAS, metricas
+from models import _nombre_modelo
+
+MUESTREOS = ("sobol", "lhs")
+
+# Segundos mínimos entre dos escrituras del punto de control
+INTERVALO_PUNTO_CONTROL = 10.0
+
+ResultadoSobol = namedtuple("ResultadoSobol", [
+    "parametros", "salidas", "primer_orden", "primer_orden_ic", "total", "total_ic", "evaluaciones",
+])
+ResultadoSobol.__doc__ = """
+Resultado de ``analisis_sobol``.
+
+Attributes:
+    parametros (tuple): Nombres de los parámetros, en el orden de las columnas.
+    salidas (tuple): Nombres de las salidas, en el orden de las filas.
+    primer_orden (numpy.ndarray): Índices de primer orden, forma (salida, parámetro).
+    primer_orden_ic (numpy.ndarray): Intervalos de confianza, forma (salida, parámetro, 2).
+    total (numpy.ndarray): Índices totales, forma (salida, parámetro).
+    total_ic (numpy.ndarray): Intervalos de confianza, forma (salida, parámetro, 2).
+    evaluaciones (int): Número de escenarios simulados.
+"""
+
+ResultadoMorris = namedtuple("ResultadoMorris", [
+    "parametros", "salidas", "mu", "mu_estrella", "mu_estrella_ic", "sigma", "evaluaciones",
+])
+ResultadoMorris.__doc__ = """
+Resultado de ``analisis_morris``. Los efectos elementales se miden por unidad
+del rango normalizado de cada parámetro.
+
+Attributes:
+    parametros (tuple): Nombres de los parámetros, en el orden de las columnas.
+    salidas (tuple): Nombres de las salidas, en el orden de las filas.
+    mu (numpy.ndarray): Media de los efectos elementales, forma (salida, parámetro).
+    mu_estrella (numpy.ndarray): Media de sus valores absolutos, forma (salida, parámetro).
+    mu_estrella_ic (numpy.ndarray): Intervalos de confianza de mu*, forma (salida, parámetro, 2).
+    sigma (numpy.ndarray): Desviación típica de los efectos elementales, forma (salida, parámetro).
+    evaluaciones (int): Número de escenarios simulados.
+"""
+
+
+def _validar(rangos, salidas):
+    if not rangos:
+        raise ValueError("Hay que indicar al menos un parámetro en 'rangos'")
+    limites = np.array([rangos[nombre] for nombre in rangos], dtype=float)
+    if limites.shape != (len(rangos), 2) or np.any(limites[:, 1] <= limites[:, 0]):
+        raise ValueError("Cada rango debe ser un par (mínimo, máximo) con mínimo < máximo")
+    desconocidas = [salida for salida in salidas if salida not in DTYPE_METRICAS.names]
+    if desconocidas:
+        raise ValueError(f"Salidas desconocidas: {', '.join(desconocidas)}. "
+                         f"Opciones: {', '.join(DTYPE_METRICAS.names)}")
+    return tuple(rangos), limites
+
+
+def _evaluar_bloque(nombre, filas, parametros, limites, fijos, preparar, dias, salidas, compartimento, ajustes):
+    """
+    Simula un bloque del diseño (filas en [0, 1]^d) y devuelve sus salidas.
+
+    Función de nivel de módulo para que el ejecutor de procesos pueda serializarla.
+    """
+    valores = limites[:, 0] + filas * (limites[:, 1] - limites[:, 0])
+    muestras = dict(fijos, **{nombre_p: valores[:, j] for j, nombre_p in enumerate(parametros)})
+    if preparar is not None:
+        muestras = preparar(muestras)
+    resultado = metricas(nombre, muestras, dias, compartimento=compartimento, ajustes=ajustes)
+    return np.column_stack([resultado[salida] for salida in salidas])
+
+
+def _guardar_punto_control(ruta, firma, semilla, salidas, completos):
+    # Escritura atómica: una interrupción nunca deja un fichero a medias
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    descriptor, temporal = tempfile.mkstemp(suffix=".npz", dir=directorio)
+    try:
+        with os.fdopen(descriptor, "wb") as fichero:
+            np.savez(fichero, firma=np.array(firma), semilla=np.array(str(semilla)),
+                     salidas=salidas, completos=completos)
+        os.replace(temporal, ruta)
+    except OSError:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _cargar_punto_control(ruta, firma):
+    """
+    Devuelve ``(semilla, salidas, completos)`` de un punto de control, o None si no existe.
+    """
+    if ruta is None or not os.path.exists(ruta):
+        return None
+    with np.load(ruta) as datos:
+        if str(datos["firma"]) != firma:
+            raise ValueError(f"El punto de control '{ruta}' corresponde a otro análisis")
+        return int(str(datos["semilla"])), datos["salidas"], datos["completos"]
+
+
+def _evaluar_diseno(nombre, filas, total, opciones, n_salidas, tam_bloque, max_trabajadores,
+                    punto_control, firma, semilla):
+    """
+    Evalúa todas las filas del diseño por bloques, en paralelo y con punto de control.
+
+    Args:
+        filas (callable): ``filas(inicio, fin)`` devuelve las filas del diseño
+            en [0, 1]^d de ese bloque.
+        total (int): Número de filas del diseño.
+        opciones (tuple): Resto de argumentos de ``_evaluar_bloque``.
+
+    Returns:
+        numpy.ndarray: Salidas de forma (fila, salida).
+    """
+    bloques = [(inicio, min(inicio + tam_bloque, total)) for inicio in range(0, total, tam_bloque)]
+    resultados = np.full((total, n_salidas), np.nan)
+    completos = np.zeros(len(bloques), dtype=bool)
+    previo = _cargar_punto_control(punto_control, firma)
+    if previo is not None:
+        _, resultados, completos = previo
+        resultados, completos = np.array(resultados), np.array(completos)
+    pendientes = [i for i in range(len(bloques)) if not completos[i]]
+
+    ultimo_guardado = time.perf_counter()
+
+    def anotar(i, salidas):
+        nonlocal ultimo_guardado
+        inicio, fin = bloques[i]
+        resultados[inicio:fin] = salidas
+        completos[i] = True
+        if punto_control is not None and time.perf_counter() - ultimo_guardado > INTERVALO_PUNTO_CONTROL:
+            _guardar_punto_control(punto_control, firma, semilla, resultados, completos)
+            ultimo_guardado = time.perf_counter()
+
+    try:
+        if max_trabajadores > 1 and len(pendientes) > 1:
+            with ProcessPoolExecutor(max_workers=max_trabajadores) as pool:
+                futuros = {pool.submit(_evaluar_bloque, nombre, filas(*bloques[i]), *opciones): i
+                           for i in pendientes}
+                for futuro in as_completed(futuros):
+                    anotar(futuros[futuro], futuro.result())
+        else:
+            for i in pendientes:
+                anotar(i, _evaluar_bloque(nombre, filas(*bloques[i]), *opciones))
+    finally:
+        if punto_control is not None and pendientes:
+            _guardar_punto_control(punto_control, firma, semilla, resultados, completos)
+    return resultados
+
+
+def _firma(analisis, nombre, parametros, limites, fijos, dias, salidas, compartimento, ajustes, preparar, extra):
+    """
+    Descripción del análisis que se guarda en el punto de control para no
+    mezclar resultados de análisis distintos.
+    """
+    return json.dumps({
+        "analisis": analisis,
+        "modelo": nombre,
+        "rangos": dict(zip(parametros, limites.tolist())),
+        "fijos": {clave: np.asarray(valor).tolist() for clave, valor in fijos.items()},
+        "dias": dias,
+        "salidas": list(salidas),
+        "compartimento": compartimento,
+        "ajustes": ajustes.como_dict(),
+        "preparar": getattr(preparar, "__qualname__", repr(preparar)) if preparar is not None else None,
+        **extra,
+    }, sort_keys=True)
+
+
+def _semilla(punto_control, firma, semilla):
+    """
+    Semilla del diseño: la del punto de control si existe (para regenerar el
+    mismo diseño al retomar), la indicada o una nueva.
+    """
+    previo = _cargar_punto_control(punto_control, firma)
+    if previo is not None:
+        return previo[0]
+    if semilla is None:
+        return int(np.random.SeedSequence().entropy % 2**63)
+    return int(semilla)
+
+
+def _intervalos(estadistico, n, bootstrap, confianza, rng, lote=50):
+    """
+    Intervalos de confianza por bootstrap de percentiles.
+
+    Remuestrear con reemplazo equivale a dar a cada muestra un peso (las veces
+    que sale, entre n), así que cada réplica es una media ponderada y un lote
+    de réplicas se calcula con un producto de matrices.
+
+    Args:
+        estadistico (callable): ``estadistico(pesos)`` calcula el índice con
+            los pesos de forma (réplica, muestra) y devuelve (réplica, ...).
+        n (int): Número de muestras independientes.
+
+    Returns:
+        numpy.ndarray: Extremos inferior y superior en el último eje.
+    """
+    replicas = []
+    for inicio in range(0, bootstrap, lote):
+        cuenta = np.stack([np.bincount(rng.integers(0, n, size=n), minlength=n)
+                           for _ in range(min(lote, bootstrap - inicio))])
+        replicas.append(estadistico(cuenta / n))
+    alfa = (1.0 - confianza) / 2.0
+    return np.moveaxis(np.nanquantile(np.concatenate(replicas), [alfa, 1.0 - alfa], axis=0), 0, -1)
+
+
+def _media(pesos, x):
+    # Media ponderada por muestra (primer eje de x); devuelve (réplica,) + x.shape[1:]
+    return (pesos @ x.reshape(len(x), -1)).reshape((len(pesos),) + x.shape[1:])
+
+
+def _indices_sobol(fA, fB, fAB, pesos):
+    """
+    Índices de primer orden (Saltelli, 2010) y totales (Jansen).
+
+    Args:
+        fA, fB (array): Salidas de las matrices A y B, forma (muestra, salida).
+        fAB (array): Salidas de A con la columna i de B, forma (muestra, parámetro, salida).
+        pesos (array): Pesos de las muestras, forma (réplica, muestra).
+
+    Returns:
+        tuple: Índices de primer orden y totales, de forma (réplica, salida, parámetro).
+    """
+    fA, fB = fA[:, np.newaxis], fB[:, np.newaxis]
+    media = 0.5 * (_media(pesos, fA) + _media(pesos, fB))
+    varianza = 0.5 * (_media(pesos, fA ** 2) + _media(pesos, fB ** 2)) - media ** 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        primer_orden = _media(pesos, fB * (fAB - fA)) / varianza
+        total = 0.5 * _media(pesos, (fA - fAB) ** 2) / varianza
+    return primer_orden.transpose(0, 2, 1), total.transpose(0, 2, 1)
+
+
+def analisis_sobol(modelo, rangos, dias, fijos=None, salidas=("pico", "ataque"), muestras=1024, muestreo="sobol",
+                   preparar=None, compartimento=None, ajustes=AJUSTES_METRICAS, bootstrap=200, confianza=0.95,
+                   semilla=None, tam_bloque=4096, max_trabajadores=1, punto_control=None):
+    """
+    Calcula los índices de Sobol de primer orden y totales de unas salidas escalares.
+
+    Args:
+        modelo (str | callable): Modelo (como en ``simular_lote``).
+        rangos (dict): Parámetro -> (mínimo, máximo), con distribución uniforme.
+            Pueden ser parámetros del modelo o entradas de ``preparar`` (como
+            "temp" y "humedad").
+        dias (int): Número de días para simular.
+        fijos (dict, optional): Resto de parámetros, con valor fijo.
+        salidas (tuple): Campos de ``metricas.DTYPE_METRICAS`` que se analizan.
+        muestras (int): Tamaño N de las matrices A y B; con "sobol" se redondea
+            a la siguiente potencia de 2.
+        muestreo (str): "sobol" (secuencia de Sobol aleatorizada) o "lhs".
+        preparar (callable, optional): Función de nivel de módulo que convierte
+            las muestras en parámetros del modelo (``clima.preparar_ross_macdonald``).
+        compartimento (str, optional): Compartimento observado (como en ``metricas``).
+        ajustes (AjustesSolver, optional): Integrador de ``metricas``.
+        bootstrap (int): Réplicas bootstrap de los intervalos de confianza.
+        confianza (float): Nivel de confianza de los intervalos.
+        semilla (int, optional): Semilla del diseño y del bootstrap.
+        tam_bloque (int): Escenarios por llamada a ``metricas``.
+        max_trabajadores (int): Procesos; con 1 se evalúa en el proceso actual.
+        punto_control (str, optional): Fichero ``.npz`` donde se guardan los
+            bloques terminados para poder retomar el análisis.
+
+    Returns:
+        ResultadoSobol: Índices e intervalos por salida y parámetro.
+    """
+    if muestreo not in MUESTREOS:
+        raise ValueError(f"Muestreo desconocido: {muestreo!r}. Opciones: {', '.join(MUESTREOS)}")
+    nombre = _nombre_modelo(modelo)
+    fijos = dict(fijos or {})
+    salidas = tuple(salidas)
+    parametros, limites = _validar(rangos, salidas)
+    d = len(parametros)
+    potencia = max(1, math.ceil(math.log2(muestras)))
+    n = 2 ** potencia if muestreo == "sobol" else int(muestras)
+
+    firma = _firma("sobol", nombre, parametros, limites, fijos, dias, salidas, compartimento, ajustes, preparar,
+                   {"muestras": n, "muestreo": muestreo, "tam_bloque": tam_bloque})
+    semilla = _semilla(punto_control, firma, semilla)
+    if muestreo == "sobol":
+        base = qmc.Sobol(d=2 * d, scramble=True, seed=semilla).random_base2(potencia)
+    else:
+        base = qmc.LatinHypercube(d=2 * d, seed=semilla).random(n)
+    A, B = base[:, :d], base[:, d:]
+
+    def filas(inicio, fin):
+        # Filas [A; B; AB_1; ...; AB_d] sin construir el diseño completo
+        indices = np.arange(inicio, fin)
+        matriz, muestra = np.divmod(indices, n)
+        bloque = np.where((matriz == 1)[:, np.newaxis], B[muestra], A[muestra])
+        cambia = np.flatnonzero(matriz >= 2)
+        bloque[cambia, matriz[cambia] - 2] = B[muestra[cambia], matriz[cambia] - 2]
+        return bloque
+
+    opciones = (parametros, limites, fijos, preparar, dias, salidas, compartimento, ajustes)
+    resultados = _evaluar_diseno(nombre, filas, n * (d + 2), opciones, len(salidas), tam_bloque,
+                                 max_trabajadores, punto_control, firma, semilla)
+    fA, fB = resultados[:n], resultados[n:2 * n]
+    fAB = resultados[2 * n:].reshape(d, n, len(salidas)).transpose(1, 0, 2)
+
+    primer_orden, total = _indices_sobol(fA, fB, fAB, np.full((1, n), 1.0 / n))
+    rng = np.random.default_rng(semilla)
+    intervalos = _intervalos(lambda pesos: np.stack(_indices_sobol(fA, fB, fAB, pesos), axis=1), n,
+                             bootstrap, confianza, rng)
+    return ResultadoSobol(parametros, salidas, primer_orden[0], intervalos[0], total[0], intervalos[1],
+                          len(resultados))
+
+
+def _trayectorias_morris(r, d, niveles, rng):
+    """
+    Diseño de Morris: ``r`` trayectorias de d + 1 puntos en la rejilla de
+    ``niveles`` niveles de [0, 1]^d, cambiando un parámetro en cada paso.
+
+    Returns:
+        numpy.ndarray: Puntos de forma (r, d + 1, d).
+    """
+    delta = niveles / (2.0 * (niveles - 1))
+    # Punto de partida en los niveles desde los que se puede sumar delta
+    base = rng.integers(0, niveles // 2, size=(r, 1, d)) / (niveles - 1)
+    escalera = np.tril(np.ones((d + 1, d)), -1)
+    signos = rng.choice((-1.0, 1.0), size=(r, 1, d))
+    puntos = base + (delta / 2.0) * ((2.0 * escalera - 1.0) * signos + 1.0)
+    orden = np.argsort(rng.random((r, d)), axis=1)
+    return np.take_along_axis(puntos, orden[:, np.newaxis, :], axis=2)
+
+
+def analisis_morris(modelo, rangos, dias, fijos=None, salidas=("pico", "ataque"), trayectorias=50, niveles=4,
+                    preparar=None, compartimento=None, ajustes=AJUSTES_METRICAS, bootstrap=200, confianza=0.95,
+                    semilla=None, tam_bloque=4096, max_trabajadores=1, punto_control=None):
+    """
+    Calcula los efectos elementales de Morris de unas salidas escalares.
+
+    Es un cribado barato: mu* alto indica un parámetro influyente y sigma alto,
+    efectos no lineales o interacciones.
+
+    Args:
+        modelo (str | callable): Modelo (como en ``simular_lote``).
+        rangos (dict): Parámetro -> (mínimo, máximo).
+        dias (int): Número de días para simular.
+        fijos (dict, optional): Resto de parámetros, con valor fijo.
+        salidas (tuple): Campos de ``metricas.DTYPE_METRICAS`` que se analizan.
+        trayectorias (int): Número r de trayectorias.
+        niveles (int): Niveles (par) de la rejilla de cada parámetro.
+        preparar, compartimento, ajustes, bootstrap, confianza, semilla,
+        tam_bloque, max_trabajadores, punto_control: Como en ``analisis_sobol``.
+
+    Returns:
+        ResultadoMorris: mu, mu*, su intervalo de confianza y sigma por salida y parámetro.
+    """
+    if niveles < 2 or niveles % 2:
+        raise ValueError("El número de niveles debe ser par")
+    nombre = _nombre_modelo(modelo)
+    fijos = dict(fijos or {})
+    salidas = tuple(salidas)
+    parametros, limites = _validar(rangos, salidas)
+    d = len(parametros)
+
+    firma = _firma("morris", nombre, parametros, limites, fijos, dias, salidas, compartimento, ajustes, preparar,
+                   {"trayectorias": trayectorias, "niveles": niveles, "tam_bloque": tam_bloque})
+    semilla = _semilla(punto_control, firma, semilla)
+    rng = np.random.default_rng(semilla)
+    puntos = _trayectorias_morris(trayectorias, d, niveles, rng)
+    diseno = puntos.reshape(-1, d)
+
+    opciones = (parametros, limites, fijos, preparar, dias, salidas, compartimento, ajustes)
+    resultados = _evaluar_diseno(nombre, lambda inicio, fin: diseno[inicio:fin], len(diseno), opciones,
+                                 len(salidas), tam_bloque, max_trabajadores, punto_control, firma, semilla)
+    resultados = resultados.reshape(trayectorias, d + 1, len(salidas))
+
+    # Cada paso cambia un solo parámetro: el de mayor variación
+    pasos = np.diff(puntos, axis=1)
+    cambiado = np.abs(pasos).argmax(axis=2)
+    incremento = np.take_along_axis(pasos, cambiado[..., np.newaxis], axis=2)
+    efectos = np.empty((trayectorias, d, len(salidas)))
+    np.put_along_axis(efectos, cambiado[..., np.newaxis], np.diff(resultados, axis=1) / incremento, axis=1)
+
+    mu_estrella = np.mean(np.abs(efectos), axis=0).T
+    intervalos = _intervalos(lambda pesos: _media(pesos, np.abs(efectos)).transpose(0, 2, 1), trayectorias,
+                             bootstrap, confianza, rng)
+    return ResultadoMorris(parametros, salidas, np.mean(efectos, axis=0).T, mu_estrella, intervalos,
+                           np.std(efectos, axis=0, ddof=1).T, len(diseno))
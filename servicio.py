@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de la capa de servicio para la aplicación con muchos usuarios.
+
+Sin esta capa, cada sesión de Streamlit integra en su propio hilo: con muchas
+sesiones a la vez el uso de CPU no tiene límite y las peticiones idénticas de
+usuarios distintos se calculan varias veces. ``ServicioSimulacion`` centraliza
+el trabajo de todas las sesiones del proceso:
+
+- un único grupo de trabajadores (hilos o procesos) con una cola acotada;
+- una caché de resultados compartida (``cache.CacheSimulaciones``), que
+  responde sin pasar por la cola;
+- *single-flight*: si llega una petición idéntica a otra que aún se está
+  calculando, espera el mismo resultado en lugar de encolarse otra vez;
+- control de admisión: con la cola llena (o si la espera estimada supera
+  ``latencia_maxima``) la petición espera como mucho ``espera_admision``
+  segundos a que haya hueco y, si no, se rechaza con ``ServicioSaturado``;
+- métricas de la cola y de latencia (``estadisticas`` y ``prometheus``).
+
+Las peticiones devuelven un ``concurrent.futures.Future``. El servicio
+compartido del proceso se obtiene con ``compartido()`` y se configura con
+variables de entorno:
+
+- ``SIMULACION_SERVICIO_TRABAJADORES``: trabajadores (por defecto, hasta 4).
+- ``SIMULACION_SERVICIO_COLA``: peticiones en espera admitidas (por defecto 64).
+- ``SIMULACION_SERVICIO_PROCESOS=1``: usar procesos en lugar de hilos.
+- ``SIMULACION_SERVICIO_ESPERA``: segundos de espera de admisión (por defecto 2).
+
+Ejemplo::
+
+    from servicio import ServicioSaturado, compartido
+
+    try:
+        resultado = compartido().simular("sir", parametros, 365).result()
+    except ServicioSaturado:
+        ...  # reintentar más tarde
+"""
+
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from cache import CacheSimulaciones, clave_canonica
+from metricas import AJUSTES_METRICAS, metricas
+from models import MODELOS, Resultado, _nombre_modelo, simular
+from solucionadores import AJUSTES_POR_DEFECTO
+
+# Latencias recientes que se conservan para los percentiles
+VENTANA_LATENCIAS = 1024
+CUANTILES = (0.5, 0.9, 0.99)
+
+
+class ServicioSaturado(RuntimeError):
+    """
+    La petición no se ha admitido porque el servicio está saturado.
+    """
+
+
+# Tareas que ejecutan los trabajadores. Son funciones de nivel de módulo (para
+# el ejecutor de procesos) y devuelven diccionarios de arrays, que es lo que
+# guarda la caché.
+
+def _tarea_simular(modelo, parametros, dias, ajustes):
+    resultado = simular(modelo, parametros, dias, ajustes)
+    return {"t": resultado.t, "estados": resultado.datos}
+
+
+def _tarea_metricas(modelo, parametros, dias, umbral, compartimento, ajustes):
+    return {"metricas": metricas(modelo, parametros, dias, umbral, compartimento, ajustes)}
+
+
+def _ejecutar(tarea, *args):
+    """
+    Ejecuta una tarea y devuelve sus arrays y los segundos de cálculo.
+    """
+    inicio = time.perf_counter()
+    arrays = tarea(*args)
+    return arrays, time.perf_counter() - inicio
+
+
+def _encadenar(futuro, convertir):
+    """
+    Devuelve un ``Future`` con ``convertir`` aplicado al resultado de ``futuro``.
+
+    Cada petición recibe el suyo, aunque varias compartan el mismo cálculo.
+    """
+    salida = Future()
+
+    def copiar(origen):
+        if origen.cancelled():
+            salida.cancel()
+        elif origen.exception() is not None:
+            salida.set_exception(origen.exception())
+        else:
+            salida.set_result(convertir(origen.result()))
+
+    futuro.add_done_callback(copiar)
+    return salida
+
+
+def _terminado(valor):
+    futuro = Future()
+    futuro.set_result(valor)
+    return futuro
+
+
+class ServicioSimulacion:
+    """
+    Grupo de trabajadores compartido con caché, single-flight y control de admisión.
+
+    Args:
+        trabajadores (int, optional): Número de trabajadores (por defecto, el
+            mínimo entre 4 y el número de CPU).
+        capacidad_cola (int): Peticiones admitidas además de las que se están
+            calculando. Las que esperan el resultado de otra idéntica o salen
+            de la caché no cuentan.
+        procesos (bool): Usar un ejecutor de procesos. Con hilos (por defecto)
+            los trabajadores comparten la caché de ``models`` y la
+            instrumentación de la sesión que envía la petición.
+        capacidad_cache (int): Resultados que se conservan en memoria (0 desactiva la caché).
+        espera_admision (float): Segundos que una petición espera a que haya
+            hueco antes de rechazarse.
+        latencia_maxima (float, optional): Se rechazan también las peticiones
+            cuya espera estimada (cola por trabajador por tiempo medio de
+            cálculo) supera estos segundos.
+    """
+
+    def __init__(self, trabajadores=None, capacidad_cola=64, procesos=False, capacidad_cache=256,
+                 espera_admision=0.0, latencia_maxima=None):
+        self.trabajadores = trabajadores or min(4, os.cpu_count() or 1)
+        self.capacidad_cola = capacidad_cola
+        self.procesos = procesos
+        self.espera_admision = espera_admision
+        self.latencia_maxima = latencia_maxima
+        self.cache = CacheSimulaciones(capacidad=capacidad_cache)
+        if procesos:
+            self._ejecutor = ProcessPoolExecutor(max_workers=self.trabajadores)
+        else:
+            self._ejecutor = ThreadPoolExecutor(max_workers=self.trabajadores, thread_name_prefix="servicio")
+        self._lock = threading.Lock()
+        self._hueco = threading.Condition(self._lock)
+        self._en_vuelo = {}
+        self._latencias = deque(maxlen=VENTANA_LATENCIAS)
+        self._calculos = deque(maxlen=VENTANA_LATENCIAS)
+        self.contadores = dict.fromkeys(
+            ("solicitudes", "aciertos_cache", "deduplicadas", "rechazadas", "calculadas", "errores"), 0)
+
+    # -- Peticiones ---------------------------------------------------------
+
+    def simular(self, modelo, parametros, dias, ajustes=AJUSTES_POR_DEFECTO):
+        """
+        Simula un escenario (como ``models.simular``, sin eventos).
+
+        Returns:
+            concurrent.futures.Future: Futuro con el ``models.Resultado``.
+
+        Raises:
+            ServicioSaturado: Si la petición no se admite.
+        """
+        nombre = _nombre_modelo(modelo)
+        clave = clave_canonica(nombre, parametros, dias, {"tarea": "simular", **ajustes.como_dict()})
+        futuro = self._enviar(clave, _tarea_simular, nombre, parametros, dias, ajustes)
+        compartimentos = MODELOS[nombre].compartimentos
+        return _encadenar(futuro, lambda arrays: Resultado(arrays["t"], compartimentos, arrays["estados"]))
+
+    def metricas(self, modelo, parametros, dias, umbral=None, compartimento=None, ajustes=AJUSTES_METRICAS):
+        """
+        Calcula las métricas resumen de un lote (como ``metricas.metricas``).
+
+        Returns:
+            concurrent.futures.Future: Futuro con el array estructurado de métricas.
+
+        Raises:
+            ServicioSaturado: Si la petición no se admite.
+        """
+        nombre = _nombre_modelo(modelo)
+        opciones = {"tarea": "metricas", "umbral": umbral, "compartimento": compartimento, **ajustes.como_dict()}
+        clave = clave_canonica(nombre, parametros, dias, opciones)
+        futuro = self._enviar(clave, _tarea_metricas, nombre, parametros, dias, umbral, compartimento, ajustes)
+        return _encadenar(futuro, lambda arrays: arrays["metricas"])
+
+    def _espera_estimada(self):
+        # Debe llamarse con el lock adquirido
+        if not self._calculos:
+            return 0.0
+        return len(self._en_vuelo) / self.trabajadores * float(np.mean(self._calculos))
+
+    def _saturado(self):
+        # Debe llamarse con el lock adquirido
+        if len(self._en_vuelo) >= self.trabajadores + self.capacidad_cola:
+            return True
+        return self.latencia_maxima is not None and self._espera_estimada() > self.latencia_maxima
+
+    def _enviar(self, clave, tarea, *args):
+        """
+        Devuelve el futuro (de diccionario de arrays) de la tarea ``clave``:
+        de la caché, el de una petición idéntica en curso o uno nuevo.
+        """
+        with self._lock:
+            self.contadores["solicitudes"] += 1
+            arrays = self.cache.obtener(clave)
+            if arrays is not None:
+                self.contadores["aciertos_cache"] += 1
+                return _terminado(arrays)
+            if clave in self._en_vuelo:
+                self.contadores["deduplicadas"] += 1
+                return self._en_vuelo[clave][0]
+            limite = time.monotonic() + self.espera_admision
+            while self._saturado():
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self.contadores["rechazadas"] += 1
+                    raise ServicioSaturado(
+                        f"Servicio saturado: {len(self._en_vuelo)} peticiones pendientes "
+                        f"con {self.trabajadores} trabajadores")
+                self._hueco.wait(restante)
+                # Mientras se esperaba puede haber terminado (o empezado) la misma petición
+                arrays = self.cache.obtener(clave)
+                if arrays is not None:
+                    self.contadores["aciertos_cache"] += 1
+                    return _terminado(arrays)
+                if clave in self._en_vuelo:
+                    self.contadores["deduplicadas"] += 1
+                    return self._en_vuelo[clave][0]
+            if self.procesos:
+                futuro = self._ejecutor.submit(_ejecutar, tarea, *args)
+            else:
+                # Se copia el contexto para que la instrumentación de la sesión
+                # registre las integraciones del trabajador
+                futuro = self._ejecutor.submit(contextvars.copy_context().run, _ejecutar, tarea, *args)
+            resultado = Future()
+            self._en_vuelo[clave] = (resultado, futuro, time.perf_counter())
+        # Fuera del lock: si ya ha terminado, la función se llama aquí mismo
+        futuro.add_done_callback(lambda f: self._terminar(clave, f, resultado))
+        return resultado
+
+    def _terminar(self, clave, futuro, resultado):
+        cancelado = futuro.cancelled()
+        error = None if cancelado else futuro.exception()
+        with self._lock:
+            _, _, enviado = self._en_vuelo[clave]
+            if not cancelado and error is None:
+                arrays, segundos = futuro.result()
+                arrays = self.cache.guardar(clave, arrays)
+                self.contadores["calculadas"] += 1
+                self._calculos.append(segundos)
+                self._latencias.append(time.perf_counter() - enviado)
+            else:
+                self.contadores["errores"] += 1
+            del self._en_vuelo[clave]
+            self._hueco.notify_all()
+        if cancelado:
+            resultado.cancel()
+        elif error is None:
+            resultado.set_result(arrays)
+        else:
+            resultado.set_exception(error)
+
+    # -- Métricas -----------------------------------------------------------
+
+    def estadisticas(self):
+        """
+        Devuelve el estado de la cola, los contadores y los percentiles de latencia.
+
+        Returns:
+            dict: ``en_curso`` y ``en_cola`` (peticiones calculándose y
+            esperando trabajador), los contadores de peticiones, la caché y
+            los percentiles (p50, p90, p99) de la latencia completa
+            (``latencia``, de la admisión al resultado) y del cálculo.
+        """
+        with self._lock:
+            pendientes = len(self._en_vuelo)
+            en_curso = sum(futuro.running() for _, futuro, _ in self._en_vuelo.values())
+            latencias = np.array(self._latencias)
+            calculos = np.array(self._calculos)
+            datos = {
+                "trabajadores": self.trabajadores,
+                "capacidad_cola": self.capacidad_cola,
+                "en_curso": en_curso,
+                "en_cola": pendientes - en_curso,
+                "espera_estimada": self._espera_estimada(),
+                **self.contadores,
+            }
+        for nombre, valores in (("latencia", latencias), ("calculo", calculos)):
+            for cuantil in CUANTILES:
+                datos[f"{nombre}_p{round(cuantil * 100)}"] = (
+                    float(np.quantile(valores, cuantil)) if len(valores) else 0.0)
+        datos["cache"] = self.cache.estadisticas()
+        return datos
+
+    def prometheus(self):
+        """
+        Devuelve las métricas del servicio en el formato de texto de Prometheus.
+        """
+        datos = self.estadisticas()
+        lineas = [
+            "# HELP simulacion_servicio_en_curso Peticiones calculándose.",
+            "# TYPE simulacion_servicio_en_curso gauge",
+            f"simulacion_servicio_en_curso {datos['en_curso']}",
+            "# HELP simulacion_servicio_en_cola Peticiones esperando trabajador.",
+            "# TYPE simulacion_servicio_en_cola gauge",
+            f"simulacion_servicio_en_cola {datos['en_cola']}",
+            "# HELP simulacion_servicio_peticiones_total Peticiones por resultado.",
+            "# TYPE simulacion_servicio_peticiones_total counter",
+        ]
+        for resultado, contador in (("cache", "aciertos_cache"), ("deduplicada", "deduplicadas"),
+                                    ("rechazada", "rechazadas"), ("calculada", "calculadas"), ("error", "errores")):
+            lineas.append(f'simulacion_servicio_peticiones_total{{resultado="{resultado}"}} {datos[contador]}')
+        for nombre, ayuda in (("latencia", "Latencia de las peticiones calculadas."),
+                              ("calculo", "Tiempo de cálculo de las peticiones.")):
+            metrica = f"simulacion_servicio_{nombre}_segundos"
+            lineas += [f"# HELP {metrica} {ayuda}", f"# TYPE {metrica} summary"]
+            for cuantil in CUANTILES:
+                lineas.append(f'{metrica}{{quantile="{cuantil}"}} {datos[f"{nombre}_p{round(cuantil * 100)}"]:.6f}')
+        return "\n".join(lineas) + "\n"
+
+    def cerrar(self, esperar=True):
+        """
+        Cierra el grupo de trabajadores.
+        """
+        self._ejecutor.shutdown(wait=esperar, cancel_futures=not esperar)
+
+
+_COMPARTIDO = None
+_lock_compartido = threading.Lock()
+
+
+def compartido():
+    """
+    Devuelve el ``ServicioSimulacion`` del proceso (se crea la primera vez con
+    la configuración de las variables de entorno).
+    """
+    global _COMPARTIDO
+    with _lock_compartido:
+        if _COMPARTIDO is None:
+            _COMPARTIDO = ServicioSimulacion(
+                trabajadores=int(os.environ.get("SIMULACION_SERVICIO_TRABAJADORES", 0)) or None,
+                capacidad_cola=int(os.environ.get("SIMULACION_SERVICIO_COLA", 64)),
+                procesos=os.environ.get("SIMULACION_SERVICIO_PROCESOS", "").lower() in ("1", "true", "si", "sí"),
+                espera_admision=float(os.environ.get("SIMULACION_SERVICIO_ESPERA", 2.0)),
+            )
+        return _COMPARTIDO
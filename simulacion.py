@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Punto de entrada de línea de comandos para ejecutar simulaciones sin Streamlit.
+
+Solo carga NumPy y SciPy (más PyYAML o PyArrow si la configuración o la salida
+lo requieren), de modo que los trabajos programados arrancan rápido.
+
+Uso:
+    python -m simulacion modelos
+    python -m simulacion run --model ross-macdonald --config escenarios.yaml --out resultados.parquet
+
+Formato de la configuración (JSON o YAML)::
+
+    dias: 365
+    ajustes: {metodo: LSODA, malla: diaria}
+    base: {poblacion_h: 1000, infectados_h: 10, infectados_v_iniciales: 100,
+           b: 0.5, c: 0.5, gamma: 0.14}
+    escenarios:                     # lista de escenarios...
+      - {temp: 24, humedad: 70}
+      - {temp: 28, humedad: 70}
+    rejilla:                        # ...o producto cartesiano de ejes
+      temp: [20, 24, 28, 32]
+      humedad: [50, 70, 90]
+
+También se admite un CSV con una fila por escenario y una columna por
+parámetro. En Ross-Macdonald se pueden dar "temp" y "humedad" en lugar de
+"a" y "m"; las curvas de respuesta se eligen con una sección opcional::
+
+    clima: {curva_picaduras: briere, curva_densidad: lineal, tabla: false}
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from dataclasses import fields
+
+import numpy as np
+
+from barrido import barrido_completo, num_muestras, rejilla
+from clima import preparador_ross_macdonald
+from models import MODELOS, _nombre_modelo, simular_lote
+from solucionadores import METODOS, MALLAS, AjustesSolver, malla_tiempos
+
+
+def cargar_configuracion(ruta):
+    """
+    Lee un fichero de configuración JSON, YAML o CSV.
+
+    Returns:
+        dict: Configuración con las claves "base", "escenarios", "rejilla",
+        "dias" y "ajustes" (las que estén presentes).
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension == ".csv":
+        with open(ruta, newline="", encoding="utf-8") as fichero:
+            filas = list(csv.DictReader(fichero))
+        return {"escenarios": [{k: float(v) for k, v in fila.items()} for fila in filas]}
+    with open(ruta, encoding="utf-8") as fichero:
+        if extension in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("Para leer YAML hace falta PyYAML (pip install pyyaml); "
+                                 "también se puede usar JSON.") from None
+            return yaml.safe_load(fichero) or {}
+        return json.load(fichero)
+
+
+def muestras_de_configuracion(configuracion):
+    """
+    Convierte la configuración en un diccionario nombre -> array con una entrada por escenario.
+    """
+    muestras = {nombre: float(valor) for nombre, valor in (configuracion.get("base") or {}).items()}
+    escenarios = configuracion.get("escenarios")
+    if escenarios and configuracion.get("rejilla"):
+        raise SystemExit("La configuración debe tener 'escenarios' o 'rejilla', no ambos.")
+    if escenarios:
+        nombres = sorted({nombre for escenario in escenarios for nombre in escenario})
+        for nombre in nombres:
+            try:
+                muestras[nombre] = np.array(
+                    [float(escenario[nombre]) if nombre in escenario else muestras[nombre] for escenario in escenarios]
+                )
+            except KeyError:
+                raise SystemExit(f"El parámetro {nombre!r} falta en algún escenario y no está en 'base'.") from None
+    elif configuracion.get("rejilla"):
+        muestras.update(rejilla(**configuracion["rejilla"]))
+    return muestras
+
+
+def _ajustes(configuracion, args):
+    opciones = dict(configuracion.get("ajustes") or {})
+    validas = [campo.name for campo in fields(AjustesSolver)]
+    desconocidas = sorted(set(opciones) - set(validas))
+    if desconocidas:
+        raise ValueError(f"Ajustes desconocidos: {', '.join(desconocidas)}. Opciones: {', '.join(validas)}")
+    for nombre in ("metodo", "malla", "rtol", "atol"):
+        if getattr(args, nombre) is not None:
+            opciones[nombre] = getattr(args, nombre)
+    try:
+        return AjustesSolver(**opciones)
+    except TypeError as error:
+        # Valores de tipo incorrecto (por ejemplo, cada: "siete")
+        raise ValueError(f"Ajustes no válidos {opciones}: {error}") from None
+
+
+def _escribir(ruta, t, compartimentos, datos, muestras):
+    """
+    Escribe los resultados en formato largo (una fila por escenario y día).
+
+    En Parquet y CSV los parámetros de cada escenario van en un fichero aparte
+    (``<nombre>.escenarios.<ext>``) para no repetirlos en cada fila.
+    """
+    base, extension = os.path.splitext(ruta)
+    extension = extension.lower()
+    n, dias, _ = datos.shape
+    parametros = {nombre: np.broadcast_to(np.asarray(valor, dtype=float), (n,)) for nombre, valor in muestras.items()}
+
+    if extension == ".npz":
+        np.savez_compressed(ruta, t=t, datos=datos, compartimentos=np.array(compartimentos),
+                            **{f"parametro_{nombre}": valor for nombre, valor in parametros.items()})
+        return
+
+    columnas = {"escenario": np.repeat(np.arange(n, dtype=np.int32), dias), "Día": np.tile(t, n)}
+    planos = datos.reshape(n * dias, -1)
+    for j, nombre in enumerate(compartimentos):
+        columnas[nombre] = planos[:, j]
+    tabla_escenarios = dict({"escenario": np.arange(n, dtype=np.int32)}, **parametros)
+
+    if extension == ".parquet":
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Para escribir Parquet hace falta PyArrow (pip install pyarrow); "
+                             "también se puede usar .npz o .csv.") from None
+        pq.write_table(pa.table(columnas), ruta)
+        pq.write_table(pa.table(tabla_escenarios), f"{base}.escenarios.parquet")
+    elif extension == ".csv":
+        for destino, tabla in ((ruta, columnas), (f"{base}.escenarios.csv", tabla_escenarios)):
+            with open(destino, "w", newline="", encoding="utf-8") as fichero:
+                fichero.write(",".join(tabla) + "\n")
+                np.savetxt(fichero, np.column_stack(list(tabla.values())), delimiter=",", fmt="%.10g")
+    else:
+        raise SystemExit(f"Formato de salida no soportado: {extension!r} (use .parquet, .npz o .csv)")
+
+
+def ejecutar(args):
+    """
+    Ejecuta el subcomando ``run``.
+
+    Los errores de validación (modelo o parámetros desconocidos, parámetros que
+    faltan, ajustes incompatibles) y los de lectura o escritura de ficheros
+    terminan con un mensaje en lugar de una traza.
+    """
+    try:
+        return _ejecutar(args)
+    except (OSError, ValueError) as error:
+        raise SystemExit(f"Error: {error}") from None
+
+
+def _ejecutar(args):
+    nombre = _nombre_modelo(args.model)
+    configuracion = cargar_configuracion(args.config)
+    muestras = muestras_de_configuracion(configuracion)
+    dias = args.dias or configuracion.get("dias", 365)
+    ajustes = _ajustes(configuracion, args)
+
+    preparar = None
+    if nombre == "ross_macdonald" and "temp" in muestras:
+        preparar = preparador_ross_macdonald(**(configuracion.get("clima") or {}))
+
+    n = num_muestras(muestras)
+    if args.trabajadores > 1:
+        datos = barrido_completo(nombre, muestras, dias, ajustes=ajustes, preparar=preparar,
+                                 tam_bloque=args.tam_bloque, max_trabajadores=args.trabajadores)
+    else:
+        datos = simular_lote(nombre, preparar(muestras) if preparar else muestras, dias, ajustes)
+
+    _escribir(args.out, malla_tiempos(ajustes, dias), MODELOS[nombre].compartimentos, datos, muestras)
+    if not args.silencio:
+        print(f"{n} escenarios x {datos.shape[1]} tiempos de {nombre} -> {args.out}", file=sys.stderr)
+    return 0
+
+
+def listar_modelos(args):
+    """
+    Ejecuta el subcomando ``modelos``: lista los modelos y sus parámetros.
+    """
+    for nombre, definicion in MODELOS.items():
+        print(f"{nombre}: {', '.join(definicion.parametros)}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m simulacion",
+                                     description="Simulación de modelos epidemiológicos sin interfaz")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    run = subparsers.add_parser("run", help="Simula los escenarios de un fichero de configuración")
+    run.add_argument("--model", required=True, help="Modelo: sir, seir, sis, si o ross-macdonald")
+    run.add_argument("--config", required=True, help="Escenarios en JSON, YAML o CSV")
+    run.add_argument("--out", required=True, help="Salida .parquet, .npz o .csv")
+    run.add_argument("--dias", type=int, help="Días de simulación (sustituye al de la configuración)")
+    run.add_argument("--metodo", choices=METODOS)
+    # La malla "eventos" solo existe para un escenario (``simular``), no para lotes
+    run.add_argument("--malla", choices=[malla for malla in MALLAS if malla != "eventos"])
+    run.add_argument("--rtol", type=float)
+    run.add_argument("--atol", type=float)
+    run.add_argument("--trabajadores", type=int, default=1, help="Procesos para repartir los escenarios")
+    run.add_argument("--tam-bloque", type=int, default=256, help="Escenarios por bloque al repartir")
+    run.add_argument("--silencio", action="store_true", help="No mostrar el resumen final")
+    run.set_defaults(funcion=ejecutar)
+
+    modelos = subparsers.add_parser("modelos", help="Lista los modelos disponibles y sus parámetros")
+    modelos.set_defaults(funcion=listar_modelos)
+
+    args = parser.parse_args(argv)
+    return args.funcion(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
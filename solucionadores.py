@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de integradores para los modelos epidemiológicos.
+
+Permite elegir entre ``odeint``, los métodos de ``solve_ivp`` (RK45, LSODA,
+BDF...) o un paso fijo (RK4 / Euler), fijar las tolerancias y decidir en qué
+tiempos se devuelve la solución. Con el método "auto" se elige entre un método
+explícito y uno implícito según la rigidez del sistema.
+"""
+
+import math
+import time
+from dataclasses import asdict, dataclass, replace
+
+import numpy as np
+from scipy import sparse
+from scipy.integrate import odeint, solve_ivp
+
+import nucleos
+
+METODOS_IVP = ("RK45", "RK23", "DOP853", "LSODA", "BDF", "Radau")
+METODOS_FIJOS = ("rk4", "euler")
+METODOS = ("odeint",) + METODOS_IVP + METODOS_FIJOS + ("auto",)
+
+# Selección automática (método "auto"). El índice de rigidez es el cociente
+# entre el horizonte y la escala de tiempo más rápida del sistema,
+# horizonte · max(-Re λ) con λ los autovalores del jacobiano: aproxima cuántos
+# pasos impondría la estabilidad a un método explícito aunque la solución sea
+# suave (en Ross-Macdonald, la renovación de los mosquitos, λ ≈ -mu, frente a
+# la dinámica humana). Por encima del umbral se usa ``odeint`` (LSODA) con el
+# jacobiano analítico, que en los tramos rígidos trabaja con BDF; por debajo,
+# RK45, que no evalúa el jacobiano. Con la malla "eventos" el método rígido es
+# el LSODA de ``solve_ivp``. Si no se indican, las tolerancias son las de
+# ``TOLERANCIAS_AUTO`` para que la precisión no dependa del método elegido.
+METODO_NO_RIGIDO = "RK45"
+METODO_RIGIDO = "odeint"
+METODO_RIGIDO_EVENTOS = "LSODA"
+UMBRAL_RIGIDEZ = 300.0
+TOLERANCIAS_AUTO = {"rtol": 1e-6, "atol": 1e-6}
+
+# Mallas de salida:
+#   "linspace": np.linspace(0, dias, dias), la malla histórica de los modelos
+#               (sus puntos no están separados exactamente un día).
+#   "diaria":   un punto por día, de 0 a dias (ambos incluidos).
+#   "dispersa": un punto cada ``cada`` días, más el último día.
+#   "final":    solo el estado inicial y el final.
+#   "eventos":  solo los instantes en que se disparan los eventos.
+MALLAS = ("linspace", "diaria", "dispersa", "final", "eventos")
+
+# Funciones ``observador(info)`` que reciben las estadísticas de cada
+# integración (ver ``instrumentacion``). Vacía salvo que se active.
+OBSERVADORES = []
+
+
+@dataclass(frozen=True)
+class AjustesSolver:
+    """
+    Ajustes del integrador.
+
+    Attributes:
+        metodo (str): "odeint", uno de ``METODOS_IVP``, un paso fijo ("rk4",
+            "euler") o "auto" (según la rigidez, ver ``elegir_metodo``).
+        rtol (float, optional): Tolerancia relativa (por defecto la del integrador).
+        atol (float, optional): Tolerancia absoluta (por defecto la del integrador).
+        malla (str): Tiempos de salida, uno de ``MALLAS``.
+        cada (int): Separación en días de la malla "dispersa".
+        paso (float): Tamaño de paso de los métodos de paso fijo, en días.
+        analitica (bool): Usar la solución cerrada cuando el modelo la tiene (SI
+            y SIS). Con False se fuerza la integración numérica con ``metodo``.
+    """
+
+    metodo: str = "odeint"
+    rtol: float = None
+    atol: float = None
+    malla: str = "linspace"
+    cada: int = 7
+    paso: float = 0.1
+    analitica: bool = True
+
+    def __post_init__(self):
+        if self.metodo not in METODOS:
+            raise ValueError(f"Método desconocido: {self.metodo!r}. Opciones: {', '.join(METODOS)}")
+        if self.malla not in MALLAS:
+            raise ValueError(f"Malla desconocida: {self.malla!r}. Opciones: {', '.join(MALLAS)}")
+        if self.malla == "eventos" and self.metodo not in METODOS_IVP + ("auto",):
+            raise ValueError("La malla 'eventos' necesita un método de solve_ivp")
+        if self.cada < 1 or self.paso <= 0:
+            raise ValueError("'cada' debe ser al menos 1 y 'paso' positivo")
+
+    def como_dict(self):
+        """
+        Devuelve los ajustes como diccionario (por ejemplo, para la clave de caché).
+        """
+        return asdict(self)
+
+
+AJUSTES_POR_DEFECTO = AjustesSolver()
+
+
+def malla_tiempos(ajustes, dias):
+    """
+    Devuelve los tiempos de salida para ``dias`` días según ``ajustes.malla``.
+
+    Para la malla "eventos" devuelve el intervalo [0, dias].
+    """
+    if ajustes.malla == "linspace":
+        return np.linspace(0, dias, dias)
+    if ajustes.malla == "diaria":
+        return np.arange(dias + 1, dtype=float)
+    if ajustes.malla == "dispersa":
+        t = np.arange(0, dias + 1, ajustes.cada, dtype=float)
+        return t if t[-1] == dias else np.append(t, float(dias))
+    return np.array([0.0, float(dias)])
+
+
+def indice_rigidez(J, horizonte, bloque=1024):
+    """
+    Índice de rigidez: horizonte · max(-Re λ) sobre los autovalores del jacobiano.
+
+    Para un lote se devuelve el máximo de todos los escenarios (comparten los
+    pasos del integrador). Los autovalores solo se calculan para los escenarios
+    cuya cota de Gershgorin (suma por columnas de ``|J|``) puede superar el
+    máximo encontrado, de mayor a menor cota.
+
+    Args:
+        J (array): Jacobiano de forma (k, k) o (escenario, k, k).
+        horizonte (float): Duración de la integración.
+        bloque (int): Escenarios por llamada a ``numpy.linalg.eigvals``.
+
+    Returns:
+        float: Índice de rigidez (0 si todas las escalas crecen o son nulas).
+    """
+    J = np.asarray(J, dtype=float)
+    J = J.reshape((-1,) + J.shape[-2:])
+    cotas = np.abs(J).sum(axis=1).max(axis=1, initial=0.0)
+    orden = np.argsort(cotas)[::-1]
+    maximo = 0.0
+    for inicio in range(0, len(orden), bloque):
+        if cotas[orden[inicio]] <= maximo:
+            break
+        valores = np.linalg.eigvals(J[orden[inicio:inicio + bloque]])
+        maximo = max(maximo, float(np.max(-valores.real, initial=0.0)))
+    return float(horizonte) * maximo
+
+
+def _cota_rigidez(Dfun, y0, t_eval, args, bandas):
+    """
+    Cota superior del índice de rigidez con el jacobiano en el estado inicial.
+
+    Usa la cota de Gershgorin (la mayor suma por columnas de ``|J|``), válida
+    para el formato denso, el disperso y el de banda, cuyas columnas son las
+    del jacobiano. Sin jacobiano devuelve ``inf``: ``odeint`` detecta la
+    rigidez por su cuenta.
+    """
+    if Dfun is None:
+        return math.inf
+    J = Dfun(y0, t_eval[0], *args)
+    if sparse.issparse(J):
+        cota = abs(J).sum(axis=0).max()
+    else:
+        cota = np.abs(np.asarray(J, dtype=float)).sum(axis=0).max()
+    return float((t_eval[-1] - t_eval[0]) * cota)
+
+
+def elegir_metodo(ajustes, rigidez):
+    """
+    Sustituye el método "auto" por uno concreto según el índice de rigidez.
+
+    Args:
+        ajustes (AjustesSolver): Ajustes con ``metodo="auto"`` (los demás se
+            devuelven sin cambios).
+        rigidez (float): Índice de ``indice_rigidez``.
+
+    Returns:
+        AjustesSolver: ``METODO_RIGIDO`` si ``rigidez`` alcanza ``UMBRAL_RIGIDEZ``
+        y ``METODO_NO_RIGIDO`` si no, con ``TOLERANCIAS_AUTO`` en las
+        tolerancias que no se hayan fijado.
+    """
+    if ajustes.metodo != "auto":
+        return ajustes
+    if rigidez >= UMBRAL_RIGIDEZ:
+        metodo = METODO_RIGIDO_EVENTOS if ajustes.malla == "eventos" else METODO_RIGIDO
+    else:
+        metodo = METODO_NO_RIGIDO
+    tolerancias = {clave: valor for clave, valor in TOLERANCIAS_AUTO.items() if getattr(ajustes, clave) is None}
+    return replace(ajustes, metodo=metodo, **tolerancias)
+
+
+def _tolerancias(ajustes):
+    tolerancias = {}
+    if ajustes.rtol is not None:
+        tolerancias["rtol"] = ajustes.rtol
+    if ajustes.atol is not None:
+        tolerancias["atol"] = ajustes.atol
+    return tolerancias
+
+
+def _jac_ivp(Dfun, args, metodo, bandas, n_estado):
+    """
+    Adapta el jacobiano de estilo ``odeint`` a la firma de ``solve_ivp``.
+
+    LSODA acepta el formato banda tal cual; BDF y Radau lo reciben como matriz
+    dispersa (el formato banda se convierte directamente a ``dia_matrix``).
+    """
+    if Dfun is None or metodo not in ("LSODA", "BDF", "Radau"):
+        return None
+    if bandas is None or metodo == "LSODA":
+        return lambda t, y: Dfun(y, t, *args)
+    ml, mu = bandas
+    desplazamientos = [mu - q for q in range(ml + mu + 1)]
+
+    def jac(t, y):
+        return sparse.dia_matrix((Dfun(y, t, *args), desplazamientos), shape=(n_estado, n_estado)).tocsc()
+
+    return jac
+
+
+def _integrar_paso_fijo(func, y0, t_eval, ajustes, args):
+    """
+    Integra con RK4 o Euler explícito con un paso de como mucho ``ajustes.paso``.
+
+    Cada intervalo entre dos tiempos de salida se divide en subpasos iguales, de
+    modo que la solución cae exactamente en los tiempos pedidos.
+    """
+    if nucleos.USAR_NUMBA and nucleos.es_nucleo(func):
+        return nucleos.integrar_paso_fijo(func, y0, t_eval, ajustes.paso, ajustes.metodo == "rk4", *args)
+
+    Y = np.empty((len(t_eval), len(y0)))
+    y = np.asarray(y0, dtype=float)
+    Y[0] = y
+    pasos = 0
+    for i in range(1, len(t_eval)):
+        t = t_eval[i - 1]
+        subpasos = max(1, math.ceil((t_eval[i] - t) / ajustes.paso - 1e-9))
+        h = (t_eval[i] - t) / subpasos
+        for _ in range(subpasos):
+            k1 = np.asarray(func(y, t, *args))
+            if ajustes.metodo == "euler":
+                y = y + h * k1
+            else:
+                k2 = np.asarray(func(y + 0.5 * h * k1, t + 0.5 * h, *args))
+                k3 = np.asarray(func(y + 0.5 * h * k2, t + 0.5 * h, *args))
+                k4 = np.asarray(func(y + h * k3, t + h, *args))
+                y = y + h / 6.0 * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+            t += h
+        pasos += subpasos
+        Y[i] = y
+    return Y, pasos
+
+
+def integrar(func, y0, t_eval, ajustes=AJUSTES_POR_DEFECTO, Dfun=None, args=(), bandas=None, eventos=None,
+             paso_inicial=None, rigidez=None):
+    """
+    Integra ``dy/dt = func(y, t, *args)`` con el método elegido en ``ajustes``.
+
+    Args:
+        func (callable): Derivadas con la firma de ``odeint``.
+        y0 (array): Estado inicial.
+        t_eval (array): Tiempos de salida (el primero es el instante inicial).
+        ajustes (AjustesSolver): Método, tolerancias y malla.
+        Dfun (callable, optional): Jacobiano con la firma de ``odeint``.
+        args (tuple): Argumentos adicionales de ``func`` y ``Dfun``.
+        bandas (tuple, optional): ``(ml, mu)`` si el jacobiano es de banda.
+        eventos (list, optional): Funciones ``evento(t, y)`` de ``solve_ivp``.
+        paso_inicial (float, optional): Primer paso de los métodos adaptativos
+            (por ejemplo, el último de una integración que se continúa).
+        rigidez (float, optional): Índice de rigidez para el método "auto"
+            (``indice_rigidez``). Si falta se usa una cota con ``Dfun``.
+
+    Returns:
+        tuple: ``(t, Y, info)`` con los tiempos, los estados de forma
+        (len(t), len(y0)) y un diccionario con el método y las estadísticas
+        del integrador (evaluaciones de derivadas y de jacobiano y, si el
+        integrador lo informa, número de pasos y último paso, ``paso_final``).
+        Con el método "auto", ``metodo`` es el elegido y ``rigidez`` el índice
+        con el que se eligió.
+    """
+    eleccion = {}
+    if ajustes.metodo == "auto":
+        t_eval = np.asarray(t_eval, dtype=float)
+        if rigidez is None:
+            rigidez = _cota_rigidez(Dfun, np.asarray(y0, dtype=float), t_eval, args, bandas)
+        ajustes = elegir_metodo(ajustes, rigidez)
+        eleccion = {"automatico": True, "rigidez": float(rigidez)}
+    if not OBSERVADORES:
+        t, Y, info = _integrar_metodo(func, y0, t_eval, ajustes, Dfun, args, bandas, eventos, paso_inicial)
+        info.update(eleccion)
+        return t, Y, info
+    inicio = time.perf_counter()
+    t, Y, info = _integrar_metodo(func, y0, t_eval, ajustes, Dfun, args, bandas, eventos, paso_inicial)
+    info.update(eleccion, segundos=time.perf_counter() - inicio, dimension=int(np.size(y0)))
+    for observador in OBSERVADORES:
+        observador(info)
+    return t, Y, info
+
+
+def _integrar_metodo(func, y0, t_eval, ajustes, Dfun, args, bandas, eventos, paso_inicial=None):
+    t_eval = np.asarray(t_eval, dtype=float)
+    y0 = np.asarray(y0, dtype=float)
+    info = {"metodo": ajustes.metodo}
+
+    if ajustes.metodo == "odeint":
+        opciones = {"ml": bandas[0], "mu": bandas[1]} if bandas else {}
+        if paso_inicial:
+            opciones["h0"] = paso_inicial
+        Y, salida = odeint(func, y0, t_eval, args=args, Dfun=Dfun, full_output=True,
+                           **opciones, **_tolerancias(ajustes))
+        if len(t_eval) > 1:
+            info.update(nfe=int(salida["nfe"][-1]), nje=int(salida["nje"][-1]), pasos=int(salida["nst"][-1]),
+                        paso_final=float(salida["hu"][-1]))
+        return t_eval, Y, info
+
+    if ajustes.metodo in METODOS_FIJOS:
+        Y, pasos = _integrar_paso_fijo(func, y0, t_eval, ajustes, args)
+        evaluaciones = 4 if ajustes.metodo == "rk4" else 1
+        info.update(nfe=pasos * evaluaciones, nje=0, pasos=pasos)
+        return t_eval, Y, info
+
+    opciones = {}
+    if paso_inicial and paso_inicial < t_eval[-1] - t_eval[0]:
+        opciones["first_step"] = paso_inicial
+    jac = _jac_ivp(Dfun, args, ajustes.metodo, bandas, len(y0))
+    if jac is not None:
+        opciones["jac"] = jac
+        if bandas and ajustes.metodo == "LSODA":
+            opciones["lband"], opciones["uband"] = bandas
+    solucion = solve_ivp(
+        lambda t, y: func(y, t, *args), (t_eval[0], t_eval[-1]), y0, method=ajustes.metodo,
+        t_eval=None if ajustes.malla == "eventos" else t_eval, events=eventos,
+        **opciones, **_tolerancias(ajustes),
+    )
+    if not solucion.success:
+        raise RuntimeError(f"La integración con {ajustes.metodo} ha fallado: {solucion.message}")
+    info.update(nfe=int(solucion.nfev), nje=int(solucion.njev))
+
+    if ajustes.malla == "eventos":
+        t_eventos = solucion.t_events or []
+        y_eventos = solucion.y_events or []
+        if not t_eventos or not any(len(t) for t in t_eventos):
+            return np.empty(0), np.empty((0, len(y0))), info
+        t = np.concatenate(t_eventos)
+        Y = np.concatenate([y.reshape(-1, len(y0)) for y in y_eventos])
+        orden = np.argsort(t, kind="stable")
+        info["eventos"] = [len(t) for t in t_eventos]
+        return t[orden], Y[orden], info
+    return solucion.t, solucion.y.T, info
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de las soluciones cerradas de SI y SIS frente a la integración numérica.
+"""
+
+import numpy as np
+import pytest
+
+from models import modelo_si, modelo_sis
+from simulacion import simular_lote
+from solucionadores import AjustesSolver
+
+DIAS = 365
+POBLACION = 1000
+
+# Diferencia máxima admitida, relativa a la población
+TOLERANCIA = 1e-6
+
+NUMERICA = AjustesSolver(malla="diaria", analitica=False, rtol=1e-10, atol=1e-8)
+
+# Ramas de la solución cerrada: beta < gamma (y beta = 0), beta = gamma y beta > gamma
+RAMAS = [(0.0, 0.1), (0.2, 0.2), (0.5, 0.1)]
+
+
+def _parametros(nombre, beta, gamma):
+    parametros = {"poblacion": POBLACION, "infectados_iniciales": 10, "beta": beta}
+    if nombre == "sis":
+        parametros["gamma"] = gamma
+    return parametros
+
+
+def _error(nombre, beta, gamma):
+    parametros = _parametros(nombre, np.asarray(beta, dtype=float), np.asarray(gamma, dtype=float))
+    analitica = simular_lote(nombre, parametros, DIAS, AjustesSolver(malla="diaria"))
+    numerica = simular_lote(nombre, parametros, DIAS, NUMERICA)
+    assert analitica.shape == numerica.shape
+    return np.abs(analitica - numerica).max() / POBLACION
+
+
+@pytest.mark.parametrize("nombre", ["si", "sis"])
+@pytest.mark.parametrize("beta, gamma", RAMAS)
+def test_ramas_especiales(nombre, beta, gamma):
+    assert _error(nombre, [beta], [gamma]) <= TOLERANCIA
+
+
+@pytest.mark.parametrize("nombre", ["si", "sis"])
+def test_escenarios_aleatorios(nombre):
+    rng = np.random.default_rng(0)
+    assert _error(nombre, rng.uniform(0.0, 1.0, 200), rng.uniform(0.0, 1.0, 200)) <= TOLERANCIA
+
+
+@pytest.mark.parametrize("beta, gamma", RAMAS)
+def test_modelos_por_defecto(beta, gamma):
+    numerica = AjustesSolver(analitica=False, rtol=1e-10, atol=1e-8)
+    for cerrada, integrada in [
+        (modelo_si(POBLACION, 10, beta, DIAS), modelo_si(POBLACION, 10, beta, DIAS, numerica)),
+        (modelo_sis(POBLACION, 10, beta, gamma, DIAS), modelo_sis(POBLACION, 10, beta, gamma, DIAS, numerica)),
+    ]:
+        assert list(cerrada.columns) == list(integrada.columns)
+        np.testing.assert_allclose(cerrada.to_numpy(), integrada.to_numpy(), rtol=0, atol=TOLERANCIA * POBLACION)
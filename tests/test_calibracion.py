@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de recuperación de parámetros de ``calibracion.calibrar``.
+"""
+
+import numpy as np
+import pytest
+
+from calibracion import PERDIDAS, calibrar, sensibilidades
+
+DIAS = 120
+
+# Tres regiones de tamaños distintos con los mismos parámetros verdaderos
+VERDADEROS = {
+    "poblacion": np.array([1e4, 5e4, 2e5]),
+    "infectados_iniciales": np.array([10.0, 20.0, 50.0]),
+    "recuperados_iniciales": 0.0,
+    "beta": np.full(3, 0.4),
+    "gamma": np.full(3, 0.15),
+}
+
+
+def _incidencia():
+    Y, _ = sensibilidades("sir", VERDADEROS, ("beta",), DIAS)
+    return Y[:, :-1, 0] - Y[:, 1:, 0]
+
+
+@pytest.mark.parametrize("perdida", PERDIDAS)
+@pytest.mark.parametrize("inicio", [(0.3, 0.1), (0.25, 0.2), (1.0, 0.5)])
+def test_recupera_parametros(perdida, inicio):
+    beta, gamma = inicio
+    resultado = calibrar("sir", _incidencia(), {**VERDADEROS, "beta": beta, "gamma": gamma}, ("beta", "gamma"),
+                         perdida=perdida)
+    assert resultado.convergido.all()
+    np.testing.assert_allclose(resultado.parametros["beta"], 0.4, rtol=1e-3)
+    np.testing.assert_allclose(resultado.parametros["gamma"], 0.15, rtol=1e-3)
+
+
+@pytest.mark.parametrize("inicio", [(0.3, 0.1), (0.25, 0.2), (1.0, 0.5)])
+def test_binomial_negativa_con_ruido(inicio):
+    # Con ruido el óptimo no es el valor verdadero: se compara con el ajuste
+    # que arranca en él
+    rng = np.random.default_rng(3)
+    incidencia = _incidencia()
+    observados = rng.negative_binomial(10, 10 / (10 + incidencia)).astype(float)
+    opciones = {"perdida": "binomial_negativa", "dispersion": 10.0}
+    referencia = calibrar("sir", observados, VERDADEROS, ("beta", "gamma"), **opciones)
+    beta, gamma = inicio
+    resultado = calibrar("sir", observados, {**VERDADEROS, "beta": beta, "gamma": gamma}, ("beta", "gamma"),
+                         **opciones)
+    assert resultado.convergido.all()
+    for nombre in ("beta", "gamma"):
+        np.testing.assert_allclose(resultado.parametros[nombre], referencia.parametros[nombre], rtol=1e-3)
+        np.testing.assert_allclose(resultado.parametros[nombre], VERDADEROS[nombre], rtol=0.25)
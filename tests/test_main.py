@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Pruebas de las funciones auxiliares de la aplicación.
+"""
+
+import numpy as np
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("plotly")
+
+from main import _frame_comparativa  # noqa: E402
+
+
+def test_comparativa_con_incremento_cero():
+    # Con incremento 0 todos los escenarios tienen la misma etiqueta
+    t = np.arange(5.0)
+    etiquetas = ["28.0°C (Hum: 70.0%)"] * 3
+    df = _frame_comparativa(t, [np.ones(5), None, np.zeros(5)], etiquetas)
+    assert len(df) == 10
+    assert df["Escenario"].nunique() == 2
+    assert list(df["Escenario"].cat.categories) == [f"28.0°C (Hum: 70.0%) #{i}" for i in (1, 2, 3)]
+
+
+def test_comparativa_etiquetas_distintas():
+    t = np.arange(3.0)
+    df = _frame_comparativa(t, [np.ones(3), np.ones(3)], ["24.0°C", "26.0°C"])
+    assert list(df["Escenario"].unique()) == ["24.0°C", "26.0°C"]
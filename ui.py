@@ -60,10 +60,16 @@ def sidebar():
     elif modelo == "Modelo Ross-Macdonald":
         modo_sim = st.sidebar.selectbox(
             "Modo de Simulación",
-            ("Simulación Simple", "Comparar por Temperatura", "Comparar por Humedad")
+            ("Simulación Simple", "Comparar por Temperatura", "Comparar por Humedad", "Barrido en Rejilla",
+             "Barrido Guardado")
         )
         parametros["modo_sim"] = modo_sim
 
+        if modo_sim == "Barrido Guardado":
+            # Los parámetros de cada escenario ya están en el almacén
+            parametros["almacen"] = st.sidebar.text_input("Directorio del Almacén", value="resultados")
+            return modelo, parametros
+
         st.sidebar.markdown("### Condiciones Climáticas")
         
         if modo_sim == "Simulación Simple":
@@ -77,7 +83,7 @@ def sidebar():
             st.sidebar.markdown("#### Configuración de Temperatura")
             temp_base = st.sidebar.number_input("Temp. Base (°C)", value=24.0, step=1.0)
             temp_step = st.sidebar.number_input("Incremento (°C)", value=2.0, step=1.0)
-            num_escenarios = st.sidebar.slider("Nº Escenarios", 2, 5, 3)
+            num_escenarios = st.sidebar.slider("Nº Escenarios", 2, 20, 3)
             
             parametros["humedad"] = humedad
             parametros["temp_base"] = temp_base
@@ -89,13 +95,23 @@ def sidebar():
             st.sidebar.markdown("#### Configuración de Humedad")
             hum_base = st.sidebar.number_input("Humedad Base (%)", value=50.0, step=5.0)
             hum_step = st.sidebar.number_input("Aymento (%)", value=10.0, step=5.0)
-            num_escenarios = st.sidebar.slider("Nº Escenarios", 2, 5, 3)
+            num_escenarios = st.sidebar.slider("Nº Escenarios", 2, 20, 3)
             
             parametros["temp"] = temp
             parametros["hum_base"] = hum_base
             parametros["hum_step"] = hum_step
             parametros["num_escenarios"] = num_escenarios
 
+        elif modo_sim == "Barrido en Rejilla":
+            st.sidebar.markdown("#### Rejilla de Temperatura")
+            parametros["temp_min"], parametros["temp_max"] = st.sidebar.slider(
+                "Rango de Temperatura (°C)", 10.0, 40.0, (20.0, 34.0))
+            parametros["temp_pasos"] = st.sidebar.slider("Valores de Temperatura", 2, 200, 50)
+            st.sidebar.markdown("#### Rejilla de Humedad")
+            parametros["hum_min"], parametros["hum_max"] = st.sidebar.slider(
+                "Rango de Humedad (%)", 0.0, 100.0, (40.0, 90.0))
+            parametros["hum_pasos"] = st.sidebar.slider("Valores de Humedad", 2, 200, 50)
+
         st.sidebar.markdown("### Parámetros Biológicos")
         prob_h_v = st.sidebar.slider("Prob. Transmisión H->V (b)", 0.0, 1.0, 0.5)
         prob_v_h = st.sidebar.slider("Prob. Transmisión V->H (c)", 0.0, 1.0, 0.5)